@@ -0,0 +1,30 @@
+typedef int (*handler_t)(int);
+
+struct table_ops {
+    handler_t run;
+    handler_t stop;
+};
+
+int real_fn(int x) { return x; }
+int stop_fn(int x) { return -x; }
+int other_fn(int x) { return x + 1; }
+
+handler_t lookup(int key) { return real_fn; }
+
+struct table_ops table;
+static struct table_ops fixed = { .run = &other_fn, .stop = stop_fn };
+handler_t saved;
+
+/* 函数调用的结果：h 指向 lookup 的返回值，不是 lookup 本身 */
+void setup(void) {
+    handler_t h = lookup(3);
+    table.run = h;
+    saved = &stop_fn;
+    table.stop = saved;
+}
+
+void dispatch(void) {
+    table.run(1);
+    table.stop(2);
+    fixed.run(3);
+}
@@ -10,15 +10,18 @@ extract_macro_expansion.py
 - command_line.json 里应有 "arguments": [ ... ]，第一个元素通常是 gcc 的路径。
 - 生成的文件:
     - temp_pre.i      : gcc 生成的预处理输出（未注释行号的 .i）
-    - annotated.i     : 注释过的 .i（每行以 filename:lineno<TAB>内容）
+    - temp_pre.i.lmidx: linemarker 索引，(源文件, 行号) -> .i 中的字节偏移（见 build_linemarker_index）
     - expansion.txt   : 抽取到的宏替换内容（也会打印到 stdout）
 """
 import json
 import sys
 import os
 import re
+import mmap
 import subprocess
 import tempfile
+from array import array
+from bisect import bisect_left
 from shutil import which
 
 COMP_DB_PATH = 'compile_commands.json'
@@ -120,28 +123,112 @@ def run_preprocess(cmd):
         capture_output=True
     )
 
-linemarker_re = re.compile(r'^#\s*([0-9]+)\s+"([^"]+)"')
+linemarker_re = re.compile(rb'^#\s*([0-9]+)\s+"([^"]+)"')
+LINEMARKER_INDEX_SUFFIX = '.lmidx'
 
-def annotate_i(pre_i_path, annotated_path):
-    cur_file = ""
+def build_linemarker_index(pre_i_path):
+    """
+    一遍扫描 .i，为每个源代码行记录 (源文件, 行号) -> 该行在 .i 中的字节偏移。
+    返回 dict:
+        files   : linemarker 中出现过的文件名列表
+        keys    : array('Q')，(文件下标 << 32) | 行号，升序
+        offsets : array('Q')，与 keys 一一对应；同一 (文件, 行号) 出现多次时按偏移升序
+        by_base : 文件名尾部 -> 文件下标列表（由 files 派生，不落盘）
+    行号规则与逐行注释 .i 时一致：linemarker 行本身不计，之后每行行号加一；首个 linemarker 之前的行不入索引。
+    """
+    files = []
+    file_ids = {}
+    entries = []
+    cur_file = None
     cur_lineno = 1
-    with open(pre_i_path, 'r', encoding='utf-8', errors='replace') as inp, \
-         open(annotated_path, 'w', encoding='utf-8') as out:
-        for raw in inp:
-            line = raw.rstrip('\n')
-            m = linemarker_re.match(line)
+    offset = 0
+    with open(pre_i_path, 'rb') as f:
+        for raw in f:
+            m = linemarker_re.match(raw)
             if m:
                 cur_lineno = int(m.group(1))
-                cur_file = m.group(2)
-                # linemarker 行本身不输出为源代码
-                continue
-            # 输出格式: filename:lineno\tcontent
-            if cur_file == "":
-                # 没有当前文件信息时放 ?? 占位
-                out.write("??:1\t" + line + "\n")
-            else:
-                out.write(f"{cur_file}:{cur_lineno}\t{line}\n")
+                name = m.group(2).decode('utf-8', errors='replace')
+                if name not in file_ids:
+                    file_ids[name] = len(files)
+                    files.append(name)
+                cur_file = file_ids[name]
+            elif cur_file is not None:
+                entries.append(((cur_file << 32) | cur_lineno, offset))
                 cur_lineno += 1
+            offset += len(raw)
+
+    entries.sort()
+    return with_basename_map({
+        "files": files,
+        "keys": array('Q', (k for k, _ in entries)),
+        "offsets": array('Q', (o for _, o in entries)),
+    })
+
+def with_basename_map(index):
+    by_base = {}
+    for file_id, fname in enumerate(index["files"]):
+        by_base.setdefault(os.path.basename(fname), []).append(file_id)
+    index["by_base"] = by_base
+    return index
+
+def save_linemarker_index(index, pre_i_path):
+    """索引存为 <.i>.lmidx：首行为 JSON 头（文件名表、条目数、.i 的大小与修改时间），随后是两个数组的原始字节"""
+    st = os.stat(pre_i_path)
+    header = {
+        "files": index["files"],
+        "count": len(index["keys"]),
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+    }
+    with open(pre_i_path + LINEMARKER_INDEX_SUFFIX, 'wb') as f:
+        f.write(json.dumps(header).encode('utf-8') + b'\n')
+        index["keys"].tofile(f)
+        index["offsets"].tofile(f)
+
+def load_linemarker_index(pre_i_path):
+    """读取已保存的索引；索引不存在或 .i 已变化时返回 None"""
+    idx_path = pre_i_path + LINEMARKER_INDEX_SUFFIX
+    if not os.path.exists(idx_path):
+        return None
+    st = os.stat(pre_i_path)
+    with open(idx_path, 'rb') as f:
+        header = json.loads(f.readline())
+        if header["size"] != st.st_size or header["mtime_ns"] != st.st_mtime_ns:
+            return None
+        keys, offsets = array('Q'), array('Q')
+        keys.fromfile(f, header["count"])
+        offsets.fromfile(f, header["count"])
+    return with_basename_map({"files": header["files"], "keys": keys, "offsets": offsets})
+
+def open_linemarker_index(pre_i_path):
+    index = load_linemarker_index(pre_i_path)
+    if index is None:
+        index = build_linemarker_index(pre_i_path)
+        save_linemarker_index(index, pre_i_path)
+    return index
+
+def lookup_line_offset(index, src_file, line):
+    """
+    (src_file, line) 在 .i 中首次出现的字节偏移，找不到返回 None。
+    文件名可匹配尾部（例如 .i 中为绝对路径，但用户传相对名），与全文件名匹配同等对待，取最靠前的一处。
+    """
+    keys = index["keys"]
+    best = None
+    # 全名匹配的文件尾部必然相同，按尾部取候选即可覆盖两种匹配
+    for file_id in index["by_base"].get(os.path.basename(src_file), []):
+        key = (file_id << 32) | line
+        i = bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            offset = index["offsets"][i]
+            best = offset if best is None else min(best, offset)
+    return best
+
+def read_i_line(pre_i_path, offset):
+    """通过 mmap 读取 .i 中从 offset 开始的一行（不含换行符）"""
+    with open(pre_i_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        end = mm.find(b'\n', offset)
+        raw = mm[offset:end if end != -1 else len(mm)].rstrip(b'\r')
+    return raw.decode('utf-8', errors='replace')
 
 def get_tokens_from_source_line(line, start_col, end_col):
     """
@@ -169,29 +256,6 @@ def is_word_token(tok):
     # 简单判断是否为字母数字下划线组成的 token（便于用边界 \b 匹配）
     return re.fullmatch(r'[A-Za-z_]\w*', tok) is not None
 
-def find_annotated_line_index(annotated_lines, src_file, start_line):
-    """
-    在 annotated_lines 中查找对应 src_file:start_line 的首个行的索引。
-    可以匹配文件名的尾部（例如 annotated 使用绝对路径，但用户传相对名）。
-    返回 index 或 None
-    """
-    base = os.path.basename(src_file)
-    for i, l in enumerate(annotated_lines):
-        # 格式 filename:lineno \t content
-        if '\t' not in l:
-            continue
-        left, _ = l.split('\t', 1)
-        if ':' not in left:
-            continue
-        fname, lineno_s = left.rsplit(':', 1)
-        try:
-            lineno = int(lineno_s)
-        except:
-            continue
-        if lineno == start_line and (fname == src_file or os.path.basename(fname) == base):
-            return i
-    return None
-
 def token_in_line(line_content, token):
     if token is None:
         return False
@@ -200,9 +264,9 @@ def token_in_line(line_content, token):
     else:
         return token in line_content
 
-def extract_expansion_from_annotated(annotated_path, src_file, start_line, token_before, token_after):
+def extract_expansion(pre_i_path, index, src_file, start_line, token_before, token_after):
     """
-    在 annotated.i 中找到 src_file:start_line 所在行，
+    通过 linemarker 索引定位 .i 中 src_file:start_line 所在行，
     在该行中从前往后找到 token_before 的第一个匹配（取其结束位置）；
     在该行中从后往前找到 token_after 的第一个匹配（取其开始位置）；
     两者之间就是宏展开内容（strip 后返回）。
@@ -235,16 +299,11 @@ def extract_expansion_from_annotated(annotated_path, src_file, start_line, token
         m = matches[-1]
         return (m.start(), m.end())
 
-    with open(annotated_path, 'r', encoding='utf-8') as f:
-        annotated_lines = [ln.rstrip('\n') for ln in f]
-
-    idx = find_annotated_line_index(annotated_lines, src_file, start_line)
-    if idx is None:
-        raise RuntimeError(f"在 {annotated_path} 中未能找到 {src_file}:{start_line} 对应行。")
+    offset = lookup_line_offset(index, src_file, start_line)
+    if offset is None:
+        raise RuntimeError(f"在 {pre_i_path} 中未能找到 {src_file}:{start_line} 对应行。")
 
-    # 取该行内容（去掉 filename:lineno\t 前缀）
-    parts = annotated_lines[idx].split('\t', 1)
-    content = parts[1] if len(parts) > 1 else ""
+    content = read_i_line(pre_i_path, offset)
 
     # 在该行里找前锚点（从前往后第一个匹配）
     before_span = find_first_span(content, token_before)
@@ -304,19 +363,18 @@ def main():
     # 生成临时文件名
     tmpdir = tempfile.mkdtemp(prefix="preproc_")
     
-    annotated_i = os.path.join(temp_dir, "annotated.i")
     try:
         cmd = pre_process_args(args)
         pre_i = cmd[-2]
         run_preprocess(cmd)
-        annotate_i(pre_i, annotated_i)
-        expansion, content, before_span, after_span = extract_expansion_from_annotated(annotated_i, src_file, start_line, token_before, token_after)
+        index = open_linemarker_index(pre_i)
+        expansion, content, before_span, after_span = extract_expansion(pre_i, index, src_file, start_line, token_before, token_after)
         print("\n--- 拆出的宏展开内容（写入 expansion.txt）---\n")
         print(expansion)
         with open("expansion.txt", "w", encoding='utf-8') as out:
             out.write(expansion)
-        print(f"\nannotated.i 已生成: {annotated_i}")
-        print(f"预处理输出 .i: {pre_i}")
+        print(f"\n预处理输出 .i: {pre_i}")
+        print(f"linemarker 索引: {pre_i + LINEMARKER_INDEX_SUFFIX}")
         print("结果也保存为 expansion.txt （当前工作目录）")
     finally:
         # 不自动删除临时文件，便于你调试。若想删除请取消注释下面两行：
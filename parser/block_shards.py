@@ -0,0 +1,225 @@
+"""
+可随机访问的压缩分块输出：实体 / 关系按 id（关系按 head）排序后每 block_size 条打成一个块，
+每块为独立 zlib 压缩的 JSON Lines，另写一个小索引记录各块的偏移、长度、条数与 id 范围。
+读取单个实体或某实体的出边时只需解压命中的块。
+
+head 为字段 id 列表的关系对列表中每个不同的 id 各写一份，按任一 id 都能查到；
+除第一份外的副本在块索引的 "secondary" 中记录 [行号, 键序号]，iter_records 遍历时跳过，每条关系只产出一次。
+记录可以来自 RelationSink 等流式来源：memory_mb > 0 时按内存预算落盘做外部排序（relation_sink.LineSink），
+不把全部关系读入内存。
+
+文件布局（以实体为例）：
+    entity.blk        压缩块依次拼接
+    entity.idx.json   {"key": "id", "blocks": [{"offset", "length", "count", "first", "last"}, ...]}
+
+用法：
+    python block_shards.py pack --graph output/                  由 entity.json / relation.json 生成分块文件
+    python block_shards.py get --graph output/ --id 123          查询实体及其出边
+"""
+import os
+import json
+import zlib
+from bisect import bisect_left
+
+from json_stream import iter_json_array
+from relation_sink import LineSink
+
+DEFAULT_BLOCK_SIZE = 1024
+SHARD_KINDS = {
+    # 名称 -> 排序 / 分块使用的键
+    "entity": "id",
+    "relation": "head",
+}
+
+
+def value_key(value):
+    """排序键：数字字符串按数值排序，其余按字符串"""
+    value = str(value)
+    return (0, int(value), "") if value.isdigit() else (1, 0, value)
+
+
+def record_keys(record, key):
+    """记录的全部排序键：head 为字段 id 列表时每个不同的 id 一个，第一个为主键"""
+    value = record[key]
+    if not isinstance(value, list):
+        return [value_key(value)]
+    keys = []
+    for v in value or [""]:
+        k = value_key(v)
+        if k not in keys:
+            keys.append(k)
+    return keys
+
+
+def record_key(record, key):
+    return record_keys(record, key)[0]
+
+
+def sortable_key(k):
+    """排序键 -> 字典序与元组顺序一致的字符串，供外部排序使用"""
+    flag, number, text = k
+    if flag == 0:
+        digits = str(number)
+        return f"0{len(digits):06d}{digits}"
+    return f"1{text}"
+
+
+def parse_sortable_key(text):
+    if text[0] == "0":
+        return 0, int(text[7:]), ""
+    return 1, 0, text[1:]
+
+
+def iter_keyed_records(records, key, memory_mb=0, tmp_dir=None):
+    """按排序键有序产出 (排序键, 键序号, 记录)，键序号大于 0 的是副本；memory_mb > 0 时按内存预算外部排序"""
+    if memory_mb <= 0:
+        keyed = [(k, i, r) for r in records for i, k in enumerate(record_keys(r, key))]
+        keyed.sort(key=lambda item: item[0])
+        yield from keyed
+        return
+
+    sink = LineSink(memory_mb, tmp_dir, unique=False, prefix="block_shard_")
+    try:
+        for r in records:
+            line = json.dumps(r, ensure_ascii=False)
+            sink.extend_lines(
+                f"{sortable_key(k)}\t{i}\t{line}\n" for i, k in enumerate(record_keys(r, key))
+            )
+        for text in sink.iter_lines():
+            k, index, line = text.rstrip("\n").split("\t", 2)
+            yield parse_sortable_key(k), int(index), json.loads(line)
+    finally:
+        sink.close()
+
+
+def shard_paths(output_dir, name):
+    return os.path.join(output_dir, f"{name}.blk"), os.path.join(output_dir, f"{name}.idx.json")
+
+
+def write_block_shard(
+    output_dir, name, records, block_size=DEFAULT_BLOCK_SIZE, level=6, memory_mb=0, tmp_dir=None
+):
+    """按键排序后分块压缩写出，返回块数；records 可以是任意可迭代对象，memory_mb > 0 时不整体读入内存"""
+    key = SHARD_KINDS[name]
+    blk_path, idx_path = shard_paths(output_dir, name)
+
+    blocks = []
+    offset = 0
+    with open(blk_path, 'wb') as f:
+        def flush(chunk):
+            nonlocal offset
+            payload = "\n".join(json.dumps(r, ensure_ascii=False) for _, _, r in chunk).encode("utf-8")
+            data = zlib.compress(payload, level)
+            f.write(data)
+            block = {
+                "offset": offset,
+                "length": len(data),
+                "count": len(chunk),
+                "first": chunk[0][0],
+                "last": chunk[-1][0],
+            }
+            secondary = [[j, i] for j, (_, i, _) in enumerate(chunk) if i > 0]
+            if secondary:
+                block["secondary"] = secondary
+            blocks.append(block)
+            offset += len(data)
+
+        chunk = []
+        for item in iter_keyed_records(records, key, memory_mb, tmp_dir):
+            chunk.append(item)
+            if len(chunk) == block_size:
+                flush(chunk)
+                chunk = []
+        if chunk:
+            flush(chunk)
+
+    with open(idx_path, 'w') as f:
+        json.dump({"key": key, "block_size": block_size, "blocks": blocks}, f)
+    return len(blocks)
+
+
+def write_graph_shards(output_dir, all_entities, all_relations, block_size=DEFAULT_BLOCK_SIZE, memory_mb=0, tmp_dir=None):
+    """memory_mb > 0 时关系（如 RelationSink）按内存预算外部排序后分块"""
+    os.makedirs(output_dir, exist_ok=True)
+    write_block_shard(output_dir, "entity", all_entities, block_size)
+    write_block_shard(output_dir, "relation", all_relations, block_size, memory_mb=memory_mb, tmp_dir=tmp_dir)
+
+
+def open_block_shard(output_dir, name):
+    """加载分块索引，返回读取句柄（dict），块数据按需读取"""
+    blk_path, idx_path = shard_paths(output_dir, name)
+    with open(idx_path, 'r') as f:
+        index = json.load(f)
+    blocks = index["blocks"]
+    for block in blocks:
+        # JSON 中的元组还原为可比较的元组
+        block["first"] = tuple(block["first"])
+        block["last"] = tuple(block["last"])
+    return {
+        "path": blk_path,
+        "key": index["key"],
+        "blocks": blocks,
+        "lasts": [block["last"] for block in blocks],
+    }
+
+
+def read_block(shard, block):
+    with open(shard["path"], 'rb') as f:
+        f.seek(block["offset"])
+        payload = zlib.decompress(f.read(block["length"]))
+    return [json.loads(line) for line in payload.decode("utf-8").split("\n")]
+
+
+def lookup(shard, value):
+    """键等于 value 的全部记录（同一键可能跨越相邻的多个块）"""
+    target = record_key({shard["key"]: value}, shard["key"])
+    result = []
+    i = bisect_left(shard["lasts"], target)
+    while i < len(shard["blocks"]) and shard["blocks"][i]["first"] <= target:
+        block = shard["blocks"][i]
+        secondary = dict(block.get("secondary", ()))
+        # 每一行按其所在副本的键匹配，同一条关系只取命中的那一份
+        result += [
+            r for j, r in enumerate(read_block(shard, block))
+            if record_keys(r, shard["key"])[secondary.get(j, 0)] == target
+        ]
+        i += 1
+    return result
+
+
+def iter_records(shard):
+    """每条记录只产出一次（跳过列表 head 的副本）"""
+    for block in shard["blocks"]:
+        secondary = dict(block.get("secondary", ()))
+        yield from (r for j, r in enumerate(read_block(shard, block)) if j not in secondary)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="mode", required=True)
+
+    p_pack = sub.add_parser("pack", help="由 entity.json / relation.json 生成分块压缩文件")
+    p_pack.add_argument("--graph", type=str, required=True, help="图谱目录")
+    p_pack.add_argument("--block-size", type=int, default=DEFAULT_BLOCK_SIZE, help="每块记录数")
+    p_pack.add_argument("--memory-mb", type=float, default=0,
+                        help="关系外部排序的内存预算（MB），relation.json 流式读取；0 为整体在内存中排序")
+
+    p_get = sub.add_parser("get", help="按 id 查询实体及其出边")
+    p_get.add_argument("--graph", type=str, required=True, help="图谱目录（含 .blk / .idx.json）")
+    p_get.add_argument("--id", type=str, required=True, help="实体 id")
+
+    args = parser.parse_args()
+
+    if args.mode == "pack":
+        with open(os.path.join(args.graph, 'entity.json'), 'r') as f:
+            entities = json.load(f)
+        relations = iter_json_array(os.path.join(args.graph, 'relation.json'))
+        write_graph_shards(args.graph, entities, relations, args.block_size, args.memory_mb, args.graph)
+        for name in SHARD_KINDS:
+            blk_path, _ = shard_paths(args.graph, name)
+            print(f"📦 {blk_path}：{os.path.getsize(blk_path) / 1024:.1f} KB")
+    else:
+        entities = lookup(open_block_shard(args.graph, "entity"), args.id)
+        relations = lookup(open_block_shard(args.graph, "relation"), args.id)
+        print(json.dumps({"entities": entities, "relations": relations}, ensure_ascii=False, indent=2))
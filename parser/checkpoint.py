@@ -0,0 +1,159 @@
+"""
+长时间抽取的检查点与断点续跑：阶段 1 每处理 every 个文件、阶段 2 ~ 6 每个阶段内每处理 every 个文件，
+以及每个阶段结束时保存一次；被抢占或崩溃后以 --resume 从最近的检查点继续，已完成的抽取不再重做。
+
+检查点目录 <output>/checkpoint/：
+    state.pkl                 进度与小型状态（运行参数、已处理文件数、下一个 id、隔离记录、各阶段进度等）
+    records_<n>.pkl           阶段 1 的逐文件实体记录，按段追加
+    relations_<n>.pkl         阶段 2 ~ 6 的关系，按段追加
+每次保存只写出上次保存之后新增的记录 / 关系；文件先写临时文件再 os.replace，中途被杀不会留下损坏的检查点。
+
+语法树无法序列化：续跑时已完成的文件只重新解析（不重新抽取），以重建后续阶段需要的语法树。
+"""
+import os
+import pickle
+import shutil
+
+CHECKPOINT_DIR = 'checkpoint'
+
+
+def _dump(path, data):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def _load(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def new_state(config):
+    return {
+        "config": config,
+        "files_done": 0,              # 阶段 1 已处理的调度文件数（含被隔离的）
+        "next_id": 1,
+        "isolated": [],
+        "isolated_digests": [],       # 抽取失败的文件内容哈希，内容相同的文件直接隔离
+        "entities_done": False,
+        "segments": {"records": 0, "relations": 0},
+        "saved": {"records": 0, "relations": 0},
+        "stages_done": [],
+        "stage": None,
+        "position": 0,
+    }
+
+
+def open_checkpoint(output_dir, config, every, resume=False):
+    """
+    every <= 0 且不续跑时返回 None（不保存检查点）。
+    resume 为 True 且存在检查点时加载它，参数与检查点不一致时报错；否则清空旧检查点重新开始
+    """
+    if every <= 0 and not resume:
+        return None
+    ckpt_dir = os.path.join(output_dir, CHECKPOINT_DIR)
+    state_path = os.path.join(ckpt_dir, 'state.pkl')
+    ckpt = {"dir": ckpt_dir, "every": max(every, 0), "resumed": False}
+
+    if resume and os.path.exists(state_path):
+        state = _load(state_path)
+        if state["config"] != config:
+            raise ValueError(f"检查点的运行参数与本次不一致，无法续跑：{state['config']} != {config}")
+        ckpt["state"] = state
+        ckpt["resumed"] = True
+    else:
+        shutil.rmtree(ckpt_dir, ignore_errors=True)
+        os.makedirs(ckpt_dir)
+        ckpt["state"] = new_state(config)
+    return ckpt
+
+
+def save_state(ckpt):
+    _dump(os.path.join(ckpt["dir"], 'state.pkl'), ckpt["state"])
+
+
+def flush(ckpt, kind, items):
+    """items 为完整列表，只把上次保存之后新增的部分写成一个新段"""
+    state = ckpt["state"]
+    new_items = items[state["saved"][kind]:]
+    if new_items:
+        segment = state["segments"][kind]
+        _dump(os.path.join(ckpt["dir"], f'{kind}_{segment:06d}.pkl'), new_items)
+        state["segments"][kind] = segment + 1
+        state["saved"][kind] = len(items)
+
+
+def load_segments(ckpt, kind):
+    items = []
+    for segment in range(ckpt["state"]["segments"][kind]):
+        items += _load(os.path.join(ckpt["dir"], f'{kind}_{segment:06d}.pkl'))
+    return items
+
+
+def save_entities(ckpt, records, next_id, budget, isolated_digests, done=False):
+    state = ckpt["state"]
+    flush(ckpt, "records", records)
+    state["next_id"] = next_id
+    state["isolated"] = list(budget["isolated"])
+    state["isolated_digests"] = list(isolated_digests)
+    state["entities_done"] = done
+    save_state(ckpt)
+
+
+def entity_tick(ckpt, records, next_id, budget, isolated_digests):
+    """阶段 1 每处理完一个调度文件调用一次"""
+    if ckpt is None:
+        return
+    ckpt["state"]["files_done"] += 1
+    if ckpt["every"] and ckpt["state"]["files_done"] % ckpt["every"] == 0:
+        save_entities(ckpt, records, next_id, budget, isolated_digests)
+
+
+def stage_done(ckpt, stage):
+    return ckpt is not None and stage in ckpt["state"]["stages_done"]
+
+
+def finish_stage(ckpt, stage, relations, budget=None):
+    if ckpt is None:
+        return
+    state = ckpt["state"]
+    flush(ckpt, "relations", relations)
+    state["stages_done"].append(stage)
+    state["stage"], state["position"] = None, 0
+    if budget is not None:
+        state["isolated"] = list(budget["isolated"])
+    save_state(ckpt)
+
+
+def iter_stage(ckpt, stage, items, relations, budget=None):
+    """
+    逐文件阶段的迭代：跳过检查点中该阶段已处理的文件，每处理 every 个文件保存一次，结束时标记阶段完成。
+    已完成的阶段不产出任何元素
+    """
+    if ckpt is None:
+        yield from items
+        return
+    if stage_done(ckpt, stage):
+        return
+
+    state = ckpt["state"]
+    start = state["position"] if state["stage"] == stage else 0
+    state["stage"] = stage
+    for position, item in enumerate(items):
+        if position < start:
+            continue
+        yield item
+        state["position"] = position + 1
+        if ckpt["every"] and state["position"] % ckpt["every"] == 0:
+            flush(ckpt, "relations", relations)
+            if budget is not None:
+                state["isolated"] = list(budget["isolated"])
+            save_state(ckpt)
+    finish_stage(ckpt, stage, relations, budget)
+
+
+def remove_checkpoint(ckpt):
+    """输出写完后删除检查点，之后的 --resume 从头开始"""
+    if ckpt is not None:
+        shutil.rmtree(ckpt["dir"], ignore_errors=True)
@@ -0,0 +1,248 @@
+"""
+按 compile_commands.json 选择抽取文件：只抽取实际参与编译的翻译单元（TU），
+再沿依赖关系加入这些 TU 用到的头文件，未参与构建的架构 / 配置代码不再解析。
+
+头文件依赖的来源：
+    1. 构建留下的 gcc 依赖文件：-MD / -MMD 生成的 .d、-MF 指定的路径，或 -Wp,-MD,<路径> / -Wp,-MMD,<路径>
+       传给预处理器的路径；依赖文件存在时即为该次构建实际读取的头文件
+    2. 没有依赖文件时，按 TU 的包含路径（-I / -iquote / -isystem / -idirafter）递归解析 #include，
+       条件编译中的 #include 一并计入，结果是真实依赖的超集（会多选未启用配置下的头文件）
+
+Kbuild（Linux）用 -Wp,-MMD,<目录>/.<目标>.o.d 生成依赖文件，但编译后随即由 fixdep 转写为 .<目标>.o.cmd 并删除 .d，
+因此构建完成的 Kbuild 树上通常找不到依赖文件，走的是第 2 种扫描，选中的头文件多于实际构建用到的。
+
+只保留源码根目录下的文件（系统头文件不抽取），输出顺序与 get_c_files 的遍历顺序一致。
+
+用法：
+    python run_extract_all.py --source linux/ --output out/ --compile-commands linux/compile_commands.json [--compile-flags]
+    python compile_db.py --source linux/ --compile-commands linux/compile_commands.json   # 只列出选中的文件
+"""
+import os
+import re
+import json
+import shlex
+
+INCLUDE_RE = re.compile(rb'^[ \t]*#[ \t]*include[ \t]*([<"])([^>"\n]+)[>"]', re.MULTILINE)
+# 不进入 FILE 实体 compile_flags 的参数（输出与依赖文件相关，每个 TU 各不相同）
+DROPPED_OPTIONS_WITH_VALUE = ("-o", "-MF", "-MT", "-MQ")
+DROPPED_OPTIONS = ("-c", "-MD", "-MMD", "-MP")
+# -Wp,<预处理器参数> 中指定依赖文件的参数，其后一项为依赖文件路径
+WP_DEPFILE_OPTIONS = ("-MD", "-MMD", "-MF")
+
+
+def entry_arguments(entry):
+    return entry["arguments"] if "arguments" in entry else shlex.split(entry["command"])
+
+
+def load_compile_commands(path):
+    """
+    读取 compile_commands.json，返回 TU 列表，每项为：
+        file        源文件绝对路径
+        directory   编译工作目录
+        arguments   完整编译参数
+    同一文件出现多次时保留第一条
+    """
+    with open(path, 'r') as f:
+        entries = json.load(f)
+
+    units = {}
+    for entry in entries:
+        directory = entry.get("directory", os.path.dirname(os.path.abspath(path)))
+        source = os.path.normpath(os.path.join(directory, entry["file"]))
+        units.setdefault(source, {
+            "file": source,
+            "directory": directory,
+            "arguments": entry_arguments(entry),
+        })
+    return list(units.values())
+
+
+def option_values(arguments, option):
+    """参数中 option 的全部取值，支持 -Idir 与 -I dir 两种写法"""
+    values = []
+    for i, arg in enumerate(arguments):
+        if arg == option and i + 1 < len(arguments):
+            values.append(arguments[i + 1])
+        elif arg.startswith(option) and arg != option:
+            values.append(arg[len(option):])
+    return values
+
+
+def search_paths(unit):
+    """
+    TU 的头文件搜索路径（绝对路径），与 gcc 的查找顺序一致：
+        quote   "..." 额外搜索的目录（-iquote），之后再搜索 angle
+        angle   <...> 搜索的目录（-I、-isystem、-idirafter 依次）
+        forced  -include 强制包含的文件
+    """
+    arguments, directory = unit["arguments"], unit["directory"]
+
+    def absolute(paths):
+        return tuple(os.path.normpath(os.path.join(directory, p)) for p in paths)
+
+    return {
+        "quote": absolute(option_values(arguments, "-iquote")),
+        "angle": absolute(
+            option_values(arguments, "-I") + option_values(arguments, "-isystem")
+            + option_values(arguments, "-idirafter")
+        ),
+        "forced": absolute(option_values(arguments, "-include")),
+    }
+
+
+def compile_flags(unit):
+    """附加到 FILE 实体的编译参数：去掉编译器路径、源文件、-c、输出与依赖文件选项"""
+    arguments = unit["arguments"][1:]
+    flags = []
+    skip = False
+    for arg in arguments:
+        if skip:
+            skip = False
+            continue
+        if arg in DROPPED_OPTIONS_WITH_VALUE:
+            skip = True
+            continue
+        if arg in DROPPED_OPTIONS or arg.startswith(DROPPED_OPTIONS_WITH_VALUE):
+            continue
+        if arg.startswith("-Wp,") and wp_depfile(arg) is not None:
+            continue
+        if os.path.normpath(os.path.join(unit["directory"], arg)) == unit["file"]:
+            continue
+        flags.append(arg)
+    return flags
+
+
+def resolve_include(name, kind, including_dir, paths, cache, exists=os.path.isfile):
+    """
+    解析 #include 的目标文件，找不到返回 None。
+    kind 为 '"' 或 '<'；cache 以 (名称, 种类, 所在目录, 搜索路径) 为键，跨 TU 复用
+    exists 判断候选路径是否存在，默认查看磁盘；按某个 git 修订解析时传入该修订的文件集合（同一 cache 只用同一个 exists）
+    """
+    base_dir = including_dir if kind == '"' else None
+    key = (name, kind, base_dir, paths["quote"], paths["angle"])
+    if key in cache:
+        return cache[key]
+
+    if os.path.isabs(name):
+        candidates = [name]
+    else:
+        dirs = ((base_dir,) + paths["quote"] if kind == '"' else ()) + paths["angle"]
+        candidates = [os.path.join(d, name) for d in dirs]
+    resolved = next((os.path.normpath(c) for c in candidates if exists(c)), None)
+    cache[key] = resolved
+    return resolved
+
+
+def scan_includes(source_path, read_cache):
+    """文件中的 #include 指令列表 [(种类, 名称)]，按文件缓存"""
+    if source_path not in read_cache:
+        try:
+            with open(source_path, 'rb') as f:
+                code_bytes = f.read()
+        except OSError:
+            code_bytes = b""
+        read_cache[source_path] = [
+            (m.group(1).decode(), m.group(2).decode('utf-8', errors='replace').strip())
+            for m in INCLUDE_RE.finditer(code_bytes)
+        ]
+    return read_cache[source_path]
+
+
+def wp_depfile(arg):
+    """-Wp,-MMD,<路径> 这类传给预处理器的参数中的依赖文件路径，没有时返回 None"""
+    parts = arg.split(",")[1:]
+    for i, part in enumerate(parts[:-1]):
+        if part in WP_DEPFILE_OPTIONS:
+            return parts[i + 1]
+    return None
+
+
+def depfile_path(unit):
+    """
+    构建留下的 gcc 依赖文件：-MF 指定的路径、-Wp,-MD,<路径> / -Wp,-MMD,<路径>（Kbuild 的写法），
+    或 -MD / -MMD 时与 -o 输出同名的 .d
+    """
+    arguments, directory = unit["arguments"], unit["directory"]
+    explicit = option_values(arguments, "-MF")
+    explicit += [path for path in map(wp_depfile, (a for a in arguments if a.startswith("-Wp,"))) if path]
+    if explicit:
+        return os.path.join(directory, explicit[0])
+    if "-MD" in arguments or "-MMD" in arguments:
+        outputs = option_values(arguments, "-o")
+        if outputs:
+            return os.path.join(directory, os.path.splitext(outputs[0])[0] + ".d")
+    return None
+
+
+def parse_depfile(path, directory):
+    """解析 make 格式的依赖文件，返回依赖文件的绝对路径列表（不含目标）"""
+    with open(path, 'r', errors='replace') as f:
+        text = f.read().replace("\\\n", " ")
+    deps = []
+    for line in text.splitlines():
+        if ":" not in line:
+            continue
+        # 第一个 "目标:" 之后为依赖；-MP 生成的 "头文件:" 空规则没有依赖
+        _, rest = line.split(":", 1)
+        for dep in re.split(r"(?<!\\) +", rest.strip()):
+            if dep:
+                deps.append(os.path.normpath(os.path.join(directory, dep.replace("\\ ", " "))))
+    return deps
+
+
+def unit_dependencies(unit, resolve_cache, read_cache):
+    """TU 依赖的全部文件（含自身）：优先读依赖文件，否则递归解析 #include"""
+    dep_path = depfile_path(unit)
+    if dep_path and os.path.isfile(dep_path):
+        return [unit["file"]] + parse_depfile(dep_path, unit["directory"])
+
+    paths = search_paths(unit)
+    seen = {unit["file"]}
+    stack = [unit["file"]] + [p for p in paths["forced"] if os.path.isfile(p)]
+    seen.update(stack)
+    while stack:
+        current = stack.pop()
+        for kind, name in scan_includes(current, read_cache):
+            target = resolve_include(name, kind, os.path.dirname(current), paths, resolve_cache)
+            if target is not None and target not in seen:
+                seen.add(target)
+                stack.append(target)
+    return list(seen)
+
+
+def select_compiled_files(source_paths, compile_commands_path):
+    """
+    source_paths 为源码根目录的遍历结果（get_c_files），返回 (paths, units)：
+        paths  其中参与构建的 TU 及其依赖的头文件，保持遍历顺序与路径写法
+        units  TU 路径（与 paths 写法一致）-> TU（load_compile_commands 的一项）
+    """
+    resolve_cache, read_cache = {}, {}
+    selected = set()
+    units_by_real = {}
+    for unit in load_compile_commands(compile_commands_path):
+        selected.update(os.path.realpath(p) for p in unit_dependencies(unit, resolve_cache, read_cache))
+        units_by_real[os.path.realpath(unit["file"])] = unit
+
+    paths = []
+    units = {}
+    for source_path in source_paths:
+        real = os.path.realpath(source_path)
+        if real in selected:
+            paths.append(source_path)
+            if real in units_by_real:
+                units[source_path] = units_by_real[real]
+    return paths, units
+
+
+if __name__ == "__main__":
+    import argparse
+    from run_extract_all import get_c_files
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--source", type=str, required=True, help="C 源码目录路径")
+    parser.add_argument("--compile-commands", type=str, required=True, help="compile_commands.json 路径")
+    args = parser.parse_args()
+
+    paths, units = select_compiled_files(get_c_files(args.source), args.compile_commands)
+    for source_path in paths:
+        print(source_path)
+    print(f"\n📦 选中文件 {len(paths)} 个，其中翻译单元 {len(units)} 个")
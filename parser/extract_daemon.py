@@ -0,0 +1,518 @@
+"""
+常驻抽取服务：Language / Parser、语法树、符号表和最近一次抽取结果常驻内存，
+通过本地 Unix socket 接收请求，避免每次运行重复加载 .so、导入模块、读取 macro.json 与重建映射表。
+
+协议：每行一个 JSON 请求，每行一个 JSON 响应。
+    {"cmd": "extract", "source": "data/"}            全量抽取（未变化的文件复用缓存的语法树与实体）
+    {"cmd": "reextract", "files": ["a.c", "b.h"]}     增量更新：只重抽取指定文件及引用了其变化符号的文件
+    {"cmd": "dump", "output": "output/"}              写出 entity.json / relation.json
+    {"cmd": "dump", "inline": true}                   直接在响应中返回图谱
+    {"cmd": "lookup", "name": "foo"}                  按名称查询实体及其关系
+    {"cmd": "stats"}                                  实体数、关系数与关系类型统计
+    {"cmd": "shutdown"}                               退出服务
+
+reextract 的增量口径与 git_delta 一致：
+    - 变化文件按实体键沿用旧 id，其它文件中指向这些实体的关系保持有效
+    - 定义发生增删（或声明类型变化）的全局符号名 -> 在缓存的源码中以整词引用了这些名字的文件，一并重抽取
+    - 受影响文件分别在旧 / 新符号表上重算逐文件关系，取多重集差就地修补关系存储与查询索引
+    - 阶段 6 的间接 CALLS 只在差异涉及 ASSIGNED_TO、指向变量 / 字段的 CALLS 或有间接调用的函数时重算
+    全局符号表仍按文件记录重新合并（不遍历语法树）；macro.json 变化时回退为全图重建
+
+用法：
+    python extract_daemon.py serve --socket /tmp/code_kg.sock --source ../data --output ../output
+    python extract_daemon.py request --socket /tmp/code_kg.sock '{"cmd": "lookup", "name": "main"}'
+"""
+import os
+import re
+import json
+import socket
+import socketserver
+import time
+from collections import defaultdict, Counter
+
+from run_extract_all import (
+    MACRO_JSON_PATH,
+    id_generator,
+    get_parser,
+    get_c_files,
+    load_macro_lookup_map,
+    extract_file_record,
+    record_entities,
+    rebind_record,
+    merge_file_records,
+    extract_relations,
+    extract_file_relations,
+    write_graph,
+)
+from extract_relation_indirect_calls import extract_indirect_calls_relations
+from graph_delta import entity_keys, relation_key, diff_relations
+from git_delta import GLOBAL_SYMBOL_TYPES
+from source_reader import read_source_bytes
+
+
+def new_state(macro_json_path=MACRO_JSON_PATH, output_dir=None):
+    return {
+        "parser": get_parser(),
+        "id_counter": id_generator(),
+        "source_dir": None,
+        "output_dir": output_dir,
+        "macro_json_path": macro_json_path,
+        "macro_mtime": None,
+        "macro_lookup_map": {},
+        "files": {},          # source_path -> {"code_bytes", "tree", "record"}
+        "entities": [],
+        "relations": [],      # 完整关系列表；增量更新后置为 None，由 graph_relations 按需重新拼接
+        "direct_bag": None,   # 关系键 -> [relation]，阶段 2 ~ 5 的关系，增量更新在此修补
+        "indirect_relations": [],
+        "symbols": {},
+        "entity_index": {},   # id -> entity
+        "name_index": {},     # name -> [entity]
+        "relation_index": {}, # id -> [relation]（作为 head 或 tail 出现）
+    }
+
+
+def refresh_macro_map(state):
+    """macro.json 未变化时沿用已加载的宏映射；重新加载时返回 True"""
+    path = state["macro_json_path"]
+    mtime = os.stat(path).st_mtime_ns if os.path.exists(path) else None
+    if mtime != state["macro_mtime"]:
+        state["macro_lookup_map"] = load_macro_lookup_map(path) if mtime is not None else {}
+        state["macro_mtime"] = mtime
+        return True
+    return False
+
+
+def update_file(state, source_path, code_bytes):
+    """
+    内容未变化时复用缓存的语法树与实体记录，否则重新解析与抽取；
+    已缓存的文件按实体键沿用旧 id，新实体分配新 id
+    """
+    cached = state["files"].get(source_path)
+    if cached is not None and cached["code_bytes"] == code_bytes:
+        return False
+
+    tree = state["parser"].parse(code_bytes)
+    if cached is None:
+        record = extract_file_record(source_path, tree.root_node, code_bytes, state["id_counter"])
+    else:
+        record = extract_file_record(source_path, tree.root_node, code_bytes, id_generator())
+        old_list = record_entities(cached["record"])
+        old_ids = dict(zip(entity_keys(old_list), (e["id"] for e in old_list)))
+        new_list = record_entities(record)
+        id_map = {
+            e["id"]: old_ids.get(key) or str(next(state["id_counter"]))
+            for e, key in zip(new_list, entity_keys(new_list))
+        }
+        record = rebind_record(record, id_map)
+    state["files"][source_path] = {"code_bytes": code_bytes, "tree": tree, "record": record}
+    return True
+
+
+# === 查询索引的就地维护 ===
+
+def index_entities(state, entities):
+    for e in entities:
+        state["entity_index"][e["id"]] = e
+        state["name_index"].setdefault(e["name"], []).append(e)
+
+
+def unindex_entities(state, entities):
+    for e in entities:
+        if state["entity_index"].get(e["id"]) is e:
+            del state["entity_index"][e["id"]]
+        same_name = state["name_index"].get(e["name"], [])
+        same_name[:] = [x for x in same_name if x is not e]
+        if not same_name:
+            state["name_index"].pop(e["name"], None)
+
+
+def relation_endpoints(rel):
+    ids = []
+    for key in ("head", "tail"):
+        ids += rel[key] if isinstance(rel[key], list) else [rel[key]]
+    return ids
+
+
+def index_relations(state, relations):
+    relation_index = state["relation_index"]
+    for rel in relations:
+        for entity_id in relation_endpoints(rel):
+            relation_index.setdefault(entity_id, []).append(rel)
+
+
+def unindex_relations(state, relations):
+    """按对象身份移除（同一关系以同一对象登记在各端点下）"""
+    relation_index = state["relation_index"]
+    for rel in relations:
+        for entity_id in relation_endpoints(rel):
+            rels = relation_index.get(entity_id, [])
+            for i, x in enumerate(rels):
+                if x is rel:
+                    del rels[i]
+                    break
+            if not rels:
+                relation_index.pop(entity_id, None)
+
+
+def graph_relations(state):
+    """完整关系列表：阶段 2 ~ 5 的关系在前，间接 CALLS 在后"""
+    if state["relations"] is None:
+        state["relations"] = [
+            rel for rels in state["direct_bag"].values() for rel in rels
+        ] + state["indirect_relations"]
+    return state["relations"]
+
+
+def rebuild_graph(state):
+    """由缓存的逐文件记录重建全局符号表与关系，并刷新查询索引"""
+    refresh_macro_map(state)
+    files = state["files"]
+    records = [files[p]["record"] for p in files]
+    file_trees = [(p, files[p]["tree"].root_node, files[p]["code_bytes"]) for p in files]
+
+    entities, symbols = merge_file_records(records)
+    # 阶段 6 单独计算，增量更新时可按需重算
+    direct = extract_relations(
+        file_trees, records, entities, symbols, state["macro_lookup_map"], indirect_calls=False
+    )
+    indirect = extract_indirect_calls_relations(entities, direct)
+    print(f"🎯 阶段 6：函数指针间接调用解析 {len(indirect)} 条")
+
+    state["entities"] = entities
+    state["relations"] = direct + indirect
+    state["indirect_relations"] = indirect
+    state["symbols"] = symbols
+    bag = defaultdict(list)
+    for rel in direct:
+        bag[relation_key(rel)].append(rel)
+    state["direct_bag"] = dict(bag)
+
+    state["entity_index"] = {}
+    state["name_index"] = {}
+    state["relation_index"] = {}
+    index_entities(state, entities)
+    index_relations(state, state["relations"])
+
+
+def symbol_signatures(entities):
+    """影响其它文件名字解析的全局符号：(类型, 名称, 声明的结构体类型)"""
+    return {
+        (e["type"], e["name"], e.get("struct_type"))
+        for e in entities
+        if e["type"] in GLOBAL_SYMBOL_TYPES or (e["type"] == "VARIABLE" and e.get("scope") == "global")
+    }
+
+
+def referencing_files(state, names, exclude):
+    """缓存源码中以整词形式引用了 names 中任一名字的文件（先按子串快速过滤）"""
+    if not names:
+        return []
+    encoded = [name.encode("utf-8") for name in names]
+    pattern = re.compile(
+        rb"(?<![A-Za-z0-9_])(?:" + rb"|".join(re.escape(n) for n in encoded) + rb")(?![A-Za-z0-9_])"
+    )
+    return [
+        path for path, entry in state["files"].items()
+        if path not in exclude
+        and any(n in entry["code_bytes"] for n in encoded)
+        and pattern.search(entry["code_bytes"])
+    ]
+
+
+def indirect_affected(state, relations):
+    """关系差异是否可能改变阶段 6 的结果"""
+    entity_index = state["entity_index"]
+
+    def pointer_call(rel):
+        tails = rel["tail"] if isinstance(rel["tail"], list) else [rel["tail"]]
+        return any(entity_index.get(t, {}).get("type") != "FUNCTION" for t in tails)
+
+    for rel in relations:
+        if rel["type"] == "ASSIGNED_TO":
+            return True
+        if rel["type"] != "CALLS":
+            continue
+        # 指向变量 / 字段的调用改变指针调用点；直接调用的增删改变同一调用者间接调用的去重
+        if pointer_call(rel) or any(
+            other["type"] == "CALLS" and other["head"] == rel["head"] and pointer_call(other)
+            for other in state["relation_index"].get(rel["head"], [])
+        ):
+            return True
+    return False
+
+
+def apply_file_changes(state, old_entries):
+    """
+    old_entries: source_path -> 变化前的缓存项（新增文件为 None），state["files"] 已更新为变化后
+    只重算受影响文件的关系并就地修补，返回统计
+    """
+    if state["direct_bag"] is None or refresh_macro_map(state):
+        rebuild_graph(state)
+        return {"dependents": None, "rebuilt": True}
+
+    files = state["files"]
+    macro_lookup_map = state["macro_lookup_map"]
+    old_symbols = state["symbols"]
+    old_var_param = {**old_symbols["variable_id_map"], **old_symbols["param_id_map"]}
+
+    # 定义发生增删的符号名 -> 引用它们的未变化文件
+    changed_names = set()
+    for path, old in old_entries.items():
+        before = symbol_signatures(record_entities(old["record"])) if old is not None else set()
+        after = symbol_signatures(record_entities(files[path]["record"])) if path in files else set()
+        changed_names |= {name for _, name, _ in before ^ after}
+    dependents = referencing_files(state, changed_names, old_entries)
+
+    # 旧关系：变化前的语法树与符号表
+    old_relations = []
+    for path, old in list(old_entries.items()) + [(p, files[p]) for p in dependents]:
+        if old is None:
+            continue
+        old_relations += extract_file_relations(
+            path, old["tree"].root_node, old["code_bytes"], old["record"], old_symbols, old_var_param,
+            macro_lookup_map
+        )
+
+    entities, symbols = merge_file_records([files[p]["record"] for p in files])
+    var_param = {**symbols["variable_id_map"], **symbols["param_id_map"]}
+    new_relations = []
+    for path in [p for p in old_entries if p in files] + dependents:
+        entry = files[path]
+        new_relations += extract_file_relations(
+            path, entry["tree"].root_node, entry["code_bytes"], entry["record"], symbols, var_param,
+            macro_lookup_map
+        )
+    added, removed = diff_relations(old_relations, new_relations)
+
+    # 实体与关系的就地修补
+    for path, old in old_entries.items():
+        if old is not None:
+            unindex_entities(state, record_entities(old["record"]))
+        if path in files:
+            index_entities(state, record_entities(files[path]["record"]))
+    state["entities"] = entities
+    state["symbols"] = symbols
+
+    bag = state["direct_bag"]
+    stale = []
+    for rel in removed:
+        key = relation_key(rel)
+        stale.append(bag[key].pop())
+        if not bag[key]:
+            del bag[key]
+    for rel in added:
+        bag.setdefault(relation_key(rel), []).append(rel)
+    unindex_relations(state, stale)
+    index_relations(state, added)
+
+    indirect_changes = (0, 0)
+    if indirect_affected(state, added + stale):
+        direct = [rel for rels in bag.values() for rel in rels]
+        indirect = extract_indirect_calls_relations(entities, direct)
+        indirect_added, indirect_removed = diff_relations(state["indirect_relations"], indirect)
+        indirect_changes = (len(indirect_added), len(indirect_removed))
+        unindex_relations(state, state["indirect_relations"])
+        index_relations(state, indirect)
+        state["indirect_relations"] = indirect
+    state["relations"] = None
+
+    return {
+        "dependents": len(dependents),
+        "relations": {"added": len(added) + indirect_changes[0], "removed": len(removed) + indirect_changes[1]},
+    }
+
+
+def handle_extract(state, request):
+    source_dir = request.get("source") or state["source_dir"]
+    if not source_dir:
+        raise ValueError("未指定 source")
+    state["source_dir"] = source_dir
+
+    seen = []
+    changed = 0
+    for source_path in get_c_files(source_dir):
+        seen.append(source_path)
+        changed += update_file(state, source_path, read_source_bytes(source_path))
+
+    # 保持遍历顺序，丢弃已删除的文件
+    state["files"] = {p: state["files"][p] for p in seen}
+    rebuild_graph(state)
+    return {"files": len(seen), "changed": changed}
+
+
+def handle_reextract(state, request):
+    changed = 0
+    removed = 0
+    old_entries = {}
+    # 请求中的路径可能与遍历得到的路径写法不同，统一按绝对路径匹配缓存键；
+    # 源码目录下的新文件按遍历的写法登记，与之后的全量 extract 一致
+    known_paths = {os.path.abspath(p): p for p in state["files"]}
+    source_dir = state["source_dir"]
+    for source_path in request.get("files", []):
+        abs_path = os.path.abspath(source_path)
+        if abs_path in known_paths:
+            source_path = known_paths[abs_path]
+        elif source_dir and os.path.commonpath([abs_path, os.path.abspath(source_dir)]) == os.path.abspath(source_dir):
+            source_path = os.path.join(source_dir, os.path.relpath(abs_path, source_dir))
+        old = state["files"].get(source_path)
+        if os.path.exists(source_path):
+            if update_file(state, source_path, read_source_bytes(source_path)):
+                changed += 1
+                old_entries.setdefault(source_path, old)
+        elif state["files"].pop(source_path, None) is not None:
+            removed += 1
+            old_entries.setdefault(source_path, old)
+    result = {"changed": changed, "removed": removed}
+    if old_entries:
+        result.update(apply_file_changes(state, old_entries))
+    return result
+
+
+def handle_dump(state, request):
+    relations = graph_relations(state)
+    if request.get("inline"):
+        return {"entities": state["entities"], "relations": relations}
+    output_dir = request.get("output") or state["output_dir"]
+    if not output_dir:
+        raise ValueError("未指定 output")
+    write_graph(output_dir, state["entities"], relations)
+    return {"output": output_dir, "entities": len(state["entities"]), "relations": len(relations)}
+
+
+def handle_lookup(state, request):
+    name = request.get("name")
+    entity_index = state["entity_index"]
+
+    def other_names(rel, entity_id):
+        # 对端实体名，便于编辑器直接展示
+        other = rel["tail"] if rel["head"] == entity_id else rel["head"]
+        ids = other if isinstance(other, list) else [other]
+        return [entity_index[i]["name"] for i in ids if i in entity_index]
+
+    matches = []
+    for e in state["name_index"].get(name, []):
+        rels = state["relation_index"].get(e["id"], [])
+        matches.append({
+            "entity": e,
+            "relations": [
+                {
+                    "head": rel["head"],
+                    "tail": rel["tail"],
+                    "type": rel["type"],
+                    "other": other_names(rel, e["id"]),
+                }
+                for rel in rels
+            ],
+        })
+    return {"matches": matches}
+
+
+def handle_stats(state, request):
+    relations = graph_relations(state)
+    return {
+        "source": state["source_dir"],
+        "files": len(state["files"]),
+        "entities": len(state["entities"]),
+        "relations": len(relations),
+        "relation_types": dict(Counter(r["type"] for r in relations)),
+    }
+
+
+HANDLERS = {
+    "extract": handle_extract,
+    "reextract": handle_reextract,
+    "dump": handle_dump,
+    "lookup": handle_lookup,
+    "stats": handle_stats,
+}
+
+
+def handle_request(state, request):
+    cmd = request.get("cmd")
+    handler = HANDLERS.get(cmd)
+    if handler is None:
+        return {"ok": False, "error": f"未知命令：{cmd}"}
+    start_time = time.time()
+    try:
+        result = handler(state, request)
+    except Exception as e:
+        return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+    result["ok"] = True
+    result["elapsed"] = round(time.time() - start_time, 4)
+    return result
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError as e:
+                response = {"ok": False, "error": f"JSON 解析失败：{e}"}
+            else:
+                if request.get("cmd") == "shutdown":
+                    self.server.stop_requested = True
+                    response = {"ok": True}
+                else:
+                    response = handle_request(self.server.state, request)
+            self.wfile.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+            self.wfile.flush()
+            if self.server.stop_requested:
+                return
+
+
+def serve(socket_path, state):
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+
+    # 单线程逐个处理请求：状态无需加锁
+    server = socketserver.UnixStreamServer(socket_path, _RequestHandler)
+    server.state = state
+    server.stop_requested = False
+    os.chmod(socket_path, 0o600)
+    print(f"🛰️ 抽取服务已启动：{socket_path}")
+    try:
+        while not server.stop_requested:
+            server.handle_request()
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+    print("🛑 抽取服务已退出")
+
+
+def send_request(socket_path, request):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        with sock.makefile("rb") as f:
+            return json.loads(f.readline())
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="mode", required=True)
+
+    p_serve = sub.add_parser("serve", help="启动常驻抽取服务")
+    p_serve.add_argument("--socket", type=str, required=True, help="Unix socket 路径")
+    p_serve.add_argument("--source", type=str, help="启动时预先抽取的 C 源码目录")
+    p_serve.add_argument("--output", type=str, help="dump 默认输出目录")
+    p_serve.add_argument("--macro-json", type=str, default=MACRO_JSON_PATH, help="宏展开信息 macro.json 路径")
+
+    p_request = sub.add_parser("request", help="向抽取服务发送一条请求")
+    p_request.add_argument("--socket", type=str, required=True, help="Unix socket 路径")
+    p_request.add_argument("request", type=str, help="JSON 请求，如 '{\"cmd\": \"stats\"}'")
+
+    args = parser.parse_args()
+
+    if args.mode == "serve":
+        state = new_state(args.macro_json, args.output)
+        if args.source:
+            print(handle_request(state, {"cmd": "extract", "source": args.source}))
+        serve(args.socket, state)
+    else:
+        print(json.dumps(send_request(args.socket, json.loads(args.request)), ensure_ascii=False, indent=2))
@@ -1,3 +1,6 @@
+from field_type_index import declared_struct_type
+
+
 def extract_field_entities(root_node, code_bytes, id_counter, struct_id_map):
     def get_text(node):
         return code_bytes[node.start_byte:node.end_byte].decode('utf-8', errors='ignore')
@@ -44,14 +47,21 @@ def extract_field_entities(root_node, code_bytes, id_counter, struct_id_map):
             start_line = field.start_point[0] + 1  # 转为从1开始的行号
             end_line = field.end_point[0] + 1
 
-            field_entities.append({
+            entity = {
                 "id": field_id,
                 "name": field_name,
                 "type": "FIELD",
                 "scope": parent_scope,
                 "start_line": start_line,
-                "end_line": end_line
-            })
+                "end_line": end_line,
+                "start_byte": field.start_byte,
+                "end_byte": field.end_byte
+            }
+            # 结构体类型的字段记录声明类型，用于逐级解析 a->b->c
+            struct_type = declared_struct_type(type_node, get_text)
+            if struct_type:
+                entity["struct_type"] = struct_type
+            field_entities.append(entity)
             field_id_map.setdefault(field_name, []).append(field_id)
 
     def traverse(node, current_scope="global"):
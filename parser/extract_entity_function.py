@@ -1,4 +1,5 @@
-def extract_function_entities(root_node, code_bytes, id_counter):
+def extract_function_entities(root_node, code_bytes, id_counter, skip_bodies=False):
+    """skip_bodies 为 True 时不进入函数体（声明级快速扫描，忽略 GCC 嵌套函数）"""
     def get_text(node):
         return code_bytes[node.start_byte:node.end_byte].decode('utf-8', errors='ignore')
 
@@ -36,10 +37,14 @@ def extract_function_entities(root_node, code_bytes, id_counter):
                 "name": func_name,
                 "type": "FUNCTION",
                 "start_line": start_line,
-                "end_line": end_line
+                "end_line": end_line,
+                "start_byte": node.start_byte,
+                "end_byte": node.end_byte
             }
             entities.append(entity)
             id_map[func_name] = func_id
+            if skip_bodies:
+                return
 
         for child in node.children:
             traverse(child)
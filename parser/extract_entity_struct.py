@@ -5,7 +5,7 @@ def extract_struct_entities(root_node, code_bytes, id_counter):
     struct_entities = []
     struct_id_map = {}  # (name, scope) -> id
 
-    def add_struct(name, scope, start_line=None, end_line=None):
+    def add_struct(name, scope, node=None):
         key = (name, scope)
         if key in struct_id_map:
             return struct_id_map[key]
@@ -17,9 +17,11 @@ def extract_struct_entities(root_node, code_bytes, id_counter):
             "type": "STRUCT",
             "scope": scope
         }
-        if start_line is not None and end_line is not None:
-            entity["start_line"] = start_line
-            entity["end_line"] = end_line
+        if node is not None:
+            entity["start_line"] = node.start_point[0] + 1
+            entity["end_line"] = node.end_point[0] + 1
+            entity["start_byte"] = node.start_byte
+            entity["end_byte"] = node.end_byte
 
         struct_entities.append(entity)
         struct_id_map[key] = struct_id
@@ -38,9 +40,7 @@ def extract_struct_entities(root_node, code_bytes, id_counter):
                 return  # 匿名 struct 或前向声明，不处理
 
             struct_name = get_text(id_node).strip()
-            start_line = node.start_point[0] + 1
-            end_line = node.end_point[0] + 1
-            add_struct(struct_name, current_scope, start_line, end_line)
+            add_struct(struct_name, current_scope, node)
 
             # 遍历其字段，设定新的作用域为该 struct 名
             for field in field_list.children:
@@ -62,9 +62,7 @@ def extract_struct_entities(root_node, code_bytes, id_counter):
                     return
 
                 struct_name = get_text(name_node).strip()
-                start_line = type_node.start_point[0] + 1
-                end_line = type_node.end_point[0] + 1
-                add_struct(struct_name, current_scope, start_line, end_line)
+                add_struct(struct_name, current_scope, type_node)
 
                 for field in field_list.children:
                     traverse(field, current_scope=struct_name)
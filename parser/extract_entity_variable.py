@@ -1,6 +1,10 @@
-def extract_variable_entities(root_node, code_bytes, id_counter):
+from field_type_index import declared_struct_type
+
+
+def extract_variable_entities(root_node, code_bytes, id_counter, skip_bodies=False):
     """
     提取局部变量和全局变量实体，不包括函数参数。
+    skip_bodies 为 True 时不进入函数体，只提取全局变量。
     返回 id_map[(var_name, scope)] = var_id
     """
 
@@ -31,7 +35,7 @@ def extract_variable_entities(root_node, code_bytes, id_counter):
                 return
             func_name = get_text(func_node)
             func_body = node.child_by_field_name('body')
-            if func_body:
+            if func_body and not skip_bodies:
                 traverse(func_body, current_scope=func_name)
             return
 
@@ -49,8 +53,14 @@ def extract_variable_entities(root_node, code_bytes, id_counter):
                     "type": "VARIABLE",
                     "scope": current_scope,
                     "start_line": start_line,
-                    "end_line": end_line
+                    "end_line": end_line,
+                    "start_byte": node.start_byte,
+                    "end_byte": node.end_byte
                 }
+                # 结构体类型的变量记录声明类型，用于按 (结构体, 字段) 解析字段访问
+                struct_type = declared_struct_type(node.child_by_field_name('type'), get_text)
+                if struct_type:
+                    entity["struct_type"] = struct_type
                 entities.append(entity)
                 id_map[(var_name, current_scope)] = var_id
                 scope_map.setdefault(current_scope, []).append(var_id)
@@ -60,10 +70,10 @@ def extract_variable_entities(root_node, code_bytes, id_counter):
 
     traverse(root_node)
     return entities, id_map, scope_map
-def extract_function_parameters(root_node, code_bytes, id_counter, function_id_map):
+def extract_function_parameters(root_node, code_bytes, id_counter, function_id_map, skip_bodies=False):
     """
     抽取函数参数变量（role=param），每个参数作为一个 VARIABLE 实体，
-    scope 设为函数名，附加属性 role="param"
+    scope 设为函数名，附加属性 role="param"；skip_bodies 为 True 时不进入函数体
     返回 param_id_map[(name, scope)] = id
     """
 
@@ -115,16 +125,24 @@ def extract_function_parameters(root_node, code_bytes, id_counter, function_id_m
                             param_id = str(next(id_counter))
                             start_line = param.start_point[0] + 1
                             end_line = param.end_point[0] + 1
-                            param_entities.append({
+                            entity = {
                                 "id": param_id,
                                 "name": param_name,
                                 "type": "VARIABLE",
                                 "scope": current_function,
                                 "role": "param",
                                 "start_line": start_line,
-                                "end_line": end_line
-                            })
+                                "end_line": end_line,
+                                "start_byte": param.start_byte,
+                                "end_byte": param.end_byte
+                            }
+                            struct_type = declared_struct_type(param.child_by_field_name('type'), get_text)
+                            if struct_type:
+                                entity["struct_type"] = struct_type
+                            param_entities.append(entity)
                             param_id_map[(param_name, current_function)] = param_id
+            if skip_bodies:
+                return
 
         for child in node.children:
             traverse(child, current_function)
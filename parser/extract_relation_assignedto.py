@@ -1,3 +1,6 @@
+from field_type_index import declared_struct_type, field_ids, field_struct_type, resolve_field_expression
+
+
 def extract_assigned_to_relations(
     root_node,
     code_bytes,
@@ -5,11 +8,22 @@ def extract_assigned_to_relations(
     variable_id_map,
     field_id_map,
     macro_lookup_map=None,
-    file_path=None
+    file_path=None,
+    field_index=None,
+    sites=None
 ):
+    """
+    sites 给定（列表）时，每条关系同时追加赋值点 (行, 列, 字节偏移)，与返回的关系一一对应
+    右值取自函数调用的结果（x = f(...)、x = dev->get()）时关系带 "rhs": "call"：
+    tail 是被调用者而不是被取址的函数，函数指针分析不把它当作指向约束
+    """
     def get_text(node):
         return code_bytes[node.start_byte:node.end_byte].decode("utf-8", errors="ignore")
 
+    def add_site(node):
+        if sites is not None:
+            sites.append((node.start_point[0] + 1, node.start_point[1] + 1, node.start_byte))
+
     def find_macro_expansion(node):
         if not macro_lookup_map or not file_path:
             return None, None, None
@@ -34,7 +48,8 @@ def extract_assigned_to_relations(
 
     assigned_to_relations = []
 
-    def resolve_entity_id(node, current_scope):
+    def resolve_entity_id(node, current_scope, calls=None):
+        """calls 给定（列表）时，解析结果取自函数调用内部则追加该调用节点"""
         if node is None:
             return None
 
@@ -59,7 +74,11 @@ def extract_assigned_to_relations(
             field_node = node.child_by_field_name('field')
             field_text = get_text(field_node).strip() if field_node else "<?>"
             # print(f"➡️ 字段访问：{field_text}")
-            return field_id_map.get(field_text)
+            # 优先按接收者类型定位 (结构体, 字段)，类型未知时回退到字段名
+            return (
+                resolve_field_expression(field_index, node, get_text, variable_id_map, current_scope)
+                or field_id_map.get(field_text)
+            )
 
         # 普通标识符
         if node.type in ('identifier', 'field_identifier'):
@@ -78,12 +97,25 @@ def extract_assigned_to_relations(
 
         # 递归子节点
         for child in node.children:
-            result = resolve_entity_id(child, current_scope)
+            result = resolve_entity_id(child, current_scope, calls)
             if result:
+                if calls is not None and node.type == 'call_expression':
+                    calls.append(node)
                 return result
 
         return None
 
+    def add_relation(lhs_id, rhs_id, calls, site_node):
+        rel = {
+            "head": lhs_id,
+            "tail": rhs_id,
+            "type": "ASSIGNED_TO"
+        }
+        if calls:
+            rel["rhs"] = "call"
+        assigned_to_relations.append(rel)
+        add_site(site_node)
+
     def find_identifier(node):
         if node is None:
             return None
@@ -104,6 +136,48 @@ def extract_assigned_to_relations(
                 return lhs, rhs
         return None, None
 
+    def extract_designated_initializers(init_list, current_scope, struct_type=None):
+        """
+        ops 表的指定初始化器：{ .open = my_open, .ops = { .read = my_read } }
+        每个 .field = value 记为 FIELD-[ASSIGNED_TO]->value
+        struct_type 为被初始化对象的结构体类型（已知时按 (结构体, 字段) 定位字段）
+        """
+        for child in init_list.children:
+            if child.type == 'initializer_list':
+                extract_designated_initializers(child, current_scope, struct_type)
+                continue
+            if child.type != 'initializer_pair':
+                continue
+
+            value = child.child_by_field_name('value')
+            if value is None:
+                continue
+
+            # 多级指定符（.a.b = x）逐级确定字段所属的结构体，取最后一个字段名
+            field_names = []
+            for designator in child.children:
+                if designator.type != 'field_designator':
+                    continue
+                name_node = next((c for c in designator.children if c.type == 'field_identifier'), None)
+                if name_node is not None:
+                    field_names.append(get_text(name_node).strip())
+            owner_type = struct_type
+            for name in field_names[:-1]:
+                owner_type = field_struct_type(field_index, owner_type, name)
+
+            if value.type == 'initializer_list':
+                nested_type = field_struct_type(field_index, owner_type, field_names[-1]) if field_names else None
+                extract_designated_initializers(value, current_scope, nested_type)
+                continue
+            if not field_names:
+                continue
+
+            lhs_id = field_ids(field_index, owner_type, field_names[-1]) or field_id_map.get(field_names[-1])
+            calls = []
+            rhs_id = resolve_entity_id(value, current_scope, calls)
+            if lhs_id and rhs_id:
+                add_relation(lhs_id, rhs_id, calls, child)
+
     def traverse(node, current_scope='global'):
         if node.type == 'function_definition':
             declarator = node.child_by_field_name('declarator')
@@ -120,30 +194,27 @@ def extract_assigned_to_relations(
                     right = child.child_by_field_name('right')
                     if left and right:
                         lhs_id = resolve_entity_id(left, current_scope)
-                        rhs_id = resolve_entity_id(right, current_scope)
+                        calls = []
+                        rhs_id = resolve_entity_id(right, current_scope, calls)
                         # print(f"\n📌 赋值语句：{get_text(left)} = {get_text(right)}")
                         # print(f"🔍 左值ID: {lhs_id}, 右值ID: {rhs_id}")
                         if lhs_id and rhs_id:
-                            assigned_to_relations.append({
-                                "head": lhs_id,
-                                "tail": rhs_id,
-                                "type": "ASSIGNED_TO"
-                            })
+                            add_relation(lhs_id, rhs_id, calls, child)
 
         # 声明赋值
         if node.type == 'declaration':
             lhs_node, rhs_node = find_assignment_in_declaration(node)
-            if lhs_node and rhs_node:
+            if rhs_node is not None and rhs_node.type == 'initializer_list':
+                struct_type = declared_struct_type(node.child_by_field_name('type'), get_text)
+                extract_designated_initializers(rhs_node, current_scope, struct_type)
+            elif lhs_node and rhs_node:
                 lhs_id = resolve_entity_id(lhs_node, current_scope)
-                rhs_id = resolve_entity_id(rhs_node, current_scope)
+                calls = []
+                rhs_id = resolve_entity_id(rhs_node, current_scope, calls)
                 # print(f"\n📌 声明赋值：{get_text(lhs_node)} = {get_text(rhs_node)}")
                 # print(f"🔍 左值ID: {lhs_id}, 右值ID: {rhs_id}")
                 if lhs_id and rhs_id:
-                    assigned_to_relations.append({
-                        "head": lhs_id,
-                        "tail": rhs_id,
-                        "type": "ASSIGNED_TO"
-                    })
+                    add_relation(lhs_id, rhs_id, calls, lhs_node)
 
         for child in node.children:
             traverse(child, current_scope)
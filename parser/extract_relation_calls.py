@@ -1,3 +1,6 @@
+from field_type_index import resolve_field_expression
+
+
 def extract_calls_relations(
     root_node,
     code_bytes,
@@ -5,8 +8,11 @@ def extract_calls_relations(
     variable_id_map,
     field_id_map,
     macro_lookup_map=None,
-    file_path=None
+    file_path=None,
+    field_index=None,
+    sites=None
 ):
+    """sites 给定（列表）时，每条关系同时追加调用点 (行, 列, 字节偏移)，与返回的关系一一对应"""
     def get_text(node):
         return code_bytes[node.start_byte:node.end_byte].decode("utf-8", errors="ignore")
 
@@ -21,6 +27,12 @@ def extract_calls_relations(
                 return result
         return None
 
+    def unwrap_callee(node):
+        # 去掉 (*fp)、(fp) 之类的包装
+        while node is not None and node.type in ("parenthesized_expression", "pointer_expression"):
+            node = next((c for c in node.children if c.is_named), None)
+        return node
+
     def find_macro_expansion(node):
         if not macro_lookup_map or not file_path:
             return None, None, None
@@ -52,6 +64,10 @@ def extract_calls_relations(
 
     relations = []
 
+    def add_site(node):
+        if sites is not None:
+            sites.append((node.start_point[0] + 1, node.start_point[1] + 1, node.start_byte))
+
     def traverse(node, current_function=None):
         nonlocal relations
 
@@ -73,9 +89,18 @@ def extract_calls_relations(
             # ✅ 优先尝试匹配宏展开
             expanded, original_macro, macro_range = find_macro_expansion(node)
 
+            # ✅ 字段函数指针调用：dev->ops->open() / (*dev->fn)()，被调者是最外层字段而非接收者变量
+            field_node = unwrap_callee(callee_node)
+            if field_node is not None and field_node.type != "field_expression":
+                field_node = None
+
             if expanded:
                 callee_name = expanded
                 # print(f"\n[宏调用] {file_path}:{macro_range} 原始: {original_macro} → 展开为: {expanded}")
+            elif field_node is not None:
+                name_node = field_node.child_by_field_name("field")
+                if name_node:
+                    callee_name = get_text(name_node)
             else:
                 id_node = find_identifier(callee_node)
                 if id_node:
@@ -83,12 +108,22 @@ def extract_calls_relations(
                     # print(f"\n[直接调用] {file_path} 中函数 {current_function} 调用了 {callee_name}")
 
             if callee_name:
-                if callee_name in function_id_map:
+                if field_node is not None and not expanded:
+                    # 优先按接收者类型定位 (结构体, 字段)，类型未知时回退到字段名
+                    resolved_id = resolve_field_expression(
+                        field_index, field_node, get_text, variable_id_map, current_function
+                    ) or field_id_map.get(callee_name)
+                    if resolved_id:
+                        resolved_type = "field_func_ptr"
+                elif callee_name in function_id_map:
                     resolved_id = function_id_map[callee_name]
                     resolved_type = "function"
                 elif (callee_name, current_function) in variable_id_map:
                     resolved_id = variable_id_map[(callee_name, current_function)]
                     resolved_type = "local_func_ptr"
+                elif (callee_name, "global") in variable_id_map:
+                    resolved_id = variable_id_map[(callee_name, "global")]
+                    resolved_type = "global_func_ptr"
                 elif callee_name in field_id_map:
                     resolved_id = field_id_map[callee_name]
                     resolved_type = "field_func_ptr"
@@ -100,6 +135,7 @@ def extract_calls_relations(
                         "tail": resolved_id,
                         "type": "CALLS"
                     })
+                    add_site(node)
                 # else:
                 #     print(f"  ⚠️ 未能解析调用目标 {callee_name}")
 
@@ -0,0 +1,54 @@
+import os
+
+from compile_db import resolve_include
+
+
+def iter_include_paths(root, code_bytes):
+    """
+    遍历语法树中的 preproc_include 节点（含条件编译块内的），产出 (种类, 名称)：
+    种类为 '"' 或 '<'；#include MACRO 这类宏形式无法静态确定目标，跳过
+    """
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if node.type == "preproc_include":
+            path_node = node.child_by_field_name("path")
+            if path_node is not None and path_node.type in ("string_literal", "system_lib_string"):
+                text = code_bytes[path_node.start_byte:path_node.end_byte].decode("utf-8", errors="replace")
+                yield text[0], text[1:-1].strip()
+            continue
+        stack.extend(reversed(node.children))
+
+
+def extract_includes_relations(
+    root, code_bytes, source_path, file_id_map, search_paths, resolve_cache, exists=os.path.isfile
+):
+    """
+    构造 INCLUDES 关系：
+    FILE → FILE（被包含的头文件）
+    - file_id_map: 文件绝对路径（os.path.abspath）→ FILE 实体 id，目标不在图谱中的 #include 跳过
+    - search_paths: 本文件的头文件搜索路径（compile_db.search_paths 的格式）
+    - resolve_cache: 解析结果缓存，跨文件复用
+    - exists: 候选路径是否存在（见 compile_db.resolve_include），git_delta 按修订的文件集合解析
+    """
+    relations = []
+    file_id = file_id_map.get(os.path.abspath(source_path))
+    if file_id is None:
+        return relations
+
+    # 搜索路径均为绝对路径，解析结果已规范化，可直接查表
+    including_dir = os.path.dirname(os.path.abspath(source_path))
+    seen = set()
+    for kind, name in iter_include_paths(root, code_bytes):
+        target = resolve_include(name, kind, including_dir, search_paths, resolve_cache, exists)
+        target_id = file_id_map.get(target) if target else None
+        if target_id is None or target_id in seen:
+            continue
+        seen.add(target_id)
+        relations.append({
+            "head": file_id,
+            "tail": target_id,
+            "type": "INCLUDES"
+        })
+
+    return relations
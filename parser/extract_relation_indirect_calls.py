@@ -0,0 +1,212 @@
+import heapq
+
+
+def extract_indirect_calls_relations(entities, relations):
+    """
+    函数指针指向分析（points-to），把间接 CALLS 解析到具体被调函数：
+    FUNCTION-[CALLS]->VARIABLE/FIELD  ==>  FUNCTION-[CALLS]->FUNCTION
+
+    约束来源均为 ASSIGNED_TO（head ← tail）：
+    - tail 为 FUNCTION：pts(head) ∋ tail（含 ops 表指定初始化器 .open = my_open）
+    - tail 为 VARIABLE/FIELD：pts(head) ⊇ pts(tail)（指针拷贝）
+    右值为函数调用结果的 ASSIGNED_TO（"rhs": "call"，如 h = lookup(3)）不产生约束：
+    tail 只是被调用者，返回值指向何处未知，当作取址会凭空得到 CALLS lookup
+
+    实现要点（面向 Linux 数千张 file_operations 表）：
+    - 指向集用 Python int 位集表示，位号只分配给被取址（出现在 ASSIGNED_TO 右值）的函数，
+      按首次出现顺序编号，集合并运算即整数按位或
+    - 拷贝边先做 SCC 缩点，环内节点共享同一指向集
+    - 工作表按拓扑序出队，DAG 上每个分量至多处理一次即到达不动点
+    """
+
+    def as_list(value):
+        return value if isinstance(value, list) else [value]
+
+    function_ids = {e["id"] for e in entities if e.get("type") == "FUNCTION"}
+
+    # === 构建约束：基础指向 + 拷贝边 ===
+    func_bits = {}        # 被取址函数 id -> 位号
+    func_by_bit = []      # 位号 -> 函数 id
+    node_index = {}       # 指针节点（VARIABLE/FIELD）id -> 稠密编号
+    base = []             # 节点 -> 初始位集
+    succ = []             # 节点 -> 拷贝边后继（pts 流向）
+
+    def node_of(entity_id):
+        idx = node_index.get(entity_id)
+        if idx is None:
+            idx = node_index[entity_id] = len(base)
+            base.append(0)
+            succ.append([])
+        return idx
+
+    for rel in relations:
+        if rel["type"] != "ASSIGNED_TO" or rel.get("rhs") == "call":
+            continue
+        heads = [node_of(h) for h in as_list(rel["head"]) if h not in function_ids]
+        for tail in as_list(rel["tail"]):
+            if tail in function_ids:
+                bit = func_bits.get(tail)
+                if bit is None:
+                    bit = func_bits[tail] = len(func_by_bit)
+                    func_by_bit.append(tail)
+                for h in heads:
+                    base[h] |= 1 << bit
+            else:
+                t = node_of(tail)
+                for h in heads:
+                    if h != t:
+                        succ[t].append(h)
+
+    if not func_by_bit:
+        return []
+
+    # === SCC 缩点（迭代式 Tarjan，避免深递归） ===
+    n = len(base)
+    comp = [-1] * n
+    index = [-1] * n
+    low = [0] * n
+    on_stack = [False] * n
+    stack = []
+    counter = 0
+    comp_count = 0
+
+    for start in range(n):
+        if index[start] != -1:
+            continue
+        work = [(start, 0)]
+        while work:
+            v, i = work.pop()
+            if i == 0:
+                index[v] = low[v] = counter
+                counter += 1
+                stack.append(v)
+                on_stack[v] = True
+            recursed = False
+            edges = succ[v]
+            while i < len(edges):
+                w = edges[i]
+                i += 1
+                if index[w] == -1:
+                    work.append((v, i))
+                    work.append((w, 0))
+                    recursed = True
+                    break
+                if on_stack[w]:
+                    low[v] = min(low[v], index[w])
+            if recursed:
+                continue
+            if low[v] == index[v]:
+                while True:
+                    w = stack.pop()
+                    on_stack[w] = False
+                    comp[w] = comp_count
+                    if w == v:
+                        break
+                comp_count += 1
+            if work:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[v])
+
+    # Tarjan 按逆拓扑序产出分量，rank 越小越靠近源头
+    rank = [comp_count - 1 - c for c in range(comp_count)]
+    pts = [0] * comp_count
+    comp_succ = [set() for _ in range(comp_count)]
+    for v in range(n):
+        cv = comp[v]
+        pts[cv] |= base[v]
+        for w in succ[v]:
+            cw = comp[w]
+            if cw != cv:
+                comp_succ[cv].add(cw)
+
+    # === 工作表不动点 ===
+    queued = [False] * comp_count
+    worklist = []
+    for c in range(comp_count):
+        if pts[c]:
+            queued[c] = True
+            worklist.append((rank[c], c))
+    heapq.heapify(worklist)
+
+    while worklist:
+        _, c = heapq.heappop(worklist)
+        queued[c] = False
+        bits = pts[c]
+        for s in comp_succ[c]:
+            merged = pts[s] | bits
+            if merged != pts[s]:
+                pts[s] = merged
+                if not queued[s]:
+                    queued[s] = True
+                    heapq.heappush(worklist, (rank[s], s))
+
+    # === 展开间接 CALLS ===
+    existing = set()
+    for rel in relations:
+        if rel["type"] == "CALLS" and not isinstance(rel["tail"], list):
+            existing.add((rel["head"], rel["tail"]))
+
+    indirect_relations = []
+    for rel in relations:
+        if rel["type"] != "CALLS":
+            continue
+        caller_id = rel["head"]
+        for target in as_list(rel["tail"]):
+            idx = node_index.get(target)
+            if idx is None:
+                continue
+            bits = pts[comp[idx]]
+            while bits:
+                lowest = bits & -bits
+                callee_id = func_by_bit[lowest.bit_length() - 1]
+                bits ^= lowest
+                if (caller_id, callee_id) in existing:
+                    continue
+                existing.add((caller_id, callee_id))
+                indirect_relations.append({
+                    "head": caller_id,
+                    "tail": callee_id,
+                    "type": "CALLS"
+                })
+
+    return indirect_relations
+
+
+def check_expected_calls(graph_dir, expected_path):
+    """
+    按函数名核对图谱中的 CALLS：expected 为 {"present": [[调用者, 被调者], ...], "absent": [...]}
+    返回不符合预期的条目列表
+    """
+    import os
+    import json
+
+    with open(os.path.join(graph_dir, 'entity.json'), 'r') as f:
+        names = {e["id"]: e["name"] for e in json.load(f) if e["type"] == "FUNCTION"}
+    with open(os.path.join(graph_dir, 'relation.json'), 'r') as f:
+        calls = {
+            (names[rel["head"]], names[rel["tail"]])
+            for rel in json.load(f)
+            if rel["type"] == "CALLS" and not isinstance(rel["tail"], list) and rel["tail"] in names
+        }
+    with open(expected_path, 'r') as f:
+        expected = json.load(f)
+
+    failures = [("present", pair) for pair in expected.get("present", []) if tuple(pair) not in calls]
+    failures += [("absent", pair) for pair in expected.get("absent", []) if tuple(pair) in calls]
+    return failures
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="按预期核对图谱中（含间接解析得到的）函数调用")
+    parser.add_argument("--graph", type=str, required=True, help="包含 entity.json / relation.json 的图谱目录")
+    parser.add_argument("--expect", type=str, required=True,
+                        help="预期文件，如 data/test_case_fnptr/expected_calls.json")
+    args = parser.parse_args()
+
+    failures = check_expected_calls(args.graph, args.expect)
+    for kind, (caller, callee) in failures:
+        print(f"❌ 应{'存在' if kind == 'present' else '不存在'}：{caller} CALLS {callee}")
+    if failures:
+        raise SystemExit(1)
+    print("✅ 函数调用与预期一致")
@@ -1,4 +1,11 @@
-def extract_typeof_relations(root_node, code_bytes, variable_entities, field_entities, struct_id_map):
+def typeof_scope_maps(variable_entities, field_entities):
+    """(变量名, 作用域) -> id 与 (字段名, 结构体名) -> id，全局构建一次后可传给各文件的 extract_typeof_relations"""
+    var_scope_map = {(v["name"], v["scope"]): v["id"] for v in variable_entities}
+    field_scope_map = {(f["name"], f["scope"]): f["id"] for f in field_entities}
+    return var_scope_map, field_scope_map
+
+
+def extract_typeof_relations(root_node, code_bytes, variable_entities, field_entities, struct_id_map, scope_maps=None):
     """
     提取 TYPE_OF 关系：
     - VARIABLE-[TYPE_OF]->STRUCT
@@ -8,6 +15,7 @@ def extract_typeof_relations(root_node, code_bytes, variable_entities, field_ent
     - variable_entities: 包含变量名 + scope（函数名或 'global'）
     - field_entities: 包含字段名 + scope（结构体名）
     - struct_id_map: 名称 → id，名称应为结构体名，不含 'struct ' 前缀
+    - scope_maps: 可选，typeof_scope_maps 的结果；给定时不再由实体列表逐文件重建
     """
 
     def get_text(node):
@@ -15,12 +23,10 @@ def extract_typeof_relations(root_node, code_bytes, variable_entities, field_ent
 
     typeof_relations = set()
 
-    # 创建结构体名集合
-    struct_names = set(struct_id_map.keys())
-
     # 构建变量/字段映射，方便定位实体 id
-    var_scope_map = {(v["name"], v["scope"]): v["id"] for v in variable_entities}
-    field_scope_map = {(f["name"], f["scope"]): f["id"] for f in field_entities}
+    if scope_maps is None:
+        scope_maps = typeof_scope_maps(variable_entities, field_entities)
+    var_scope_map, field_scope_map = scope_maps
 
     def clean_struct_name(type_text):
         """统一清洗类型名：去除 struct 前缀和多余空格"""
@@ -47,7 +53,7 @@ def extract_typeof_relations(root_node, code_bytes, variable_entities, field_ent
             decl_node = node.child_by_field_name("declarator")
             if type_node and decl_node:
                 type_text = clean_struct_name(get_text(type_node))
-                if type_text in struct_names:
+                if type_text in struct_id_map:
                     var_node = decl_node
                     while var_node and var_node.type != "identifier":
                         var_node = var_node.child_by_field_name("declarator")
@@ -63,7 +69,7 @@ def extract_typeof_relations(root_node, code_bytes, variable_entities, field_ent
             decl_node = node.child_by_field_name("declarator")
             if type_node and decl_node:
                 type_text = clean_struct_name(get_text(type_node))
-                if type_text in struct_names:
+                if type_text in struct_id_map:
                     ident = decl_node
                     while ident and ident.type != "identifier":
                         ident = ident.child_by_field_name("declarator")
@@ -0,0 +1,129 @@
+"""
+按类型解析字段的索引：field_id_map 只按字段名索引，dev->ops->open() 会命中所有结构体中名为 open 的字段。
+这里根据变量 / 参数 / 字段实体上记录的声明类型（struct_type），推断接收者表达式的结构体类型，
+按 (结构体名, 字段名) 定位字段；类型未知时由调用方回退到按名字解析。
+"""
+
+# 推断接收者类型时需要剥离的包装：(p)、*p、&p、p[i]
+_WRAPPER_TYPES = ("parenthesized_expression", "pointer_expression", "subscript_expression")
+
+
+def declared_struct_type(type_node, get_text):
+    """
+    声明的基础类型名：struct / union 取标签名，typedef 类型取类型名，基本类型返回 None
+    指针、数组层级不影响结果
+    """
+    if type_node is None:
+        return None
+    if type_node.type in ("struct_specifier", "union_specifier"):
+        name_node = type_node.child_by_field_name("name")
+        return get_text(name_node).strip() if name_node else None
+    if type_node.type == "type_identifier":
+        return get_text(type_node).strip()
+    return None
+
+
+def build_field_index(struct_entities, field_entities, variable_entities, param_entities):
+    """
+    返回：
+    - fields:  (结构体名, 字段名) -> [字段 id]
+    - aliases: typedef 名 -> 结构体标签名（typedef struct tag {...} Name 产生的两个 STRUCT 实体位置相同）
+    - types:   变量 / 参数 / 字段 id -> 声明的结构体类型名
+    """
+    fields = {}
+    for f in field_entities:
+        fields.setdefault((f["scope"], f["name"]), []).append(f["id"])
+    tagged = {struct for struct, _ in fields}
+
+    same_position = {}
+    for s in struct_entities:
+        if s.get("start_line") is None:
+            continue
+        same_position.setdefault((s.get("source_file"), s["start_line"], s["end_line"]), []).append(s["name"])
+    aliases = {}
+    for names in same_position.values():
+        tags = [name for name in names if name in tagged]
+        if not tags:
+            continue
+        for name in names:
+            if name not in tagged:
+                aliases[name] = tags[0]
+
+    types = {}
+    for e in variable_entities + param_entities + field_entities:
+        set_entity_type({"types": types}, e)
+
+    return {"fields": fields, "aliases": aliases, "types": types}
+
+
+def set_entity_type(field_index, entity):
+    """登记（或清除）实体的声明类型，供增量更新时维护索引"""
+    if entity.get("struct_type"):
+        field_index["types"][entity["id"]] = entity["struct_type"]
+    else:
+        field_index["types"].pop(entity["id"], None)
+
+
+def field_ids(field_index, struct_type, field_name):
+    """(结构体, 字段) 对应的字段 id 列表，无法定位时返回 None"""
+    if field_index is None or not struct_type:
+        return None
+    struct_type = field_index["aliases"].get(struct_type, struct_type)
+    return field_index["fields"].get((struct_type, field_name))
+
+
+def field_struct_type(field_index, struct_type, field_name):
+    """结构体某字段自身的结构体类型"""
+    for field_id in field_ids(field_index, struct_type, field_name) or ():
+        field_type = field_index["types"].get(field_id)
+        if field_type:
+            return field_type
+    return None
+
+
+def expression_struct_type(field_index, node, get_text, variable_id_map, scope):
+    """推断表达式的结构体类型：变量 / 参数查声明类型，字段访问逐级查字段类型，强制类型转换取目标类型"""
+    while node is not None and node.type in _WRAPPER_TYPES:
+        if node.type == "subscript_expression":
+            node = node.child_by_field_name("argument")
+        else:
+            node = next((c for c in node.children if c.is_named), None)
+    if node is None:
+        return None
+
+    if node.type == "identifier":
+        name = get_text(node).strip()
+        entity_id = variable_id_map.get((name, scope)) or variable_id_map.get((name, "global"))
+        return field_index["types"].get(entity_id)
+
+    if node.type == "field_expression":
+        receiver_type = expression_struct_type(
+            field_index, node.child_by_field_name("argument"), get_text, variable_id_map, scope
+        )
+        name_node = node.child_by_field_name("field")
+        if receiver_type is None or name_node is None:
+            return None
+        return field_struct_type(field_index, receiver_type, get_text(name_node).strip())
+
+    if node.type == "cast_expression":
+        descriptor = node.child_by_field_name("type")
+        if descriptor is not None:
+            return declared_struct_type(descriptor.child_by_field_name("type"), get_text)
+
+    return None
+
+
+def resolve_field_expression(field_index, node, get_text, variable_id_map, scope):
+    """
+    字段访问表达式 recv->field / recv.field 按接收者类型定位字段 id 列表；
+    索引缺失或接收者类型未知时返回 None，由调用方回退到按字段名解析
+    """
+    if field_index is None:
+        return None
+    name_node = node.child_by_field_name("field")
+    if name_node is None:
+        return None
+    receiver_type = expression_struct_type(
+        field_index, node.child_by_field_name("argument"), get_text, variable_id_map, scope
+    )
+    return field_ids(field_index, receiver_type, get_text(name_node).strip())
@@ -0,0 +1,119 @@
+"""
+逐文件的调度与资源预算：
+- 调度顺序：walk（os.walk 原始顺序，id 分配稳定）或 lpt（按文件大小从大到小，大文件尽早开始）
+- 大小预算：超过 max_bytes 的文件不读取、不解析
+- 时间预算：单个文件在某一阶段的解析 / 抽取耗时超过 timeout 秒时中止
+- 隔离：超预算或触发 RecursionError / MemoryError 的文件被隔离并记录，不中断整个运行
+
+当前 tree-sitter 绑定不提供解析超时接口，时间预算通过 SIGALRM 在 Python 层中断，
+因此只在主线程、支持 setitimer 的平台上生效；C 层的单次 parse 调用返回后才会被中断。
+"""
+import os
+import json
+import time
+import signal
+import threading
+from contextlib import contextmanager
+
+SCHEDULE_ORDERS = ("walk", "lpt")
+
+
+class FileTimeout(Exception):
+    pass
+
+
+def new_budget(max_bytes=0, timeout=0):
+    """max_bytes / timeout 为 0 表示不限制"""
+    return {
+        "max_bytes": max_bytes,
+        "timeout": timeout,
+        "isolated": [],   # [{"file", "stage", "reason", "size", "elapsed"}]
+    }
+
+
+def isolate(budget, source_path, stage, reason, size=None, elapsed=None):
+    budget["isolated"].append({
+        "file": source_path,
+        "stage": stage,
+        "reason": reason,
+        "size": size,
+        "elapsed": round(elapsed, 3) if elapsed is not None else None,
+    })
+
+
+def schedule_files(paths, order="walk", budget=None):
+    """
+    按调度顺序产出待处理的文件路径，超过大小预算的文件直接隔离
+    lpt 需要先遍历完整个目录以获得文件大小
+    """
+    max_bytes = budget["max_bytes"] if budget else 0
+    if order == "walk" and not max_bytes:
+        yield from paths
+        return
+
+    def admitted(items):
+        for source_path, size in items:
+            if max_bytes and size > max_bytes:
+                isolate(budget, source_path, "schedule", f"文件大小超过预算 {max_bytes} 字节", size=size)
+                continue
+            yield source_path
+
+    sized = ((p, os.path.getsize(p)) for p in paths)
+    if order == "lpt":
+        sized = sorted(sized, key=lambda item: item[1], reverse=True)
+    yield from admitted(sized)
+
+
+@contextmanager
+def time_limit(seconds):
+    """超时后在主线程抛出 FileTimeout；不支持时不做限制"""
+    if (
+        not seconds
+        or not hasattr(signal, "setitimer")
+        or threading.current_thread() is not threading.main_thread()
+    ):
+        yield
+        return
+
+    def on_alarm(signum, frame):
+        raise FileTimeout(f"耗时超过预算 {seconds} 秒")
+
+    previous = signal.signal(signal.SIGALRM, on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def run_guarded(budget, source_path, stage, fn, *args):
+    """
+    在时间预算内执行 fn(*args)；超时、递归过深或内存不足时隔离该文件并返回 None
+    budget 为 None 时直接执行
+    """
+    if budget is None:
+        return fn(*args)
+
+    start_time = time.time()
+    try:
+        with time_limit(budget["timeout"]):
+            return fn(*args)
+    except FileTimeout as e:
+        reason = str(e)
+    except RecursionError:
+        reason = "RecursionError：语法树嵌套过深"
+    except MemoryError:
+        reason = "MemoryError：内存不足"
+    isolate(budget, source_path, stage, reason, elapsed=time.time() - start_time)
+    return None
+
+
+def write_isolation_report(output_dir, budget):
+    """被隔离的文件写出到 isolated_files.json，无隔离文件时不写"""
+    if not budget or not budget["isolated"]:
+        return None
+    report_path = os.path.join(output_dir, 'isolated_files.json')
+    with open(report_path, 'w') as f:
+        json.dump(budget["isolated"], f, indent=2, ensure_ascii=False)
+    return report_path
@@ -0,0 +1,318 @@
+"""
+Git 修订增量抽取：给定两个修订 rev_from / rev_to 以及在 rev_from 上抽取得到的图谱，
+只重抽取两修订间有差异的文件，以及引用了"定义发生增删的符号名"的文件，输出实体 / 关系的增删增量。
+
+- 未变化文件的实体直接取自旧图谱，用于重建全局符号表，id 保持不变
+- 变化文件按实体键沿用旧 id，新实体从旧图谱最大 id 之后分配
+- 旧图谱带有 INCLUDES 关系（--includes）时，直接或间接包含了变化头文件的文件、#include 了与新增文件同名头文件的文件
+  同样重抽取，增量中包含这些文件的 INCLUDES 变化：#include 按各修订自己的文件集合解析（而不是工作区），
+  搜索路径由 --include-dir / --compile-commands 给出，需与抽取旧图谱时一致
+- 受影响文件分别在两个修订上抽取关系，取多重集差
+- 阶段 6 的全局间接 CALLS 不在增量中重算
+- --write-graph 把增量应用到旧图谱，写出 rev_to 的 entity.json / relation.json（带 INCLUDES 时连同 include_deps.json），
+  可作为下一次增量的 --graph；端点已删除的间接 CALLS 随之丢弃
+
+用法：
+    python git_delta.py --source /path/to/glibc --graph output/glibc_v1 --from v2.39 --to v2.40 --output delta.json
+其中 --source 需与生成旧图谱时的 --source 相同（实体中的路径以其为前缀）。
+"""
+import os
+import json
+import subprocess
+import tempfile
+from collections import OrderedDict
+
+from run_extract_all import (
+    id_generator,
+    get_parser,
+    load_macro_lookup_map,
+    extract_file_record,
+    rebind_record,
+    record_entities,
+    records_from_entities,
+    merge_file_records,
+    extract_file_relations,
+    write_graph,
+)
+from compile_db import load_compile_commands
+from extract_relation_includes import extract_includes_relations
+from graph_delta import entity_keys, diff_entities, diff_relations, apply_delta
+from include_graph import load_include_index, transitive_includers, file_search_paths, write_include_index
+
+SOURCE_SUFFIXES = ('.c', '.h')
+# 定义变化会影响其它文件名字解析的实体类型
+GLOBAL_SYMBOL_TYPES = ("FUNCTION", "STRUCT", "FIELD")
+
+
+def run_git(source_dir, *args, input_bytes=None):
+    result = subprocess.run(
+        ["git", "-C", source_dir, *args],
+        input=input_bytes,
+        capture_output=True,
+        check=True,
+    )
+    return result.stdout
+
+
+def changed_files(source_dir, rev_from, rev_to):
+    """两修订间变化的 .c/.h 文件（相对 source_dir），重命名按删除 + 新增处理"""
+    out = run_git(
+        source_dir, "diff", "--relative", "--name-status", "--no-renames", "-z", rev_from, rev_to, "--"
+    )
+    parts = out.decode("utf-8", errors="surrogateescape").split("\0")
+    changes = {}
+    for status, path in zip(parts[0::2], parts[1::2]):
+        if path.lower().endswith(SOURCE_SUFFIXES):
+            changes[path] = status
+    return changes
+
+
+def show_file(source_dir, rev, rel_path):
+    """读取某修订上的文件内容，不存在时返回 None"""
+    try:
+        return run_git(source_dir, "show", f"{rev}:./{rel_path}")
+    except subprocess.CalledProcessError:
+        return None
+
+
+def files_referencing(source_dir, rev, names):
+    """某修订上以整词形式引用了 names 中任一名字的 .c/.h 文件（相对 source_dir）"""
+    if not names:
+        return set()
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+        f.write("\n".join(sorted(names)) + "\n")
+        pattern_path = f.name
+    try:
+        result = subprocess.run(
+            ["git", "-C", source_dir, "grep", "-l", "-w", "-F", "-f", pattern_path, rev, "--", "*.c", "*.h"],
+            capture_output=True,
+        )
+    finally:
+        os.unlink(pattern_path)
+    # 返回码 1 表示无匹配
+    if result.returncode not in (0, 1):
+        raise subprocess.CalledProcessError(result.returncode, result.args, result.stdout, result.stderr)
+
+    prefix = f"{rev}:"
+    files = set()
+    for line in result.stdout.decode("utf-8", errors="surrogateescape").splitlines():
+        files.add(line[len(prefix):] if line.startswith(prefix) else line)
+    return files
+
+
+def global_symbol_names(entities):
+    return {
+        (e["type"], e["name"])
+        for e in entities
+        if e["type"] in GLOBAL_SYMBOL_TYPES or (e["type"] == "VARIABLE" and e.get("scope") == "global")
+    }
+
+
+def next_free_id(entities):
+    numeric = [int(e["id"]) for e in entities if str(e["id"]).isdigit()]
+    return max(numeric, default=0) + 1
+
+
+def load_graph(graph_dir):
+    with open(os.path.join(graph_dir, 'entity.json'), 'r') as f:
+        entities = json.load(f)
+    with open(os.path.join(graph_dir, 'relation.json'), 'r') as f:
+        relations = json.load(f)
+    return entities, relations
+
+
+def delta_include_search(paths, include_dirs=(), compile_commands=None):
+    """与抽取时相同口径的 #include 搜索路径：编译数据库中的 TU 按图谱中的路径写法对应"""
+    units = {}
+    if compile_commands:
+        by_real = {os.path.realpath(unit["file"]): unit for unit in load_compile_commands(compile_commands)}
+        units = {path: by_real[os.path.realpath(path)] for path in paths if os.path.realpath(path) in by_real}
+    return file_search_paths(units, include_dirs)
+
+
+def revision_includes(path, root, code_bytes, symbols, include_search, resolve_cache):
+    """按某修订的文件集合（该修订的 FILE 实体）解析 #include，得到该文件的 INCLUDES 关系"""
+    file_id_map = {os.path.abspath(p): file_id for p, file_id in symbols["file_id_map"].items()}
+    return extract_includes_relations(
+        root, code_bytes, path, file_id_map, include_search(path), resolve_cache,
+        exists=lambda candidate: os.path.abspath(candidate) in file_id_map
+    )
+
+
+def git_delta(
+    source_dir, graph_dir, rev_from, rev_to, macro_json_path=None, include_dirs=(), compile_commands=None,
+    graph_output=None
+):
+    prev_entities, prev_relations = load_graph(graph_dir)
+    macro_lookup_map = load_macro_lookup_map(macro_json_path) if macro_json_path else {}
+    parser = get_parser()
+    id_counter = id_generator(next_free_id(prev_entities))
+
+    old_records = OrderedDict((r["source_path"], r) for r in records_from_entities(prev_entities))
+
+    def graph_path(rel_path):
+        return os.path.join(source_dir, rel_path)
+
+    changes = changed_files(source_dir, rev_from, rev_to)
+    print(f"🔀 {rev_from}..{rev_to}：变化文件 {len(changes)} 个")
+
+    # === 变化文件：在两个修订上解析 ===
+    old_sources = {}   # graph_path -> (root, code_bytes)，rev_from 上的内容
+    new_sources = {}   # graph_path -> (root, code_bytes)，rev_to 上的内容
+    new_records = {}
+    for rel_path in changes:
+        path = graph_path(rel_path)
+        old_bytes = show_file(source_dir, rev_from, rel_path)
+        new_bytes = show_file(source_dir, rev_to, rel_path)
+        if old_bytes is not None:
+            old_sources[path] = (parser.parse(old_bytes).root_node, old_bytes)
+        if new_bytes is None:
+            continue
+        root = parser.parse(new_bytes).root_node
+        new_sources[path] = (root, new_bytes)
+
+        # 按实体键沿用旧 id
+        record = extract_file_record(path, root, new_bytes, id_generator())
+        old_ids = {}
+        if path in old_records:
+            old_list = record_entities(old_records[path])
+            old_ids = dict(zip(entity_keys(old_list), (e["id"] for e in old_list)))
+        new_list = record_entities(record)
+        id_map = {
+            e["id"]: old_ids.get(key) or str(next(id_counter))
+            for e, key in zip(new_list, entity_keys(new_list))
+        }
+        new_records[path] = rebind_record(record, id_map)
+
+    # === 定义发生增删的符号名 -> 依赖文件 ===
+    changed_paths = {graph_path(p) for p in changes}
+    changed_names = set()
+    for path in changed_paths:
+        before = global_symbol_names(record_entities(old_records[path])) if path in old_records else set()
+        after = global_symbol_names(record_entities(new_records[path])) if path in new_records else set()
+        changed_names |= {name for _, name in before ^ after}
+
+    dependents = {
+        rel_path for rel_path in files_referencing(source_dir, rev_to, changed_names)
+        if rel_path not in changes and graph_path(rel_path) in old_records
+    }
+    include_index = load_include_index(graph_dir)
+    if include_index is not None:
+        includers = {
+            os.path.relpath(path, source_dir)
+            for path in transitive_includers(include_index, changed_paths)
+        }
+        dependents |= {rel_path for rel_path in includers if rel_path not in changes and graph_path(rel_path) in old_records}
+        # 新增文件可能改变其它文件 #include 的解析结果：按文件名查找可能包含它的文件
+        added_names = {os.path.basename(p) for p, status in changes.items() if status.startswith("A")}
+        dependents |= {
+            rel_path for rel_path in files_referencing(source_dir, rev_to, added_names)
+            if rel_path not in changes and graph_path(rel_path) in old_records
+        }
+    print(f"🔗 定义变化的符号 {len(changed_names)} 个，受影响的依赖文件 {len(dependents)} 个")
+
+    # 依赖文件本身未变，两修订内容相同
+    for rel_path in dependents:
+        path = graph_path(rel_path)
+        code_bytes = show_file(source_dir, rev_to, rel_path)
+        source = (parser.parse(code_bytes).root_node, code_bytes)
+        old_sources[path] = source
+        new_sources[path] = source
+
+    # === 两个修订的全局符号表 ===
+    # 新修订的文件顺序：沿用旧图谱顺序，删除的文件去掉，新增文件追加在末尾
+    old_list = list(old_records.values())
+    new_list = []
+    for path, record in old_records.items():
+        if path in changed_paths and path not in new_records:
+            continue
+        new_list.append(new_records.get(path, record))
+    new_list += [record for path, record in new_records.items() if path not in old_records]
+
+    old_all_entities, old_symbols = merge_file_records(old_list)
+    new_all_entities, new_symbols = merge_file_records(new_list)
+    old_var_param = {**old_symbols["variable_id_map"], **old_symbols["param_id_map"]}
+    new_var_param = {**new_symbols["variable_id_map"], **new_symbols["param_id_map"]}
+
+    # === 受影响文件在两个修订上的关系 ===
+    include_search = None
+    if include_index is not None:
+        include_search = delta_include_search(
+            [r["source_path"] for r in old_list] + [r["source_path"] for r in new_list], include_dirs, compile_commands
+        )
+    old_relations = []
+    old_cache = {}
+    for path, (root, code_bytes) in old_sources.items():
+        if path not in old_records:
+            continue
+        old_relations += extract_file_relations(
+            path, root, code_bytes, old_records[path], old_symbols, old_var_param, macro_lookup_map
+        )
+        if include_search is not None:
+            old_relations += revision_includes(path, root, code_bytes, old_symbols, include_search, old_cache)
+    new_relations = []
+    new_cache = {}
+    new_by_path = {r["source_path"]: r for r in new_list}
+    for path, (root, code_bytes) in new_sources.items():
+        new_relations += extract_file_relations(
+            path, root, code_bytes, new_by_path[path], new_symbols, new_var_param, macro_lookup_map
+        )
+        if include_search is not None:
+            new_relations += revision_includes(path, root, code_bytes, new_symbols, include_search, new_cache)
+
+    affected = set(old_sources) | set(new_sources)
+    old_entities = [e for e in old_all_entities if (e["name"] if e["type"] == "FILE" else e.get("source_file")) in affected]
+    new_entities = [e for e in new_all_entities if (e["name"] if e["type"] == "FILE" else e.get("source_file")) in affected]
+
+    added_entities, removed_entities, updated_entities = diff_entities(old_entities, new_entities)
+    added_relations, removed_relations = diff_relations(old_relations, new_relations)
+
+    delta = {
+        "from": rev_from,
+        "to": rev_to,
+        "files": {
+            "changed": {graph_path(p): status for p, status in sorted(changes.items())},
+            "dependents": sorted(graph_path(p) for p in dependents),
+        },
+        "entities": {"added": added_entities, "removed": removed_entities, "updated": updated_entities},
+        "relations": {"added": added_relations, "removed": removed_relations},
+    }
+
+    # 应用增量后的图谱，INCLUDES 反向依赖索引由其重建，供下一次增量失效计算使用
+    if graph_output:
+        entities, relations = apply_delta(prev_entities, prev_relations, delta)
+        write_graph(graph_output, entities, relations)
+        if include_index is not None:
+            write_include_index(graph_output, entities, relations)
+        print(f"🗺️ 已写出 {rev_to} 上的图谱：{graph_output}")
+    return delta
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--source", type=str, required=True, help="C 源码目录（git 工作区内），与生成旧图谱时一致")
+    parser.add_argument("--graph", type=str, required=True, help="rev_from 上抽取的图谱目录（entity.json / relation.json）")
+    parser.add_argument("--from", dest="rev_from", type=str, required=True, help="旧修订")
+    parser.add_argument("--to", dest="rev_to", type=str, required=True, help="新修订")
+    parser.add_argument("--output", type=str, required=True, help="增量输出文件路径（JSON）")
+    parser.add_argument("--macro-json", type=str, default=None, help="宏展开信息 macro.json 路径（可选）")
+    parser.add_argument("--include-dir", type=str, action="append", default=[],
+                        help="解析 #include <...> 的搜索目录，可重复指定，与抽取旧图谱时的 --include-dir 一致")
+    parser.add_argument("--compile-commands", type=str, default=None,
+                        help="compile_commands.json 路径，与抽取旧图谱时一致（用于解析 #include）")
+    parser.add_argument("--write-graph", type=str, default=None,
+                        help="把增量应用到旧图谱后写出到该目录（含 include_deps.json），可作为下一次增量的 --graph")
+    args = parser.parse_args()
+
+    delta = git_delta(
+        args.source, args.graph, args.rev_from, args.rev_to, args.macro_json, args.include_dir,
+        args.compile_commands, args.write_graph
+    )
+    with open(args.output, 'w') as f:
+        json.dump(delta, f, indent=2)
+
+    ents, rels = delta["entities"], delta["relations"]
+    print(f"\n✅ 增量已写出：{args.output}")
+    print(f"  - 实体：+{len(ents['added'])} -{len(ents['removed'])} ~{len(ents['updated'])}")
+    print(f"  - 关系：+{len(rels['added'])} -{len(rels['removed'])}")
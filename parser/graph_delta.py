@@ -0,0 +1,104 @@
+from collections import Counter
+
+
+def entity_base_key(entity):
+    """
+    与运行无关的实体键：(type, name, scope, role, source_file)
+    FILE 实体以自身路径作为 source_file
+    """
+    source_file = entity.get("source_file")
+    if entity["type"] == "FILE":
+        source_file = entity["name"]
+    return (entity["type"], entity["name"], entity.get("scope"), entity.get("role"), source_file)
+
+
+def entity_keys(entities):
+    """
+    为实体列表生成键，同名同作用域的实体按出现顺序追加序号加以区分
+    返回与 entities 一一对应的键列表
+    """
+    seen = Counter()
+    keys = []
+    for entity in entities:
+        base = entity_base_key(entity)
+        keys.append(base + (seen[base],))
+        seen[base] += 1
+    return keys
+
+
+def relation_key(rel):
+    """关系键：head / tail 可能是字段 id 列表，转为元组以便哈希；带 rhs 标记的关系与不带的区分开"""
+    head = tuple(rel["head"]) if isinstance(rel["head"], list) else rel["head"]
+    tail = tuple(rel["tail"]) if isinstance(rel["tail"], list) else rel["tail"]
+    if "rhs" in rel:
+        return (head, tail, rel["type"], rel["rhs"])
+    return (head, tail, rel["type"])
+
+
+def diff_relations(old_relations, new_relations):
+    """
+    关系多重集差：返回 (added, removed)，均为关系字典列表
+    """
+    old_counts = Counter(relation_key(r) for r in old_relations)
+    new_counts = Counter(relation_key(r) for r in new_relations)
+
+    added = []
+    for rel in new_relations:
+        key = relation_key(rel)
+        if new_counts[key] > old_counts[key]:
+            new_counts[key] -= 1
+            added.append(rel)
+
+    new_counts = Counter(relation_key(r) for r in new_relations)
+    removed = []
+    for rel in old_relations:
+        key = relation_key(rel)
+        if old_counts[key] > new_counts[key]:
+            old_counts[key] -= 1
+            removed.append(rel)
+
+    return added, removed
+
+
+def diff_entities(old_entities, new_entities):
+    """
+    按实体 id 比较：返回 (added, removed, updated)
+    updated 为 id 相同但属性（如行号）变化的实体
+    """
+    old_by_id = {e["id"]: e for e in old_entities}
+    new_by_id = {e["id"]: e for e in new_entities}
+
+    added = [e for e in new_entities if e["id"] not in old_by_id]
+    removed = [e for e in old_entities if e["id"] not in new_by_id]
+    updated = [e for e in new_entities if e["id"] in old_by_id and old_by_id[e["id"]] != e]
+    return added, removed, updated
+
+
+def apply_delta(entities, relations, delta):
+    """
+    把 {"entities": {added, removed, updated}, "relations": {added, removed}} 形式的增量应用到图谱上，
+    返回新的 (entities, relations)：实体保持原顺序，新增实体与关系追加在末尾；
+    端点指向已删除实体的其余关系（如未随增量重算的阶段 6 间接 CALLS）一并丢弃
+    """
+    ents, rels = delta["entities"], delta["relations"]
+    removed_ids = {e["id"] for e in ents["removed"]}
+    updated = {e["id"]: e for e in ents["updated"]}
+    new_entities = [updated.get(e["id"], e) for e in entities if e["id"] not in removed_ids]
+    new_entities += ents["added"]
+
+    pending = Counter(relation_key(r) for r in rels["removed"])
+
+    def dangling(value):
+        return any(v in removed_ids for v in value) if isinstance(value, list) else value in removed_ids
+
+    new_relations = []
+    for rel in relations:
+        key = relation_key(rel)
+        if pending[key] > 0:
+            pending[key] -= 1
+            continue
+        if dangling(rel["head"]) or dangling(rel["tail"]):
+            continue
+        new_relations.append(rel)
+    new_relations += rels["added"]
+    return new_entities, new_relations
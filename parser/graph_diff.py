@@ -0,0 +1,223 @@
+"""
+比较两次抽取结果（如昨天与今天、两个发布版本的图谱），按与运行无关的键而非 id 对齐：
+    实体键  (文件, 类型, 名称, 作用域, role)，FILE 实体的文件即自身路径
+    关系键  (head 实体键, tail 实体键, 类型)，字段列表形式的端点为实体键列表
+
+两侧的 entity.json / relation.json 都流式读取，经按内存预算落盘的外部排序（relation_sink.LineSink）后有序归并：
+先把关系端点 id 与按 id 排序的实体做归并连接、替换为实体键，再按键排序后与另一侧归并比较。
+内存占用只取决于 memory_mb（同时存在的排序缓冲区约为其数倍），与图谱规模无关。
+
+报告内容：
+    实体  added / removed / changed（键相同但其余属性不同，如行号、struct_type、compile_flags）
+    关系  added / removed（按多重集比较）
+同一键对应多个实体时（同一文件内同名同作用域），先配对属性完全相同的实体，其余按属性顺序配对为 changed。
+
+用法：
+    python graph_diff.py --old output_v1/ --new output_v2/ [--old-root glibc-2.38/ --new-root glibc-2.39/]
+                         [--output diff.jsonl] [--ignore-lines] [--memory-mb 256]
+"""
+import os
+import json
+from collections import Counter
+from itertools import groupby
+
+from json_stream import iter_json_array
+from relation_sink import LineSink
+
+LINE_FIELDS = ("start_line", "end_line")
+# 已包含在实体键中的字段，不再参与属性比较
+KEY_FIELDS = ("id", "type", "name", "scope", "role", "source_file")
+# 关系序号的定宽编码，按端点回填实体键时同一关系的各行相邻
+RELATION_INDEX_WIDTH = 12
+
+
+def entity_diff_key(entity, root=None):
+    """root 给定时文件路径改为相对 root 的路径，比较不同目录下抽取的两份图谱"""
+    source_file = entity["name"] if entity["type"] == "FILE" else entity.get("source_file")
+    if root is not None and source_file is not None:
+        source_file = os.path.relpath(source_file, root)
+    name = source_file if entity["type"] == "FILE" else entity["name"]
+    return [source_file, entity["type"], name, entity.get("scope"), entity.get("role")]
+
+
+def entity_attrs(entity, ignore_lines=False):
+    return {
+        k: v for k, v in entity.items()
+        if k not in KEY_FIELDS and not (ignore_lines and k in LINE_FIELDS)
+    }
+
+
+def split_line(line):
+    """"键\\t其余" -> (键, 其余)，去掉行尾换行"""
+    key, _, rest = line.rstrip("\n").partition("\t")
+    return key, rest
+
+
+def iter_groups(lines):
+    """有序的 "键\\t值" 行按键分组，产出 (键, [值])"""
+    for key, items in groupby((split_line(line) for line in lines), key=lambda item: item[0]):
+        yield key, [value for _, value in items]
+
+
+def merge_groups(old_groups, new_groups):
+    """按键归并两侧有序分组，产出 (键, 旧值列表, 新值列表)，缺失一侧为空列表"""
+    old_item, new_item = next(old_groups, None), next(new_groups, None)
+    while old_item is not None or new_item is not None:
+        if new_item is None or (old_item is not None and old_item[0] < new_item[0]):
+            yield old_item[0], old_item[1], []
+            old_item = next(old_groups, None)
+        elif old_item is None or new_item[0] < old_item[0]:
+            yield new_item[0], [], new_item[1]
+            new_item = next(new_groups, None)
+        else:
+            yield old_item[0], old_item[1], new_item[1]
+            old_item, new_item = next(old_groups, None), next(new_groups, None)
+
+
+def sort_graph(graph_dir, memory_mb=256, tmp_dir=None, ignore_lines=False, root=None):
+    """
+    流式读取一个图谱目录，返回两个外部排序结果（LineSink，调用方负责 close）：
+        entities   "实体键\\t属性" 行，按实体键有序
+        relations  "关系键\\t" 行，按关系键有序（不去重）
+    """
+    def sink():
+        return LineSink(memory_mb, tmp_dir, unique=False, prefix="graph_diff_")
+
+    entities, ids, endpoints, parts, relations = sink(), sink(), sink(), sink(), sink()
+    try:
+        for e in iter_json_array(os.path.join(graph_dir, 'entity.json')):
+            key = json.dumps(entity_diff_key(e, root))
+            entities.extend_lines((f"{key}\t{json.dumps(entity_attrs(e, ignore_lines), sort_keys=True)}\n",))
+            ids.extend_lines((f"{e['id']}\t{key}\n",))
+
+        # 关系拆成端点行（id、关系序号、端点位置）与形状行（类型、端点是否为列表）
+        for index, rel in enumerate(iter_json_array(os.path.join(graph_dir, 'relation.json'))):
+            r = f"{index:0{RELATION_INDEX_WIDTH}d}"
+            for side in ("head", "tail"):
+                value = rel[side]
+                if isinstance(value, list):
+                    endpoints.extend_lines(f"{v}\t{r}\t{side[0]}{pos:06d}\n" for pos, v in enumerate(value))
+                else:
+                    endpoints.extend_lines((f"{value}\t{r}\t{side[0]}\n",))
+            shape = [rel["type"], isinstance(rel["head"], list), isinstance(rel["tail"], list), rel.get("rhs")]
+            parts.extend_lines((f"{r}\t~\t{json.dumps(shape)}\n",))
+
+        # 端点与实体都按 id 有序，归并连接替换为实体键；找不到的 id 记为 ["?", id]
+        id_lines = iter_groups(ids.iter_lines())
+        current = next(id_lines, None)
+        for entity_id, rests in iter_groups(endpoints.iter_lines()):
+            while current is not None and current[0] < entity_id:
+                current = next(id_lines, None)
+            key = current[1][0] if current is not None and current[0] == entity_id else json.dumps(["?", entity_id])
+            parts.extend_lines(f"{rest}\t{key}\n" for rest in rests)
+
+        # 按关系序号汇总，"~" 排在端点之后
+        for _, lines in groupby(parts.iter_lines(), key=lambda line: line[:RELATION_INDEX_WIDTH]):
+            ends = {"h": [], "t": []}
+            for line in lines:
+                _, code, payload = line.rstrip("\n").split("\t", 2)
+                if code == "~":
+                    rel_type, head_is_list, tail_is_list, rhs = json.loads(payload)
+                else:
+                    ends[code[0]].append(json.loads(payload))
+            head = ends["h"] if head_is_list else ends["h"][0]
+            tail = ends["t"] if tail_is_list else ends["t"][0]
+            key = [head, tail, rel_type] + ([rhs] if rhs is not None else [])
+            relations.extend_lines((json.dumps(key) + "\t\n",))
+    except BaseException:
+        entities.close()
+        relations.close()
+        raise
+    finally:
+        for s in (ids, endpoints, parts):
+            s.close()
+    return entities, relations
+
+
+def diff_graphs(
+    old_dir, new_dir, emit=None, memory_mb=256, ignore_lines=False, tmp_dir=None, old_root=None, new_root=None
+):
+    """
+    比较两个图谱目录，返回各类差异的数量；emit 给定时逐条回调差异记录（dict），可直接写成 JSON Lines。
+    old_root / new_root 为两次抽取的源码根目录，给定时按相对路径比较文件
+    """
+    counts = Counter()
+
+    def report(record):
+        counts[f"{record['kind']}_{record['op']}"] += 1
+        if emit is not None:
+            emit(record)
+
+    old_entities, old_relations = sort_graph(old_dir, memory_mb, tmp_dir, ignore_lines, old_root)
+    try:
+        new_entities, new_relations = sort_graph(new_dir, memory_mb, tmp_dir, ignore_lines, new_root)
+    except BaseException:
+        old_entities.close()
+        old_relations.close()
+        raise
+
+    try:
+        groups = merge_groups(iter_groups(old_entities.iter_lines()), iter_groups(new_entities.iter_lines()))
+        for key, old_attrs, new_attrs in groups:
+            if old_attrs == new_attrs:
+                continue
+            common = Counter(old_attrs) & Counter(new_attrs)
+            old_rest = list((Counter(old_attrs) - common).elements())
+            new_rest = list((Counter(new_attrs) - common).elements())
+            key = json.loads(key)
+            for old, new in zip(old_rest, new_rest):
+                report({"kind": "entity", "op": "changed", "key": key,
+                        "old": json.loads(old), "new": json.loads(new)})
+            for old in old_rest[len(new_rest):]:
+                report({"kind": "entity", "op": "removed", "key": key, "attrs": json.loads(old)})
+            for new in new_rest[len(old_rest):]:
+                report({"kind": "entity", "op": "added", "key": key, "attrs": json.loads(new)})
+
+        groups = merge_groups(iter_groups(old_relations.iter_lines()), iter_groups(new_relations.iter_lines()))
+        for key, old_items, new_items in groups:
+            if len(old_items) == len(new_items):
+                continue
+            head, tail, rel_type, *rhs = json.loads(key)
+            relation = {"head": head, "tail": tail, "type": rel_type}
+            if rhs:
+                relation["rhs"] = rhs[0]
+            op = "added" if len(new_items) > len(old_items) else "removed"
+            for _ in range(abs(len(new_items) - len(old_items))):
+                report({"kind": "relation", "op": op, "relation": relation})
+    finally:
+        for s in (old_entities, old_relations, new_entities, new_relations):
+            s.close()
+    return counts
+
+
+def print_diff_summary(counts):
+    print(f"📦 实体：新增 {counts['entity_added']} 个，删除 {counts['entity_removed']} 个，"
+          f"变化 {counts['entity_changed']} 个")
+    print(f"🔗 关系：新增 {counts['relation_added']} 条，删除 {counts['relation_removed']} 条")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--old", type=str, required=True, help="旧图谱目录（entity.json / relation.json）")
+    parser.add_argument("--new", type=str, required=True, help="新图谱目录")
+    parser.add_argument("--output", type=str, default=None, help="差异明细输出路径（JSON Lines），不指定则只输出统计")
+    parser.add_argument("--old-root", type=str, default=None, help="旧图谱的源码根目录，给定时按相对路径比较文件")
+    parser.add_argument("--new-root", type=str, default=None, help="新图谱的源码根目录")
+    parser.add_argument("--ignore-lines", action="store_true", help="比较实体属性时忽略 start_line / end_line")
+    parser.add_argument("--memory-mb", type=float, default=256, help="每个外部排序缓冲区的内存预算（MB）")
+    parser.add_argument("--tmp-dir", type=str, default=None, help="外部排序有序段的临时目录")
+    args = parser.parse_args()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            counts = diff_graphs(
+                args.old, args.new, lambda record: f.write(json.dumps(record) + "\n"),
+                args.memory_mb, args.ignore_lines, args.tmp_dir, args.old_root, args.new_root
+            )
+        print(f"📝 差异明细已写入：{args.output}")
+    else:
+        counts = diff_graphs(
+            args.old, args.new, None, args.memory_mb, args.ignore_lines, args.tmp_dir, args.old_root, args.new_root
+        )
+    print_diff_summary(counts)
@@ -0,0 +1,307 @@
+"""
+图谱统计与热点报告：实体 / 关系读入为整数数组（实体下标、类型编码、所属文件下标、边的 head / tail / 类型），
+之后的统计全部为 NumPy 向量化运算：
+    - 各关系类型的出度 / 入度分布（分位数与 2 的幂分桶直方图）
+    - CALLS 扇入 / 扇出最高的函数
+    - 被赋值函数最多的函数指针（ASSIGNED_TO 中 tail 为 FUNCTION 的 head，不计 x = f(...) 这类函数调用结果的赋值）
+    - 字段最多的结构体
+    - 逐文件、逐目录的实体数 / 关系数 / 密度
+
+head / tail 为字段 id 列表的关系按列表展开为多条边。
+
+用法：
+    python graph_stats.py --graph output/ [--top 20] [--json stats.json]
+"""
+import os
+import json
+
+import numpy as np
+
+from stable_ids import is_stable_id
+
+ENTITY_TYPES = ("FILE", "FUNCTION", "VARIABLE", "STRUCT", "FIELD")
+RELATION_TYPES = (
+    "CONTAINS", "CALLS", "HAS_PARAMETER", "HAS_VARIABLE", "HAS_MEMBER",
+    "TYPE_OF", "RETURNS", "ASSIGNED_TO",
+)
+
+
+def as_list(value):
+    return value if isinstance(value, list) else [value]
+
+
+def load_graph_arrays(graph_dir):
+    """
+    读取图谱，返回列式数组：
+        names / scopes / files        Python 列表（仅用于报告输出）
+        entity_type                   int8，ENTITY_TYPES 下标
+        entity_file                   int32，files 下标（FILE 实体为自身文件）
+        end_line                      int32
+        field_struct                  int32，FIELD 所属 STRUCT 的实体下标，未知为 -1
+        head / tail / rel_type        边数组，rel_type 为 relation_types 下标
+        rel_index                     int64，每条边来自 relation.json 中的第几条关系（列表端点展开的边共用一个下标）
+        call_result                   bool，边来自右值为函数调用结果的 ASSIGNED_TO（"rhs": "call"）
+    """
+    with open(os.path.join(graph_dir, 'entity.json'), 'r') as f:
+        entities = json.load(f)
+
+    # id 转为整数键（顺序 id 为十进制，稳定 id 为十六进制），端点 -> 实体下标用有序数组二分完成
+    base = 16 if entities and is_stable_id(entities[0]["id"]) else 10
+    entity_keys = np.array([int(e["id"], base) for e in entities], dtype=np.uint64)
+    key_order = np.argsort(entity_keys, kind="stable")
+    sorted_keys = entity_keys[key_order]
+    entity_files = [e["name"] if e["type"] == "FILE" else e.get("source_file") for e in entities]
+    files = list(dict.fromkeys(entity_files))
+    file_index = {path: i for i, path in enumerate(files)}
+    type_code = {t: i for i, t in enumerate(ENTITY_TYPES)}
+
+    struct_of = {}
+    field_struct = np.full(len(entities), -1, dtype=np.int32)
+    for pos, e in enumerate(entities):
+        if e["type"] == "STRUCT":
+            struct_of.setdefault((e["name"], entity_files[pos]), pos)
+    for pos, e in enumerate(entities):
+        if e["type"] == "FIELD":
+            field_struct[pos] = struct_of.get((e.get("scope"), entity_files[pos]), -1)
+
+    graph = {
+        "names": [e["name"] for e in entities],
+        "scopes": [e.get("scope") for e in entities],
+        "files": files,
+        "entity_type": np.array([type_code.get(e["type"], len(ENTITY_TYPES)) for e in entities], dtype=np.int8),
+        "entity_file": np.array([file_index[path] for path in entity_files], dtype=np.int32),
+        "end_line": np.array([e.get("end_line") or 0 for e in entities], dtype=np.int32),
+        "field_struct": field_struct,
+    }
+    del entities
+
+    with open(os.path.join(graph_dir, 'relation.json'), 'r') as f:
+        relations = json.load(f)
+
+    relation_types = list(RELATION_TYPES)
+    rel_code = {t: i for i, t in enumerate(relation_types)}
+    for rel in relations:
+        if rel["type"] not in rel_code:
+            rel_code[rel["type"]] = len(relation_types)
+            relation_types.append(rel["type"])
+
+    # 单个端点的关系直接成边，字段 id 列表按笛卡尔积展开；缺失的端点（None）跳过
+    single = [i for i, r in enumerate(relations) if type(r["head"]) is str and type(r["tail"]) is str]
+    heads = [relations[i]["head"] for i in single]
+    tails = [relations[i]["tail"] for i in single]
+    codes = [rel_code[relations[i]["type"]] for i in single]
+    indices = single
+    for i, rel in enumerate(relations):
+        h, t = rel["head"], rel["tail"]
+        if type(h) is str and type(t) is str:
+            continue
+        pairs = [(x, y) for x in as_list(h) for y in as_list(t) if x is not None and y is not None]
+        heads += [x for x, _ in pairs]
+        tails += [y for _, y in pairs]
+        codes += [rel_code[rel["type"]]] * len(pairs)
+        indices += [i] * len(pairs)
+    call_result = np.array([rel.get("rhs") == "call" for rel in relations], dtype=bool)
+    del relations
+
+    def to_index(ids):
+        keys = np.array([int(x, base) for x in ids], dtype=np.uint64)
+        # 查询键先排序再二分，访存局部性好得多
+        query_order = np.argsort(keys)
+        pos = np.empty(len(keys), dtype=np.int64)
+        pos[query_order] = np.searchsorted(sorted_keys, keys[query_order])
+        pos = np.minimum(pos, max(len(sorted_keys) - 1, 0))
+        found = sorted_keys[pos] == keys if len(sorted_keys) else np.zeros(len(keys), dtype=bool)
+        return np.where(found, key_order[pos] if len(sorted_keys) else 0, -1).astype(np.int32)
+
+    head = to_index(heads)
+    tail = to_index(tails)
+    indices = np.array(indices, dtype=np.int64)
+    valid = (head >= 0) & (tail >= 0)
+    graph.update({
+        "relation_types": relation_types,
+        "head": head[valid],
+        "tail": tail[valid],
+        "rel_type": np.array(codes, dtype=np.int8)[valid],
+        "rel_index": indices[valid],
+        "call_result": call_result[indices][valid],
+    })
+    return graph
+
+
+def degree_summary(degrees):
+    """度数 > 0 的实体上的分布：分位数与按 [2^k, 2^(k+1)) 分桶的直方图"""
+    active = degrees[degrees > 0]
+    if not len(active):
+        return {"entities": 0}
+    p50, p90, p99 = np.percentile(active, [50, 90, 99])
+    return {
+        "entities": int(len(active)),
+        "mean": round(float(active.mean()), 3),
+        "p50": float(p50),
+        "p90": float(p90),
+        "p99": float(p99),
+        "max": int(active.max()),
+        "log2_histogram": np.bincount(np.log2(active).astype(np.int64)).tolist(),
+    }
+
+
+def top_k(scores, candidates, k):
+    """candidates 中 scores 最大的 k 个下标（降序，分数为 0 的不计）"""
+    candidates = candidates[scores[candidates] > 0]
+    if k <= 0:
+        return candidates[:0]
+    if len(candidates) > k:
+        candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+def compute_stats(g, top=20):
+    n = len(g["names"])
+    head, tail, rel_type = g["head"], g["tail"], g["rel_type"]
+    entity_type = g["entity_type"]
+    functions = np.flatnonzero(entity_type == ENTITY_TYPES.index("FUNCTION"))
+
+    def entity_rows(indices, scores, **extra):
+        return [
+            {
+                "name": g["names"][i],
+                "scope": g["scopes"][i],
+                "type": ENTITY_TYPES[entity_type[i]] if entity_type[i] < len(ENTITY_TYPES) else None,
+                "source_file": g["files"][g["entity_file"][i]],
+                "count": int(scores[i]),
+                **{k: int(v[i]) for k, v in extra.items()},
+            }
+            for i in indices
+        ]
+
+    # === 各关系类型的出度 / 入度分布 ===
+    degrees = {}
+    for code, name in enumerate(g["relation_types"]):
+        mask = rel_type == code
+        if not mask.any():
+            continue
+        degrees[name] = {
+            "edges": int(mask.sum()),
+            "out": degree_summary(np.bincount(head[mask], minlength=n)),
+            "in": degree_summary(np.bincount(tail[mask], minlength=n)),
+        }
+
+    # === CALLS 扇入 / 扇出 ===
+    calls = rel_type == g["relation_types"].index("CALLS")
+    fan_out = np.bincount(head[calls], minlength=n)
+    fan_in = np.bincount(tail[calls], minlength=n)
+
+    # === 函数指针：ASSIGNED_TO 的 tail 为函数（取址 / 函数名 / 指定初始化器，不含调用结果）时，head 为被绑定的指针变量 / 字段 ===
+    assigned = (rel_type == g["relation_types"].index("ASSIGNED_TO")) \
+        & (entity_type[tail] == ENTITY_TYPES.index("FUNCTION")) & ~g["call_result"]
+    pairs = np.unique(np.stack([head[assigned], tail[assigned]]), axis=1)
+    pointer_targets = np.bincount(pairs[0], minlength=n)
+    pointers = np.flatnonzero(pointer_targets)
+
+    # === 结构体字段数 ===
+    field_struct = g["field_struct"]
+    struct_fields = np.bincount(field_struct[field_struct >= 0], minlength=n)
+    structs = np.flatnonzero(entity_type == ENTITY_TYPES.index("STRUCT"))
+
+    # === 逐文件 / 逐目录密度：关系按 head 所在文件归属 ===
+    file_count = len(g["files"])
+    entity_file = g["entity_file"]
+    file_entities = np.bincount(entity_file, minlength=file_count)
+    file_relations = np.bincount(entity_file[head], minlength=file_count)
+    file_lines = np.zeros(file_count, dtype=np.int64)
+    np.maximum.at(file_lines, entity_file, g["end_line"])
+
+    dir_names, file_dir = np.unique([os.path.dirname(f or "") for f in g["files"]], return_inverse=True)
+    dir_files = np.bincount(file_dir, minlength=len(dir_names))
+    dir_entities = np.bincount(file_dir, weights=file_entities, minlength=len(dir_names))
+    dir_relations = np.bincount(file_dir, weights=file_relations, minlength=len(dir_names))
+    dir_lines = np.bincount(file_dir, weights=file_lines, minlength=len(dir_names))
+
+    def density_rows(labels, entities, relations, lines, order, **extra):
+        return [
+            {
+                "path": str(labels[i]),
+                "entities": int(entities[i]),
+                "relations": int(relations[i]),
+                "relations_per_entity": round(float(relations[i] / max(entities[i], 1)), 3),
+                "relations_per_kloc": round(float(relations[i] * 1000 / lines[i]), 1) if lines[i] else None,
+                **{k: int(v[i]) for k, v in extra.items()},
+            }
+            for i in order
+        ]
+
+    file_order = np.argsort(-file_relations, kind="stable")[:top]
+    dir_order = np.argsort(-dir_relations, kind="stable")[:top]
+
+    return {
+        "entities": n,
+        "edges": int(len(head)),
+        "entity_types": {t: int(c) for t, c in zip(ENTITY_TYPES, np.bincount(entity_type, minlength=len(ENTITY_TYPES)))},
+        "degrees": degrees,
+        "top_fan_in": entity_rows(top_k(fan_in, functions, top), fan_in, fan_out=fan_out),
+        "top_fan_out": entity_rows(top_k(fan_out, functions, top), fan_out, fan_in=fan_in),
+        "top_function_pointers": entity_rows(top_k(pointer_targets, pointers, top), pointer_targets),
+        "largest_structs": entity_rows(top_k(struct_fields, structs, top), struct_fields),
+        "densest_files": density_rows(g["files"], file_entities, file_relations, file_lines, file_order),
+        "densest_directories": density_rows(
+            dir_names, dir_entities, dir_relations, dir_lines, dir_order, files=dir_files
+        ),
+    }
+
+
+def print_stats(stats):
+    print(f"\n📊 实体 {stats['entities']} 个，边 {stats['edges']} 条（字段列表已展开）")
+    print("\n📈 度数分布（度数 > 0 的实体）：")
+    print(f"  {'关系':<14}{'方向':<5}{'边数':>9}{'实体数':>9}{'均值':>8}{'p50':>7}{'p90':>7}{'p99':>7}{'最大':>7}")
+    for rel_type, d in stats["degrees"].items():
+        for direction in ("out", "in"):
+            s = d[direction]
+            if not s["entities"]:
+                continue
+            print(
+                f"  {rel_type:<14}{direction:<5}{d['edges']:>9}{s['entities']:>9}{s['mean']:>8}"
+                f"{s['p50']:>7.0f}{s['p90']:>7.0f}{s['p99']:>7.0f}{s['max']:>7}"
+            )
+
+    sections = (
+        ("📥 CALLS 扇入最高的函数", "top_fan_in"),
+        ("📤 CALLS 扇出最高的函数", "top_fan_out"),
+        ("🎯 绑定函数最多的函数指针", "top_function_pointers"),
+        ("🧱 字段最多的结构体", "largest_structs"),
+    )
+    for title, key in sections:
+        print(f"\n{title}：")
+        for row in stats[key]:
+            print(f"  {row['count']:>7}  {row['name']:<40} {row['source_file']}")
+
+    for title, key in (("📄 关系最密集的文件", "densest_files"), ("📁 关系最密集的目录", "densest_directories")):
+        print(f"\n{title}：")
+        for row in stats[key]:
+            per_kloc = "-" if row["relations_per_kloc"] is None else row["relations_per_kloc"]
+            print(
+                f"  关系 {row['relations']:>8}  实体 {row['entities']:>7}  "
+                f"关系/实体 {row['relations_per_entity']:>6}  关系/千行 {per_kloc:>7}  {row['path']}"
+            )
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--graph", type=str, required=True, help="图谱目录（entity.json / relation.json）")
+    parser.add_argument("--top", type=int, default=20, help="各排行榜条数")
+    parser.add_argument("--json", type=str, default=None, help="将完整统计结果写出为 JSON")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    graph = load_graph_arrays(args.graph)
+    load_time = time.time()
+    stats = compute_stats(graph, args.top)
+    end_time = time.time()
+
+    print_stats(stats)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(stats, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 统计结果已写出：{args.json}")
+    print(f"\n⏱️ 读取 {load_time - start_time:.2f} 秒，统计 {end_time - load_time:.2f} 秒")
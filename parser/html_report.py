@@ -0,0 +1,328 @@
+"""
+静态 HTML 报告：每个文件 / 函数 / 结构体 / 变量一页（单页应用，按 #/entity/<id> 路由），
+展示调用者、被调用者、参数、局部变量、成员、返回值等。
+
+图谱数据拆分为按 id 区间分组的小 JSON 块，浏览器按需加载，不会一次载入整个图谱：
+    report/index.html
+    report/data/meta.json                    块大小、文件列表页数、统计信息
+    report/data/files/<page>.json            FILE 实体分页列表
+    report/data/chunks/<n>.json              id 在 [n * chunk_size, (n + 1) * chunk_size) 内的实体及其出入边
+                                             （稳定 id 按哈希前 hash_bits 位分块，见 stable_ids.py）
+
+生成过程流式读取 entity.json / relation.json，并通过磁盘上的 P 个哈希分区完成
+"关系端点 -> 实体名" 的连接，内存占用约为图谱的 1/P。
+
+用法：
+    python html_report.py --graph output/ --report report/ [--chunk-size 512] [--partitions 64]
+    cd report && python -m http.server   # 浏览器通过 fetch 加载数据块，需经 HTTP 访问
+"""
+import os
+import json
+import shutil
+import tempfile
+from collections import Counter
+
+from json_stream import iter_json_array
+from stable_ids import is_stable_id
+
+FILES_PER_PAGE = 500
+
+
+def chunk_of(entity_id, chunk_size, hash_bits=0):
+    if hash_bits:
+        return int(entity_id[:8], 16) >> (32 - hash_bits)
+    return int(entity_id) // chunk_size
+
+
+def stable_hash_bits(entity_path, chunk_size):
+    """稳定 id 为均匀哈希：取前 hash_bits 位分块，使每块平均约 chunk_size 个实体；顺序 id 返回 0"""
+    count = 0
+    for e in iter_json_array(entity_path):
+        if not is_stable_id(e["id"]):
+            return 0
+        count += 1
+    bits = 1
+    while bits < 32 and (count >> bits) > chunk_size:
+        bits += 1
+    return bits
+
+
+def as_list(value):
+    return value if isinstance(value, list) else [value]
+
+
+class _PartitionWriter:
+    """同时打开 P 个分区文件，按分区号追加 JSON 行"""
+
+    def __init__(self, directory, name, partitions):
+        self.files = [
+            open(os.path.join(directory, f"{name}_{p:04d}.jsonl"), 'w') for p in range(partitions)
+        ]
+
+    def write(self, partition, record):
+        self.files[partition].write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def close(self):
+        for f in self.files:
+            f.close()
+
+
+def _read_partition(directory, name, partition):
+    path = os.path.join(directory, f"{name}_{partition:04d}.jsonl")
+    with open(path, 'r') as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def generate_report(graph_dir, report_dir, chunk_size=512, partitions=64):
+    data_dir = os.path.join(report_dir, "data")
+    os.makedirs(os.path.join(data_dir, "files"), exist_ok=True)
+    os.makedirs(os.path.join(data_dir, "chunks"), exist_ok=True)
+    work_dir = tempfile.mkdtemp(prefix="report_", dir=report_dir)
+    hash_bits = stable_hash_bits(os.path.join(graph_dir, 'entity.json'), chunk_size)
+
+    def partition_of(entity_id):
+        return chunk_of(entity_id, chunk_size, hash_bits) % partitions
+
+    try:
+        # === 1. 实体按块分区；FILE 实体分页写出 ===
+        entity_parts = _PartitionWriter(work_dir, "entity", partitions)
+        entity_types = Counter()
+        file_page = []
+        file_pages = 0
+
+        def flush_files():
+            nonlocal file_page, file_pages
+            with open(os.path.join(data_dir, "files", f"{file_pages}.json"), 'w') as f:
+                json.dump(file_page, f, ensure_ascii=False)
+            file_pages += 1
+            file_page = []
+
+        for e in iter_json_array(os.path.join(graph_dir, 'entity.json')):
+            entity_types[e["type"]] += 1
+            entity_parts.write(partition_of(e["id"]), e)
+            if e["type"] == "FILE":
+                file_page.append([e["id"], e["name"]])
+                if len(file_page) >= FILES_PER_PAGE:
+                    flush_files()
+        if file_page or not file_pages:
+            flush_files()
+        entity_parts.close()
+
+        # === 2. 关系展开为 (head, tail, type) 端点对，分别按 head / tail 分区 ===
+        by_head = _PartitionWriter(work_dir, "by_head", partitions)
+        by_tail = _PartitionWriter(work_dir, "by_tail", partitions)
+        relation_types = Counter()
+        for rel in iter_json_array(os.path.join(graph_dir, 'relation.json')):
+            relation_types[rel["type"]] += 1
+            for head in as_list(rel["head"]):
+                for tail in as_list(rel["tail"]):
+                    if head is None or tail is None:
+                        continue
+                    by_head.write(partition_of(head), [head, tail, rel["type"]])
+                    by_tail.write(partition_of(tail), [head, tail, rel["type"]])
+        by_head.close()
+        by_tail.close()
+
+        # === 3. 逐分区连接端点实体名：出边附上 tail 的名称，入边附上 head 的名称 ===
+        outgoing = _PartitionWriter(work_dir, "out", partitions)
+        incoming = _PartitionWriter(work_dir, "in", partitions)
+        for p in range(partitions):
+            names = {e["id"]: (e["name"], e["type"]) for e in _read_partition(work_dir, "entity", p)}
+            for head, tail, rel_type in _read_partition(work_dir, "by_tail", p):
+                name, entity_type = names.get(tail, (tail, None))
+                outgoing.write(partition_of(head), [head, tail, rel_type, name, entity_type])
+            for head, tail, rel_type in _read_partition(work_dir, "by_head", p):
+                name, entity_type = names.get(head, (head, None))
+                incoming.write(partition_of(tail), [tail, head, rel_type, name, entity_type])
+        outgoing.close()
+        incoming.close()
+
+        # === 4. 逐分区组装数据块 ===
+        chunk_count = 0
+        for p in range(partitions):
+            chunks = {}
+            for e in _read_partition(work_dir, "entity", p):
+                chunks.setdefault(chunk_of(e["id"], chunk_size, hash_bits), {})[e["id"]] = {"e": e, "out": [], "in": []}
+            for direction in ("out", "in"):
+                for own_id, other_id, rel_type, name, entity_type in _read_partition(work_dir, direction, p):
+                    entry = chunks.get(chunk_of(own_id, chunk_size, hash_bits), {}).get(own_id)
+                    if entry is not None:
+                        entry[direction].append([other_id, rel_type, name, entity_type])
+            for chunk, entries in chunks.items():
+                with open(os.path.join(data_dir, "chunks", f"{chunk}.json"), 'w') as f:
+                    json.dump(entries, f, ensure_ascii=False)
+            chunk_count += len(chunks)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    with open(os.path.join(data_dir, "meta.json"), 'w') as f:
+        json.dump({
+            "chunk_size": chunk_size,
+            "hash_bits": hash_bits,
+            "file_pages": file_pages,
+            "entity_types": entity_types,
+            "relation_types": relation_types,
+        }, f, ensure_ascii=False)
+    with open(os.path.join(report_dir, "index.html"), 'w') as f:
+        f.write(INDEX_HTML)
+
+    return {
+        "entities": sum(entity_types.values()),
+        "relations": sum(relation_types.values()),
+        "chunks": chunk_count,
+        "file_pages": file_pages,
+    }
+
+
+INDEX_HTML = """<!DOCTYPE html>
+<html lang="zh">
+<head>
+<meta charset="utf-8">
+<title>C 代码知识图谱报告</title>
+<style>
+  body { font-family: -apple-system, "Segoe UI", sans-serif; margin: 0; display: flex; }
+  nav { width: 320px; height: 100vh; overflow: auto; border-right: 1px solid #ddd; padding: 8px; box-sizing: border-box; }
+  main { flex: 1; height: 100vh; overflow: auto; padding: 16px 24px; box-sizing: border-box; }
+  a { color: #0366d6; text-decoration: none; } a:hover { text-decoration: underline; }
+  .type { display: inline-block; min-width: 72px; font-size: 12px; color: #666; }
+  .meta { color: #666; font-size: 13px; }
+  h2 { margin-top: 0; } h3 { margin-bottom: 4px; border-bottom: 1px solid #eee; }
+  ul { margin-top: 4px; padding-left: 20px; } li { line-height: 1.6; font-size: 14px; }
+  button { margin: 4px 2px; }
+  input { width: 100%; box-sizing: border-box; margin-bottom: 8px; }
+</style>
+</head>
+<body>
+<nav>
+  <input id="goto" placeholder="跳转到实体 id，回车确认">
+  <div id="stats" class="meta"></div>
+  <div id="files"></div>
+</nav>
+<main id="main"><p class="meta">从左侧选择文件，或在地址栏使用 #/entity/&lt;id&gt;。</p></main>
+<script>
+// 出边 / 入边在页面上的分组标题
+const OUT_LABELS = {
+  CALLS: "调用（callees）", HAS_PARAMETER: "参数", HAS_VARIABLE: "局部变量", HAS_MEMBER: "成员",
+  RETURNS: "返回", CONTAINS: "包含", ASSIGNED_TO: "取值来源", TYPE_OF: "类型"
+};
+const IN_LABELS = {
+  CALLS: "调用者（callers）", HAS_PARAMETER: "所属函数", HAS_VARIABLE: "所属函数", HAS_MEMBER: "所属结构体",
+  RETURNS: "被返回于", CONTAINS: "所属", ASSIGNED_TO: "赋值给", TYPE_OF: "该类型的实例"
+};
+const PAGE = 200;
+const cache = {};
+
+function loadJSON(path) {
+  if (!cache[path]) cache[path] = fetch(path).then(r => r.json());
+  return cache[path];
+}
+
+async function loadEntity(id) {
+  const meta = await loadJSON("data/meta.json");
+  const chunk = meta.hash_bits
+    ? parseInt(id.slice(0, 8), 16) >>> (32 - meta.hash_bits)
+    : Math.floor(Number(id) / meta.chunk_size);
+  const data = await loadJSON("data/chunks/" + chunk + ".json");
+  return data[id];
+}
+
+function esc(text) {
+  return String(text).replace(/[&<>"]/g, c => ({"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;"}[c]));
+}
+
+function link(id, name, type) {
+  return '<span class="type">' + esc(type || "") + '</span><a href="#/entity/' + esc(id) + '">' + esc(name) + '</a>';
+}
+
+// 长列表分页：每次多显示 PAGE 条
+function section(title, items) {
+  const box = document.createElement("div");
+  const list = document.createElement("ul");
+  const more = document.createElement("button");
+  let shown = 0;
+  function showMore() {
+    const next = items.slice(shown, shown + PAGE);
+    list.insertAdjacentHTML("beforeend", next.map(([id, , name, type]) => "<li>" + link(id, name, type) + "</li>").join(""));
+    shown += next.length;
+    more.style.display = shown < items.length ? "" : "none";
+    more.textContent = "显示更多（剩余 " + (items.length - shown) + "）";
+  }
+  box.innerHTML = "<h3>" + esc(title) + "（" + items.length + "）</h3>";
+  box.appendChild(list);
+  box.appendChild(more);
+  more.onclick = showMore;
+  showMore();
+  return box;
+}
+
+function groupByType(edges) {
+  const groups = {};
+  for (const edge of edges) (groups[edge[1]] = groups[edge[1]] || []).push(edge);
+  return groups;
+}
+
+async function showEntity(id) {
+  const main = document.getElementById("main");
+  const entry = await loadEntity(id);
+  if (!entry) { main.innerHTML = "<p>未找到实体 " + esc(id) + "</p>"; return; }
+  const e = entry.e;
+  let info = "id=" + esc(e.id);
+  if (e.scope) info += " · 作用域 " + esc(e.scope);
+  if (e.struct_type) info += " · 类型 " + esc(e.struct_type);
+  if (e.source_file) info += " · " + esc(e.source_file) + (e.start_line ? ":" + e.start_line + "-" + e.end_line : "");
+  main.innerHTML = "<h2>" + esc(e.type) + " " + esc(e.name) + '</h2><p class="meta">' + info + "</p>";
+  const outGroups = groupByType(entry.out), inGroups = groupByType(entry.in);
+  for (const type of Object.keys(outGroups)) main.appendChild(section(OUT_LABELS[type] || type, outGroups[type]));
+  for (const type of Object.keys(inGroups)) main.appendChild(section(IN_LABELS[type] || type, inGroups[type]));
+}
+
+async function showFilePage(page) {
+  const meta = await loadJSON("data/meta.json");
+  const files = await loadJSON("data/files/" + page + ".json");
+  let html = files.map(([id, name]) => '<div><a href="#/entity/' + esc(id) + '">' + esc(name) + "</a></div>").join("");
+  html += "<div>";
+  if (page > 0) html += '<button onclick="showFilePage(' + (page - 1) + ')">上一页</button>';
+  html += '<span class="meta"> ' + (page + 1) + " / " + meta.file_pages + " </span>";
+  if (page + 1 < meta.file_pages) html += '<button onclick="showFilePage(' + (page + 1) + ')">下一页</button>';
+  document.getElementById("files").innerHTML = html + "</div>";
+}
+
+async function init() {
+  const meta = await loadJSON("data/meta.json");
+  const count = obj => Object.values(obj).reduce((a, b) => a + b, 0);
+  document.getElementById("stats").textContent =
+    "实体 " + count(meta.entity_types) + " 个，关系 " + count(meta.relation_types) + " 条";
+  document.getElementById("goto").onkeydown = ev => {
+    if (ev.key === "Enter") location.hash = "#/entity/" + ev.target.value.trim();
+  };
+  showFilePage(0);
+  route();
+}
+
+function route() {
+  const m = location.hash.match(/^#\\/entity\\/(.+)$/);
+  if (m) showEntity(decodeURIComponent(m[1]));
+}
+
+window.addEventListener("hashchange", route);
+init();
+</script>
+</body>
+</html>
+"""
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--graph", type=str, required=True, help="图谱目录（entity.json / relation.json）")
+    parser.add_argument("--report", type=str, required=True, help="报告输出目录")
+    parser.add_argument("--chunk-size", type=int, default=512, help="每个数据块包含的实体 id 区间大小")
+    parser.add_argument("--partitions", type=int, default=64, help="生成时的磁盘分区数，越大内存占用越低")
+    args = parser.parse_args()
+
+    summary = generate_report(args.graph, args.report, args.chunk_size, args.partitions)
+    print(f"✅ 报告已生成：{os.path.join(args.report, 'index.html')}")
+    print(f"  - 实体 {summary['entities']} 个，关系 {summary['relations']} 条")
+    print(f"  - 数据块 {summary['chunks']} 个，文件列表 {summary['file_pages']} 页")
@@ -0,0 +1,110 @@
+"""
+头文件包含图：由 INCLUDES 关系（FILE → FILE）建立反向依赖索引，
+头文件变化时只需重抽取直接或间接包含它的文件，而不是整个代码库。
+
+抽取时（run_extract_all.py --includes）写出 include_deps.json：
+    includes      文件 -> 直接包含的头文件列表
+    included_by   头文件 -> 直接包含它的文件列表（反向依赖）
+
+用法：
+    python include_graph.py affected --graph output/ --changed include/linux/list.h [...]
+"""
+import os
+import json
+from collections import deque
+
+from compile_db import search_paths
+
+INCLUDE_INDEX_FILE = 'include_deps.json'
+
+
+def default_search_paths(include_dirs):
+    return {"quote": (), "angle": tuple(os.path.abspath(d) for d in include_dirs), "forced": ()}
+
+
+def file_search_paths(units, include_dirs=()):
+    """
+    返回 source_path -> 解析 #include 时使用的搜索路径 的查询函数：
+    - 编译数据库中的 TU（units: source_path -> compile_db 的 TU）使用自己的编译参数
+    - 其余文件（头文件、未给出编译数据库时的全部文件）使用 include_dirs，
+      以及所有 TU 的 <...> 搜索目录（按首次出现的顺序合并）
+    """
+    unit_paths = {path: search_paths(unit) for path, unit in units.items()}
+    merged = list(default_search_paths(include_dirs)["angle"])
+    for p in unit_paths.values():
+        merged += [d for d in p["angle"] if d not in merged]
+    shared = {"quote": (), "angle": tuple(merged), "forced": ()}
+    return lambda source_path: unit_paths.get(source_path, shared)
+
+
+def include_edges(entities, relations):
+    """INCLUDES 关系转为 (包含者路径, 被包含路径) 列表"""
+    file_names = {e["id"]: e["name"] for e in entities if e["type"] == "FILE"}
+    return [
+        (file_names[r["head"]], file_names[r["tail"]])
+        for r in relations
+        if r["type"] == "INCLUDES" and r["head"] in file_names and r["tail"] in file_names
+    ]
+
+
+def build_include_index(edges):
+    includes, included_by = {}, {}
+    for src, header in edges:
+        includes.setdefault(src, []).append(header)
+        included_by.setdefault(header, []).append(src)
+    return {"includes": includes, "included_by": included_by}
+
+
+def write_include_index(output_dir, entities, relations):
+    index_path = os.path.join(output_dir, INCLUDE_INDEX_FILE)
+    with open(index_path, 'w') as f:
+        json.dump(build_include_index(include_edges(entities, relations)), f, ensure_ascii=False)
+    return index_path
+
+
+def load_include_index(graph_dir):
+    """读取 include_deps.json；不存在时由 relation.json 中的 INCLUDES 重建，图谱没有 INCLUDES 时返回 None"""
+    index_path = os.path.join(graph_dir, INCLUDE_INDEX_FILE)
+    if os.path.exists(index_path):
+        with open(index_path, 'r') as f:
+            return json.load(f)
+
+    with open(os.path.join(graph_dir, 'entity.json'), 'r') as f:
+        entities = json.load(f)
+    with open(os.path.join(graph_dir, 'relation.json'), 'r') as f:
+        relations = json.load(f)
+    edges = include_edges(entities, relations)
+    return build_include_index(edges) if edges else None
+
+
+def transitive_includers(index, changed_paths):
+    """直接或间接包含 changed_paths 中任一文件的全部文件（不含 changed_paths 自身）"""
+    included_by = index["included_by"]
+    changed = set(changed_paths)
+    seen = set(changed)
+    queue = deque(changed)
+    while queue:
+        for src in included_by.get(queue.popleft(), []):
+            if src not in seen:
+                seen.add(src)
+                queue.append(src)
+    return seen - changed
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="mode", required=True)
+
+    p_affected = sub.add_parser("affected", help="列出头文件变化后需要重抽取的文件")
+    p_affected.add_argument("--graph", type=str, required=True, help="图谱目录（含 include_deps.json 或 INCLUDES 关系）")
+    p_affected.add_argument("--changed", type=str, nargs="+", required=True, help="变化的文件路径（与图谱中的写法一致）")
+    args = parser.parse_args()
+
+    index = load_include_index(args.graph)
+    if index is None:
+        parser.error("图谱中没有 INCLUDES 关系，请使用 run_extract_all.py --includes 重新抽取")
+    affected = sorted(transitive_includers(index, args.changed))
+    for path in affected:
+        print(path)
+    print(f"\n🔁 需要重抽取的文件 {len(affected)} 个（不含变化的文件本身）")
@@ -0,0 +1,77 @@
+import json
+
+_WHITESPACE = " \t\r\n"
+_DELIMITERS = ",]" + _WHITESPACE
+
+
+def iter_json_array(path, buffer_size=1 << 20):
+    """
+    流式读取顶层为 JSON 数组的文件（如 entity.json / relation.json），逐个产出数组元素，
+    内存占用只与 buffer_size 和单个元素大小有关
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r') as f:
+        buf = ""
+        pos = 0
+        eof = False
+
+        def fill():
+            nonlocal buf, pos, eof
+            chunk = f.read(buffer_size)
+            if not chunk:
+                eof = True
+            buf = buf[pos:] + chunk
+            pos = 0
+
+        def skip_whitespace():
+            nonlocal pos
+            while True:
+                while pos < len(buf) and buf[pos] in _WHITESPACE:
+                    pos += 1
+                if pos < len(buf) or eof:
+                    return
+                fill()
+
+        fill()
+        skip_whitespace()
+        if pos >= len(buf) or buf[pos] != "[":
+            raise ValueError(f"{path} 不是 JSON 数组")
+        pos += 1
+
+        expect_value = True
+        while True:
+            skip_whitespace()
+            if pos >= len(buf):
+                raise ValueError(f"{path} 意外结束")
+            if buf[pos] == "]":
+                return
+            if not expect_value:
+                if buf[pos] != ",":
+                    raise ValueError(f"{path} 第 {pos} 个字符处缺少逗号")
+                pos += 1
+                expect_value = True
+                continue
+
+            # 元素可能跨越缓冲区边界：解码失败、或解码结束处之后暂无内容时补充读取；
+            # 数字在 "." / "e" 处被截断时也能解码出前缀（"2." -> 2），须其后紧跟分隔符才算完整
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    fill()
+                    continue
+                if end >= len(buf) and not eof:
+                    fill()
+                    continue
+                if (
+                    isinstance(value, (int, float)) and not isinstance(value, bool)
+                    and not eof and buf[end] not in _DELIMITERS
+                ):
+                    fill()
+                    continue
+                break
+            pos = end
+            expect_value = False
+            yield value
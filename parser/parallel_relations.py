@@ -0,0 +1,126 @@
+"""
+阶段 2 ~ 5 中逐文件关系（CALLS、ASSIGNED_TO、RETURNS / TYPE_OF）的多进程抽取。
+
+阶段 1 结束后全局符号表不再变化，主进程把它们冻结到共享内存（shared_symbols.freeze_map），
+工作进程启动时按 descriptor 映射同一份只读表，任务只携带 (文件路径, 源码字节)：
+    function_id_map / var_param_id_map / field_id_map / struct_id_map
+    TYPE_OF 的 (名称, 作用域) 映射、field_index 的三张表、宏信息（按绝对路径）
+tree-sitter 语法树无法跨进程共享，工作进程重新解析源码；结果按文件返回，由 extract_relations
+按原有的阶段顺序、内容缓存与隔离规则组装，输出与单进程抽取逐字节一致。
+
+工作进程以 spawn 方式启动（不继承主进程中已加载的实体与语法树），时间预算在工作进程内生效，
+隔离记录随结果带回主进程，在对应阶段按文件顺序写入预算。
+"""
+import os
+import multiprocessing
+
+from tqdm import tqdm
+from tree_sitter import Language, Parser
+
+from extract_relation_calls import extract_calls_relations
+from extract_relation_assignedto import extract_assigned_to_relations
+from extract_relation_returns import extract_returns_relations
+from extract_relation_typeof import extract_typeof_relations
+from file_budget import new_budget, run_guarded
+from shared_symbols import freeze_tables, table_descriptors, attach_tables, close_tables
+
+PARALLEL_STAGES = ("CALLS", "ASSIGNED_TO", "RETURNS / TYPE_OF")
+
+_worker = {}
+
+
+def freeze_symbols(symbols, var_param_id_map, scope_maps, macro_lookup_map):
+    """关系阶段用到的全部只读表 -> {名称: SharedMap}；用完调用 shared_symbols.close_tables"""
+    field_index = symbols.get("field_index")
+    tables = {
+        "function_id_map": symbols["function_id_map"],
+        "var_param_id_map": var_param_id_map,
+        "field_id_map": symbols["field_id_map"],
+        "struct_id_map": symbols["struct_id_map"],
+        "var_scope_map": scope_maps[0],
+        "field_scope_map": scope_maps[1],
+        "field_fields": field_index["fields"] if field_index else None,
+        "field_aliases": field_index["aliases"] if field_index else None,
+        "field_types": field_index["types"] if field_index else None,
+        "macros": macro_lookup_map or {},
+    }
+    return freeze_tables(tables)
+
+
+def init_worker(lang_so_path, descriptors, timeout):
+    parser = Parser()
+    parser.set_language(Language(lang_so_path, 'c'))
+    _worker.update(parser=parser, tables=attach_tables(descriptors), timeout=timeout)
+
+
+def extract_file_task(task):
+    """
+    单个文件的三个逐文件阶段，返回 (source_path, {阶段: (关系, 发生位置, 隔离记录)})
+    关系为 None 表示该文件在此阶段被隔离
+    """
+    source_path, code_bytes, with_budget, with_sites = task
+    t = _worker["tables"]
+    root = _worker["parser"].parse(code_bytes).root_node
+    abs_path = os.path.abspath(source_path)
+    # 宏信息每个节点都要查找，先取出本文件的条目
+    entries = t["macros"].get(abs_path)
+    macros = {abs_path: entries} if entries else None
+    field_index = None
+    if t["field_fields"] is not None:
+        field_index = {"fields": t["field_fields"], "aliases": t["field_aliases"], "types": t["field_types"]}
+
+    def semantic_relations():
+        rels = extract_returns_relations(
+            root, code_bytes, t["function_id_map"], t["var_param_id_map"], t["field_id_map"]
+        )
+        rels += extract_typeof_relations(
+            root, code_bytes, None, None, t["struct_id_map"], (t["var_scope_map"], t["field_scope_map"])
+        )
+        return rels
+
+    results = {}
+    for stage in PARALLEL_STAGES:
+        budget = new_budget(0, _worker["timeout"]) if with_budget else None
+        rel_sites = [] if with_sites and stage != "RETURNS / TYPE_OF" else None
+        if stage == "RETURNS / TYPE_OF":
+            rels = run_guarded(budget, source_path, stage, semantic_relations)
+        else:
+            extract = extract_calls_relations if stage == "CALLS" else extract_assigned_to_relations
+            rels = run_guarded(
+                budget, source_path, stage,
+                extract,
+                root,
+                code_bytes,
+                t["function_id_map"],
+                t["var_param_id_map"],
+                t["field_id_map"],
+                macros,
+                abs_path,
+                field_index,
+                rel_sites
+            )
+        results[stage] = rels, rel_sites, budget["isolated"] if budget else []
+    return source_path, results
+
+
+def extract_relations_parallel(
+    files, symbols, var_param_id_map, scope_maps, macro_lookup_map, workers, lang_so_path, budget=None,
+    with_sites=False
+):
+    """
+    files: [(source_path, code_bytes)]，同一内容只需给出一次
+    返回 source_path -> {阶段: (关系, 发生位置, 隔离记录)}
+    """
+    shared = freeze_symbols(symbols, var_param_id_map, scope_maps, macro_lookup_map)
+    results = {}
+    try:
+        ctx = multiprocessing.get_context("spawn")
+        timeout = budget["timeout"] if budget else 0
+        tasks = ((source_path, code_bytes, budget is not None, with_sites) for source_path, code_bytes in files)
+        with ctx.Pool(workers, init_worker, (lang_so_path, table_descriptors(shared), timeout)) as pool:
+            done = pool.imap_unordered(extract_file_task, tasks, chunksize=4)
+            for source_path, stage_results in tqdm(done, total=len(files), desc=f"🔗 阶段 2 ~ 5：{workers} 个进程并行提取"):
+                results[source_path] = stage_results
+    finally:
+        close_tables(shared)
+    return results
@@ -0,0 +1,176 @@
+"""
+按内存预算落盘的关系存储：关系以紧凑的 JSON 行保存在内存缓冲区中，
+缓冲区超过预算时排序去重后写出为一个有序段（run）到临时目录，
+遍历时对所有有序段与内存缓冲区做 k 路归并并去重，图谱规模只受磁盘限制。
+
+输出顺序为编码后 JSON 行的字典序：同一 head 的关系必然相邻，可直接按 head 分组。
+"""
+import os
+import json
+import heapq
+import shutil
+import tempfile
+from itertools import groupby
+
+# 单个 str 对象的大致额外开销（字节），用于估算缓冲区内存
+_LINE_OVERHEAD = 64
+# 单次归并同时打开的有序段数上限，超出时先分批归并
+MAX_MERGE_FAN_IN = 64
+
+
+def encode_relation(rel):
+    # 可选的 rhs 标记（见 extract_relation_assignedto）放在第 4 列
+    if "rhs" in rel:
+        return json.dumps([rel["head"], rel["tail"], rel["type"], rel["rhs"]]) + "\n"
+    return json.dumps([rel["head"], rel["tail"], rel["type"]]) + "\n"
+
+
+def decode_relation(line):
+    head, tail, rel_type, *rhs = json.loads(line)
+    rel = {"head": head, "tail": tail, "type": rel_type}
+    if rhs:
+        rel["rhs"] = rhs[0]
+    return rel
+
+
+def _unique(lines):
+    previous = None
+    for line in lines:
+        if line != previous:
+            yield line
+            previous = line
+
+
+class LineSink:
+    """
+    按内存预算落盘的外部排序：逐行写入文本（每行以换行结尾），缓冲区超过预算时排序写出有序段，
+    iter_lines 对所有有序段与内存缓冲区做 k 路归并，按字典序产出；unique 为 True 时去掉重复行
+    """
+
+    def __init__(self, memory_mb=256, tmp_dir=None, unique=True, prefix="relation_runs_"):
+        self.budget_bytes = int(memory_mb * 1024 * 1024)
+        self.run_dir = tempfile.mkdtemp(prefix=prefix, dir=tmp_dir)
+        self.unique = unique
+        self.runs = []
+        self.run_counter = 0
+        self.buffer = []
+        self.buffer_bytes = 0
+
+    def extend_lines(self, lines):
+        for line in lines:
+            self.buffer.append(line)
+            self.buffer_bytes += len(line) + _LINE_OVERHEAD
+            if self.buffer_bytes >= self.budget_bytes:
+                self.spill()
+
+    def _filter(self, lines):
+        return _unique(lines) if self.unique else lines
+
+    def _write_run(self, lines):
+        run_path = os.path.join(self.run_dir, f"run_{self.run_counter:06d}.jsonl")
+        self.run_counter += 1
+        with open(run_path, 'w') as f:
+            f.writelines(self._filter(lines))
+        return run_path
+
+    def spill(self):
+        """将内存缓冲区排序（去重）后写出为一个有序段"""
+        if not self.buffer:
+            return
+        self.buffer.sort()
+        self.runs.append(self._write_run(self.buffer))
+        self.buffer = []
+        self.buffer_bytes = 0
+
+    def _compact_runs(self):
+        """有序段过多时分批归并，保证最终归并打开的文件数不超过上限"""
+        while len(self.runs) > MAX_MERGE_FAN_IN:
+            batch, rest = self.runs[:MAX_MERGE_FAN_IN], self.runs[MAX_MERGE_FAN_IN:]
+            files = [open(p, 'r') for p in batch]
+            try:
+                merged = self._write_run(heapq.merge(*files))
+            finally:
+                for f in files:
+                    f.close()
+            for p in batch:
+                os.unlink(p)
+            self.runs = rest + [merged]
+
+    def iter_lines(self):
+        """k 路归并所有有序段与内存缓冲区，产出有序（去重）的行"""
+        self._compact_runs()
+        self.buffer.sort()
+        files = [open(p, 'r') for p in self.runs]
+        try:
+            yield from self._filter(heapq.merge(*files, self.buffer))
+        finally:
+            for f in files:
+                f.close()
+
+    def close(self):
+        shutil.rmtree(self.run_dir, ignore_errors=True)
+        self.runs = []
+        self.buffer = []
+        self.buffer_bytes = 0
+
+
+class RelationSink(LineSink):
+    """
+    可替代 all_relations 列表使用：支持 extend / 迭代 / len，
+    迭代得到按 head 有序、已去重的关系字典
+    """
+
+    def __init__(self, memory_mb=256, tmp_dir=None):
+        super().__init__(memory_mb, tmp_dir)
+        self.unique_count = None   # 最近一次完整遍历得到的去重后关系数，有新增时失效
+
+    def extend(self, relations):
+        self.extend_lines(encode_relation(rel) for rel in relations)
+        self.unique_count = None
+
+    def append(self, rel):
+        self.extend((rel,))
+
+    def iter_lines(self):
+        count = 0
+        for line in super().iter_lines():
+            count += 1
+            yield line
+        self.unique_count = count
+
+    def __iter__(self):
+        for line in self.iter_lines():
+            yield decode_relation(line)
+
+    def __len__(self):
+        if self.unique_count is None:
+            for _ in self.iter_lines():
+                pass
+        return self.unique_count
+
+    def iter_groups(self):
+        """按 head 分组产出 (head, [relation])"""
+        for _, rels in groupby(self, key=lambda rel: json.dumps(rel["head"])):
+            rels = list(rels)
+            yield rels[0]["head"], rels
+
+
+def write_relations_stream(relation_path, relations):
+    """逐条写出关系 JSON 数组，格式与 json.dump(relations, f, indent=2) 一致"""
+    with open(relation_path, 'w') as f:
+        first = True
+        for rel in relations:
+            f.write("[\n  " if first else ",\n  ")
+            f.write(json.dumps(rel, indent=2).replace("\n", "\n  "))
+            first = False
+        f.write("[]" if first else "\n]")
+
+
+def write_relation_groups(group_path, sink):
+    """按 head 分组写出 JSON Lines：每行 {"head", "relations": [{"tail", "type"[, "rhs"]}]}"""
+    with open(group_path, 'w') as f:
+        for head, rels in sink.iter_groups():
+            f.write(json.dumps({
+                "head": head,
+                "relations": [{k: v for k, v in r.items() if k != "head"} for r in rels],
+            }) + "\n")
@@ -0,0 +1,113 @@
+"""
+CALLS / ASSIGNED_TO 的发生位置（调用点 / 赋值点）旁表：位置不写进 relation.json 的每个关系字典，
+而是输出与关系数组对齐的紧凑 NumPy 表 relation_sites.npy，每行：
+    relation        关系在 relation.json 中的下标
+    type            SITE_TYPES 下标
+    head            head 实体在 entity.json 中的下标（head 为字段 id 列表时为 -1）
+    tail            tail 实体下标；tail 为字段 id 列表时每个元素各占一行
+    file            发生位置所在 FILE 实体的下标
+    line / column   从 1 开始的行号、列号（列按字节计）
+    byte            在源文件中的字节偏移
+表按 (tail, relation) 排序并以 mmap 读取，"X 的调用点" 为 tail 列上的一次二分查找，无需重新解析源文件。
+
+用法：
+    python run_extract_all.py --source glibc/ --output out/ --relation-sites
+    python relation_sites.py --graph out/ --id 123 [--type CALLS]
+"""
+import os
+
+import numpy as np
+
+from json_stream import iter_json_array
+
+SITE_TYPES = ("CALLS", "ASSIGNED_TO")
+SITE_DTYPE = np.dtype([
+    ("relation", "<u4"),
+    ("type", "u1"),
+    ("head", "<i4"),
+    ("tail", "<i4"),
+    ("file", "<i4"),
+    ("line", "<u4"),
+    ("column", "<u4"),
+    ("byte", "<u8"),
+])
+
+
+def sites_path(output_dir):
+    return os.path.join(output_dir, 'relation_sites.npy')
+
+
+def write_relation_sites(output_dir, sites, all_entities, all_relations):
+    """
+    sites: [(关系下标, FILE 实体 id, 行, 列, 字节偏移)]，关系下标为 all_relations（即 relation.json）中的位置
+    返回写出的行数
+    """
+    index = {e["id"]: i for i, e in enumerate(all_entities)}
+    type_code = {t: i for i, t in enumerate(SITE_TYPES)}
+    rows = []
+    for relation, file_id, line, column, byte in sites:
+        rel = all_relations[relation]
+        head = -1 if isinstance(rel["head"], list) else index.get(rel["head"], -1)
+        tails = rel["tail"] if isinstance(rel["tail"], list) else [rel["tail"]]
+        for tail in tails:
+            rows.append((relation, type_code[rel["type"]], head, index.get(tail, -1), index.get(file_id, -1),
+                         line, column, byte))
+
+    table = np.array(rows, dtype=SITE_DTYPE)
+    table = table[np.lexsort((table["relation"], table["tail"]))]
+    np.save(sites_path(output_dir), table)
+    return len(table)
+
+
+def open_relation_sites(graph_dir):
+    """返回查询句柄（dict）：旁表以 mmap 打开，另读入实体 id 与 FILE 路径"""
+    ids = []
+    files = {}
+    for i, e in enumerate(iter_json_array(os.path.join(graph_dir, 'entity.json'))):
+        ids.append(e["id"])
+        if e["type"] == "FILE":
+            files[i] = e["name"]
+    return {
+        "table": np.load(sites_path(graph_dir), mmap_mode='r'),
+        "ids": ids,
+        "index": {entity_id: i for i, entity_id in enumerate(ids)},
+        "files": files,
+    }
+
+
+def sites_of(handle, entity_id, rel_type=None):
+    """entity_id 作为 tail 的全部发生位置（被调用 / 被赋值的位置），rel_type 可限定为 CALLS 或 ASSIGNED_TO"""
+    i = handle["index"].get(str(entity_id))
+    if i is None:
+        return []
+    table = handle["table"]
+    tails = table["tail"]
+    rows = table[np.searchsorted(tails, i, side='left'):np.searchsorted(tails, i, side='right')]
+    if rel_type is not None:
+        rows = rows[rows["type"] == SITE_TYPES.index(rel_type)]
+    return [
+        {
+            "relation": int(row["relation"]),
+            "type": SITE_TYPES[row["type"]],
+            "head": handle["ids"][row["head"]] if row["head"] >= 0 else None,
+            "file": handle["files"].get(int(row["file"])),
+            "line": int(row["line"]),
+            "column": int(row["column"]),
+            "byte": int(row["byte"]),
+        }
+        for row in rows
+    ]
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--graph", type=str, required=True, help="包含 relation_sites.npy 的图谱目录")
+    parser.add_argument("--id", type=str, required=True, help="被调用 / 被赋值的实体 id")
+    parser.add_argument("--type", choices=SITE_TYPES, default=None, help="只列出该类型关系的位置")
+    args = parser.parse_args()
+
+    found = sites_of(open_relation_sites(args.graph), args.id, args.type)
+    for site in found:
+        print(f"  {site['type']:<12} {site['file']}:{site['line']}:{site['column']}  (head {site['head']})")
+    print(f"\n📍 共 {len(found)} 处")
@@ -1,6 +1,7 @@
 import os
 import json
 import time
+import hashlib
 import tracemalloc
 from collections import defaultdict, Counter
 from tqdm import tqdm
@@ -21,7 +22,26 @@ from extract_relation_has_members import extract_has_member_relations
 from extract_relation_has_parameters import extract_has_parameter_relations
 from extract_relation_has_variables import extract_has_variable_relations
 from extract_relation_returns import extract_returns_relations
-from extract_relation_typeof import extract_typeof_relations
+from extract_relation_typeof import extract_typeof_relations, typeof_scope_maps
+from extract_relation_indirect_calls import extract_indirect_calls_relations
+
+from source_reader import prefetch_sources, read_source_bytes
+from relation_sink import RelationSink, write_relations_stream, write_relation_groups
+from field_type_index import build_field_index
+from block_shards import write_graph_shards
+from symbol_index import write_symbol_index
+from source_blob import write_source_blob
+from graph_rollup import write_rollup
+from relation_sites import write_relation_sites
+from stable_ids import stable_id_map, check_unique, write_id_table
+from compile_db import select_compiled_files, compile_flags
+from checkpoint import (
+    open_checkpoint, load_segments, save_entities, entity_tick, iter_stage, stage_done, finish_stage, remove_checkpoint
+)
+from include_graph import file_search_paths, write_include_index
+from extract_relation_includes import extract_includes_relations
+from file_budget import SCHEDULE_ORDERS, new_budget, isolate, schedule_files, run_guarded, write_isolation_report
+from parallel_relations import extract_relations_parallel
 
 # === 配置路径 ===
 ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -29,6 +49,13 @@ LANG_SO_PATH = os.path.join(ROOT_DIR, '..', 'build', 'my-languages.so')
 OUTPUT_BASE = os.path.join(ROOT_DIR, '..', 'output')
 MACRO_JSON_PATH = "/data/xuao/code_kg/data/glibc_data/macro.json"
 
+# 抽取级别，由快到全：
+#   skeleton  声明级快速扫描：不进入函数体（function_definition 的 body），只有文件、函数、参数、结构体、字段与全局变量，
+#             关系只有 CONTAINS / HAS_MEMBER / HAS_PARAMETER（以及 --includes 的 INCLUDES）
+#   entities  完整实体（含局部变量），关系同上并加 HAS_VARIABLE
+#   full      全部实体与关系（CALLS、ASSIGNED_TO、RETURNS、TYPE_OF、间接 CALLS）
+EXTRACTION_LEVELS = ("skeleton", "entities", "full")
+
 def id_generator(start=1):
     while True:
         yield start
@@ -60,171 +87,785 @@ def load_macro_lookup_map(json_path):
         })
     return macro_lookup_map
 
-def extract_all(source_dir, output_dir):
-    os.makedirs(output_dir, exist_ok=True)
-    entity_path = os.path.join(output_dir, 'entity.json')
-    relation_path = os.path.join(output_dir, 'relation.json')
-
-    id_counter = id_generator()
-    parser = get_parser()
-
+def extract_file_record(source_path, root, code_bytes, id_counter, skip_bodies=False):
+    """
+    阶段 1：单个文件的实体提取。
+    返回该文件的实体列表与局部映射表（尚未合并到全局符号表）；
+    skip_bodies 为 True 时不进入函数体（skeleton 级别），不提取局部变量
+    """
+    file_entities, file_id = extract_file_entity(source_path, id_counter)
+
+    functions, f_map = extract_function_entities(root, code_bytes, id_counter, skip_bodies)
+    structs, s_map = extract_struct_entities(root, code_bytes, id_counter)
+    variables, v_map, scope_map = extract_variable_entities(root, code_bytes, id_counter, skip_bodies)
+    params, p_map = extract_function_parameters(root, code_bytes, id_counter, f_map, skip_bodies)
+    fields, f_map2 = extract_field_entities(root, code_bytes, id_counter, s_map)
+
+    for e in functions + structs + variables + params + fields:
+        e["source_file"] = source_path
+
+    return {
+        "source_path": source_path,
+        "file_id": file_id,
+        "file_entities": file_entities,
+        "functions": functions,
+        "function_map": f_map,
+        "structs": structs,
+        "struct_map": s_map,
+        "variables": variables,
+        "variable_map": v_map,
+        "scope_map": scope_map,
+        "params": params,
+        "param_map": p_map,
+        "fields": fields,
+        "field_map": f_map2,
+    }
+
+def record_entities(record):
+    """逐文件记录中的全部实体，顺序与 id 分配顺序一致"""
+    return (
+        record["file_entities"] + record["functions"] + record["structs"]
+        + record["variables"] + record["params"] + record["fields"]
+    )
+
+def rebind_record(record, id_map, source_path=None):
+    """
+    复制一份逐文件实体记录，按 id_map（旧 id -> 新 id）重写实体 id 与映射表；
+    指定 source_path 时同时改写所属文件路径
+    """
+    source_path = source_path or record["source_path"]
+
+    def remap(entity_id):
+        return id_map.get(entity_id, entity_id)
+
+    def rebind(entities):
+        result = []
+        for e in entities:
+            e = dict(e)
+            e["id"] = remap(e["id"])
+            if e["type"] == "FILE":
+                e["name"] = source_path
+            else:
+                e["source_file"] = source_path
+            result.append(e)
+        return result
+
+    return {
+        "source_path": source_path,
+        "file_id": remap(record["file_id"]),
+        "file_entities": rebind(record["file_entities"]),
+        "functions": rebind(record["functions"]),
+        "function_map": {k: remap(v) for k, v in record["function_map"].items()},
+        "structs": rebind(record["structs"]),
+        "struct_map": {k: remap(v) for k, v in record["struct_map"].items()},
+        "variables": rebind(record["variables"]),
+        "variable_map": {k: remap(v) for k, v in record["variable_map"].items()},
+        "scope_map": {k: [remap(v) for v in ids] for k, ids in record["scope_map"].items()},
+        "params": rebind(record["params"]),
+        "param_map": {k: remap(v) for k, v in record["param_map"].items()},
+        "fields": rebind(record["fields"]),
+        "field_map": {k: [remap(v) for v in ids] for k, ids in record["field_map"].items()},
+    }
+
+def build_record(source_path, file_entities, functions, structs, variables, params, fields):
+    """由已有实体重建逐文件记录（映射表口径与各实体抽取器一致）"""
+    scope_map = {}
+    for e in variables:
+        scope_map.setdefault(e["scope"], []).append(e["id"])
+    field_map = {}
+    for e in fields:
+        field_map.setdefault(e["name"], []).append(e["id"])
+
+    return {
+        "source_path": source_path,
+        "file_id": file_entities[0]["id"] if file_entities else None,
+        "file_entities": file_entities,
+        "functions": functions,
+        "function_map": {e["name"]: e["id"] for e in functions},
+        "structs": structs,
+        "struct_map": {(e["name"], e["scope"]): e["id"] for e in structs},
+        "variables": variables,
+        "variable_map": {(e["name"], e["scope"]): e["id"] for e in variables},
+        "scope_map": scope_map,
+        "params": params,
+        "param_map": {(e["name"], e["scope"]): e["id"] for e in params},
+        "fields": fields,
+        "field_map": field_map,
+    }
+
+def records_from_entities(entities):
+    """
+    由输出的 entity.json 还原逐文件记录，按 FILE 实体的顺序返回
+    """
+    groups = {}
+    for e in entities:
+        if e["type"] == "FILE":
+            groups.setdefault(e["name"], {}).setdefault("FILE", []).append(e)
+            continue
+        kind = "PARAM" if e.get("role") == "param" else e["type"]
+        groups.setdefault(e.get("source_file"), {}).setdefault(kind, []).append(e)
+
+    return [
+        build_record(
+            source_path,
+            group.get("FILE", []),
+            group.get("FUNCTION", []),
+            group.get("STRUCT", []),
+            group.get("VARIABLE", []),
+            group.get("PARAM", []),
+            group.get("FIELD", []),
+        )
+        for source_path, group in groups.items()
+        if group.get("FILE")
+    ]
+
+def merge_file_records(records):
+    """
+    按文件顺序合并各文件的实体与映射表，得到全局实体列表与符号表
+    """
+    symbols = {
+        "function_id_map": {},
+        "variable_id_map": {},
+        "param_id_map": {},
+        "struct_id_map": {},
+        "field_id_map": {},
+        "variable_scope_map": {},
+        "file_id_map": {},
+        "function_entities": [],
+        "param_entities": [],
+        "variable_entities": [],
+        "struct_entities": [],
+        "field_entities": [],
+    }
     all_entities = []
-    all_relations = []
-
-    # 映射表与实体容器
-    function_id_map = {}
-    variable_id_map = {}
-    param_id_map = {}
-    struct_id_map = {}
-    field_id_map = {}
-    variable_scope_map = {}
-    file_id_map = {}
-
-    function_entities = []
-    param_entities = []
-    variable_entities = []
-    struct_entities = []
-    field_entities = []
-
-    file_trees = []
 
-    # === 源码与宏信息读取 ===
-    c_files = list(get_c_files(source_dir))
-    macro_lookup_map = load_macro_lookup_map(MACRO_JSON_PATH)
-    print("✅ 读取宏展开信息完成，共包含文件数：", len(macro_lookup_map))
-
-    # === 阶段 1：提取所有实体 ===
-    for source_path in tqdm(c_files, desc="🔍 阶段 1：提取实体"):
-        with open(source_path, 'rb') as f:
-            code_bytes = f.read()
-        tree = parser.parse(code_bytes)
-        root = tree.root_node
-        file_trees.append((source_path, root, code_bytes))
-
-        file_entities, file_id = extract_file_entity(source_path, id_counter)
-        file_id_map[source_path] = file_id
-        all_entities.extend(file_entities)
-
-        functions, f_map = extract_function_entities(root, code_bytes, id_counter)
-        for e in functions: e["source_file"] = source_path
-        function_entities.extend(functions)
-        function_id_map.update(f_map)
-
-        structs, s_map = extract_struct_entities(root, code_bytes, id_counter)
-        for e in structs: e["source_file"] = source_path
-        struct_entities.extend(structs)
-        struct_id_map.update(s_map)
-
-        variables, v_map, scope_map = extract_variable_entities(root, code_bytes, id_counter)
-        for e in variables: e["source_file"] = source_path
-        variable_entities.extend(variables)
-        variable_id_map.update(v_map)
-        variable_scope_map.update(scope_map)
-
-        params, p_map = extract_function_parameters(root, code_bytes, id_counter, f_map)
-        for e in params: e["source_file"] = source_path
-        param_entities.extend(params)
-        param_id_map.update(p_map)
-
-        fields, f_map2 = extract_field_entities(root, code_bytes, id_counter, s_map)
-        for e in fields: e["source_file"] = source_path
-        field_entities.extend(fields)
-        for name, ids in f_map2.items():
-            field_id_map.setdefault(name, []).extend(ids)
-
-    all_entities.extend(function_entities + struct_entities + variable_entities + param_entities + field_entities)
-
-    # === 阶段 2：提取 CALLS 关系 ===
-    for source_path, root, code_bytes in tqdm(file_trees, desc="🔗 阶段 2：提取 CALLS"):
-        abs_path = os.path.abspath(source_path)
-        rels = extract_calls_relations(
-            root,
-            code_bytes,
-            function_id_map,
-            {**variable_id_map, **param_id_map},
-            field_id_map,
-            macro_lookup_map,
-            abs_path
+    for record in records:
+        symbols["file_id_map"][record["source_path"]] = record["file_id"]
+        all_entities.extend(record["file_entities"])
+
+        symbols["function_entities"].extend(record["functions"])
+        symbols["function_id_map"].update(record["function_map"])
+
+        symbols["struct_entities"].extend(record["structs"])
+        symbols["struct_id_map"].update(record["struct_map"])
+
+        symbols["variable_entities"].extend(record["variables"])
+        symbols["variable_id_map"].update(record["variable_map"])
+        symbols["variable_scope_map"].update(record["scope_map"])
+
+        symbols["param_entities"].extend(record["params"])
+        symbols["param_id_map"].update(record["param_map"])
+
+        symbols["field_entities"].extend(record["fields"])
+        for name, ids in record["field_map"].items():
+            symbols["field_id_map"].setdefault(name, []).extend(ids)
+
+    all_entities.extend(
+        symbols["function_entities"] + symbols["struct_entities"] + symbols["variable_entities"]
+        + symbols["param_entities"] + symbols["field_entities"]
+    )
+
+    # 按 (结构体, 字段) 解析字段访问的类型索引
+    symbols["field_index"] = build_field_index(
+        symbols["struct_entities"], symbols["field_entities"],
+        symbols["variable_entities"], symbols["param_entities"]
+    )
+    return all_entities, symbols
+
+def content_digest(code_bytes):
+    """源文件内容哈希，用于识别字节级相同的文件"""
+    return hashlib.blake2b(code_bytes, digest_size=16).digest()
+
+def rebind_duplicate(record, source_path, id_counter):
+    """
+    将内容相同文件的实体记录复制到另一路径，按 id 分配顺序重新取号，
+    结果与直接对该路径抽取一致
+    """
+    id_map = {e["id"]: str(next(id_counter)) for e in record_entities(record)}
+    return rebind_record(record, id_map, source_path)
+
+def stabilize_record(record):
+    """将单个文件的实体记录改写为稳定 id（只依赖该文件自身的实体）"""
+    return rebind_record(record, stable_id_map(record_entities(record)))
+
+def attach_compile_flags(record, flags):
+    """将 TU 的编译参数写入 FILE 实体；内容相同的文件复制来的参数按本文件重新设置"""
+    for e in record["file_entities"]:
+        if flags is None:
+            e.pop("compile_flags", None)
+        else:
+            e["compile_flags"] = flags
+
+def extract_file_semantic_relations(
+    root, code_bytes, function_id_map, var_param_id_map, field_id_map, var_entities, field_entities, struct_id_map,
+    scope_maps=None
+):
+    """阶段 5 中逐文件的 RETURNS 与 TYPE_OF"""
+    rels = extract_returns_relations(root, code_bytes, function_id_map, var_param_id_map, field_id_map)
+    rels += extract_typeof_relations(root, code_bytes, var_entities, field_entities, struct_id_map, scope_maps)
+    return rels
+
+def parse_file_record(parser, source_path, code_bytes, id_counter, skip_bodies=False):
+    """解析并抽取单个文件的实体，返回 (root, record)"""
+    root = parser.parse(code_bytes).root_node
+    return root, extract_file_record(source_path, root, code_bytes, id_counter, skip_bodies)
+
+def extract_relations(
+    file_trees, records, all_entities, symbols, macro_lookup_map, content_digests=None, budget=None, sink=None,
+    include_search=None, checkpoint=None, level="full", sites=None, workers=0, indirect_calls=True
+):
+    """
+    阶段 2 ~ 6：基于全局符号表提取所有关系。
+    file_trees: [(source_path, root, code_bytes)]
+    records: 与 file_trees 一一对应的逐文件实体记录（extract_file_record 的结果）
+    content_digests: 可选，source_path -> 内容哈希；内容与宏信息都相同的文件只抽取一次逐文件关系
+    budget: 可选，file_budget.new_budget 的结果；超预算的文件跳过该阶段并记录
+    sink: 可选，RelationSink；给定时关系写入按内存预算落盘的存储（按 head 有序、去重），并返回该 sink
+    include_search: 可选，source_path -> #include 搜索路径（include_graph.file_search_paths）；给定时抽取 INCLUDES
+    checkpoint: 可选，checkpoint.open_checkpoint 的结果；按阶段 / 文件保存进度，续跑时从检查点中的关系继续，
+                跳过已完成的阶段与文件（不支持与 sink 同时使用）
+    level: 抽取级别（见 EXTRACTION_LEVELS），低于 full 时只提取声明级的静态关系，跳过分析函数体的阶段 2、3、5、6
+    sites: 可选，列表；给定时追加 CALLS / ASSIGNED_TO 的发生位置 (关系下标, FILE id, 行, 列, 字节偏移)，
+           关系下标为其在返回的关系列表中的位置（见 relation_sites.py，不支持与 sink、checkpoint 同时使用）
+    workers: 大于 1 时阶段 2、3、5 的逐文件抽取由多个进程并行完成，符号表冻结到共享内存供各进程只读访问
+             （见 parallel_relations.py）；结果仍按文件顺序组装，与单进程抽取一致（不支持与 checkpoint 同时使用）
+    indirect_calls: 为 False 时跳过阶段 6，由调用方自行计算并维护间接 CALLS（如 extract_daemon 的增量更新）
+    """
+    function_id_map = symbols["function_id_map"]
+    struct_id_map = symbols["struct_id_map"]
+    field_id_map = symbols["field_id_map"]
+    variable_entities = symbols["variable_entities"]
+    param_entities = symbols["param_entities"]
+    field_entities = symbols["field_entities"]
+
+    field_index = symbols.get("field_index")
+
+    # 变量与参数共用一张查找表
+    var_param_id_map = {**symbols["variable_id_map"], **symbols["param_id_map"]}
+
+    body_stages = level == "full"
+    all_relations = [] if sink is None else sink
+    if checkpoint is not None:
+        all_relations = load_segments(checkpoint, "relations")
+
+    def content_key(source_path):
+        # 逐文件关系只取决于语法树、全局符号表与该文件的宏信息
+        if content_digests is None or source_path not in content_digests:
+            return None
+        macros = macro_lookup_map.get(os.path.abspath(source_path)) if macro_lookup_map else None
+        return content_digests[source_path], json.dumps(macros) if macros else None
+
+    def add_sites(source_path, rel_sites):
+        # 须在对应关系加入 all_relations 之前调用
+        if rel_sites is None:
+            return
+        base = len(all_relations)
+        file_id = symbols["file_id_map"][source_path]
+        sites.extend((base + k, file_id) + site for k, site in enumerate(rel_sites))
+
+    # TYPE_OF 的 (名称, 作用域) 映射只依赖全局实体，构建一次供各文件共用
+    var_entities = variable_entities + param_entities
+    scope_maps = typeof_scope_maps(var_entities, field_entities) if body_stages else None
+
+    # 并行抽取：内容相同的文件只派发一次，其余仍走下方的内容缓存
+    parallel = {}
+    if body_stages and workers > 1:
+        if checkpoint is not None:
+            raise ValueError("并行关系抽取暂不支持与检查点同时使用")
+        dispatched = set()
+        files = []
+        for source_path, _, code_bytes in file_trees:
+            key = content_key(source_path)
+            if key is None or key not in dispatched:
+                dispatched.add(key)
+                files.append((source_path, code_bytes))
+        parallel = extract_relations_parallel(
+            files, symbols, var_param_id_map, scope_maps, macro_lookup_map, workers, LANG_SO_PATH, budget,
+            sites is not None
         )
-        all_relations.extend(rels)
 
-    # === 阶段 3：提取 ASSIGNED_TO 关系 ===
-    for source_path, root, code_bytes in tqdm(file_trees, desc="🔗 阶段 3：提取 ASSIGNED_TO"):
-        abs_path = os.path.abspath(source_path)
-        rels = extract_assigned_to_relations(
-            root,
-            code_bytes,
-            function_id_map,
-            {**variable_id_map, **param_id_map},
-            field_id_map,
-            macro_lookup_map,
-            abs_path
-        )
-        all_relations.extend(rels)
+    def take_parallel(source_path, stage):
+        """取出并行抽取的结果并补记隔离，没有结果（未派发）时返回 False"""
+        result = parallel.get(source_path, {}).pop(stage, None)
+        if result is None:
+            return False, None, None
+        rels, rel_sites, isolated = result
+        if budget is not None:
+            budget["isolated"].extend(isolated)
+        return True, rels, rel_sites
+
+    if body_stages:
+        # === 阶段 2：提取 CALLS 关系 ===
+        cache = {}
+        stage_files = tqdm(file_trees, desc="🔗 阶段 2：提取 CALLS")
+        for source_path, root, code_bytes in iter_stage(checkpoint, "CALLS", stage_files, all_relations, budget):
+            key = content_key(source_path)
+            if key in cache:
+                rels, rel_sites = cache[key]
+                add_sites(source_path, rel_sites)
+                all_relations.extend(rels)
+                continue
+            done, rels, rel_sites = take_parallel(source_path, "CALLS")
+            if not done:
+                abs_path = os.path.abspath(source_path)
+                rel_sites = [] if sites is not None else None
+                rels = run_guarded(
+                    budget, source_path, "CALLS",
+                    extract_calls_relations,
+                    root,
+                    code_bytes,
+                    function_id_map,
+                    var_param_id_map,
+                    field_id_map,
+                    macro_lookup_map,
+                    abs_path,
+                    field_index,
+                    rel_sites
+                )
+            if rels is None:
+                continue
+            if key is not None:
+                cache[key] = rels, rel_sites
+            add_sites(source_path, rel_sites)
+            all_relations.extend(rels)
+
+        # === 阶段 3：提取 ASSIGNED_TO 关系 ===
+        cache = {}
+        stage_files = tqdm(file_trees, desc="🔗 阶段 3：提取 ASSIGNED_TO")
+        for source_path, root, code_bytes in iter_stage(checkpoint, "ASSIGNED_TO", stage_files, all_relations, budget):
+            key = content_key(source_path)
+            if key in cache:
+                rels, rel_sites = cache[key]
+                add_sites(source_path, rel_sites)
+                all_relations.extend(rels)
+                continue
+            done, rels, rel_sites = take_parallel(source_path, "ASSIGNED_TO")
+            if not done:
+                abs_path = os.path.abspath(source_path)
+                rel_sites = [] if sites is not None else None
+                rels = run_guarded(
+                    budget, source_path, "ASSIGNED_TO",
+                    extract_assigned_to_relations,
+                    root,
+                    code_bytes,
+                    function_id_map,
+                    var_param_id_map,
+                    field_id_map,
+                    macro_lookup_map,
+                    abs_path,
+                    field_index,
+                    rel_sites
+                )
+            if rels is None:
+                continue
+            if key is not None:
+                cache[key] = rels, rel_sites
+            add_sites(source_path, rel_sites)
+            all_relations.extend(rels)
 
     # === 阶段 4：静态关系（包含/成员） ===
-    for source_path in c_files:
-        file_id = file_id_map.get(source_path)
-        if file_id is None:
-            continue
-        rels = build_file_level_contains(file_id, function_id_map, struct_id_map, variable_scope_map)
+    # FILE 只包含本文件定义的函数、结构体与全局变量
+    if not stage_done(checkpoint, "CONTAINS"):
+        for record in records:
+            rels = build_file_level_contains(
+                record["file_id"],
+                record["function_map"],
+                record["struct_map"],
+                record["scope_map"]
+            )
+            all_relations.extend(rels)
+
+        rels = extract_has_member_relations(field_entities, struct_id_map)
         all_relations.extend(rels)
-
-    rels = extract_has_member_relations(field_entities, struct_id_map)
-    all_relations.extend(rels)
+        finish_stage(checkpoint, "CONTAINS", all_relations)
+
+    # FILE INCLUDES FILE：#include 按搜索路径解析到图谱中的文件，解析结果跨文件缓存
+    if include_search is not None:
+        file_id_map = {os.path.abspath(path): file_id for path, file_id in symbols["file_id_map"].items()}
+        resolve_cache = {}
+        stage_files = tqdm(file_trees, desc="🔗 阶段 4：提取 INCLUDES")
+        for source_path, root, code_bytes in iter_stage(checkpoint, "INCLUDES", stage_files, all_relations, budget):
+            rels = run_guarded(
+                budget, source_path, "INCLUDES",
+                extract_includes_relations,
+                root,
+                code_bytes,
+                source_path,
+                file_id_map,
+                include_search(source_path),
+                resolve_cache
+            )
+            if rels is not None:
+                all_relations.extend(rels)
 
     # === 阶段 5：基于函数的内部语义关系 ===
-    for _, root, code_bytes in tqdm(file_trees, desc="🔗 阶段 5：提取 RETURNS / HAS_PARAM / HAS_VAR / TYPE_OF"):
-        # HAS_PARAMETER
+    # HAS_PARAMETER / HAS_VARIABLE 只依赖实体列表，全局计算一次
+    if not stage_done(checkpoint, "HAS_PARAMETER / HAS_VARIABLE"):
         rels = extract_has_parameter_relations(param_entities, function_id_map)
         all_relations.extend(rels)
 
-        # HAS_VARIABLE
         rels = extract_has_variable_relations(variable_entities, function_id_map)
         all_relations.extend(rels)
+        finish_stage(checkpoint, "HAS_PARAMETER / HAS_VARIABLE", all_relations)
+
+    if body_stages:
+        cache = {}
+        stage_files = tqdm(file_trees, desc="🔗 阶段 5：提取 RETURNS / TYPE_OF")
+        for source_path, root, code_bytes in iter_stage(checkpoint, "RETURNS / TYPE_OF", stage_files, all_relations, budget):
+            key = content_digests.get(source_path) if content_digests is not None else None
+            if key in cache:
+                all_relations.extend(cache[key])
+                continue
+
+            done, rels, _ = take_parallel(source_path, "RETURNS / TYPE_OF")
+            if not done:
+                rels = run_guarded(
+                    budget, source_path, "RETURNS / TYPE_OF",
+                    extract_file_semantic_relations,
+                    root,
+                    code_bytes,
+                    function_id_map,
+                    var_param_id_map,
+                    field_id_map,
+                    var_entities,
+                    field_entities,
+                    struct_id_map,
+                    scope_maps
+                )
+            if rels is None:
+                continue
+            if key is not None:
+                cache[key] = rels
+            all_relations.extend(rels)
+
+        # === 阶段 6：函数指针指向分析，解析间接 CALLS ===
+        if indirect_calls and not stage_done(checkpoint, "INDIRECT_CALLS"):
+            rels = extract_indirect_calls_relations(all_entities, all_relations)
+            print(f"🎯 阶段 6：函数指针间接调用解析 {len(rels)} 条")
+            all_relations.extend(rels)
+            finish_stage(checkpoint, "INDIRECT_CALLS", all_relations)
+
+    return all_relations
+
+def extract_file_relations(source_path, root, code_bytes, record, symbols, var_param_id_map, macro_lookup_map):
+    """
+    单个文件产生的关系，口径与 extract_relations 的阶段 2 ~ 5 一致（不含阶段 6 的全局间接 CALLS）
+    用于只重抽取部分文件的增量场景
+    """
+    function_id_map = symbols["function_id_map"]
+    field_id_map = symbols["field_id_map"]
+    struct_id_map = symbols["struct_id_map"]
+    field_index = symbols.get("field_index")
+    abs_path = os.path.abspath(source_path)
+
+    relations = []
+    relations += extract_calls_relations(
+        root, code_bytes, function_id_map, var_param_id_map, field_id_map, macro_lookup_map, abs_path, field_index
+    )
+    relations += extract_assigned_to_relations(
+        root, code_bytes, function_id_map, var_param_id_map, field_id_map, macro_lookup_map, abs_path, field_index
+    )
+    relations += build_file_level_contains(
+        record["file_id"], record["function_map"], record["struct_map"], record["scope_map"]
+    )
+    relations += extract_has_member_relations(record["fields"], struct_id_map)
+    relations += extract_has_parameter_relations(record["params"], function_id_map)
+    relations += extract_has_variable_relations(record["variables"], function_id_map)
+    relations += extract_returns_relations(root, code_bytes, function_id_map, var_param_id_map, field_id_map)
+    relations += extract_typeof_relations(
+        root,
+        code_bytes,
+        symbols["variable_entities"] + symbols["param_entities"],
+        symbols["field_entities"],
+        struct_id_map
+    )
+    return relations
+
+def write_graph(output_dir, all_entities, all_relations):
+    os.makedirs(output_dir, exist_ok=True)
+    entity_path = os.path.join(output_dir, 'entity.json')
+    relation_path = os.path.join(output_dir, 'relation.json')
 
-        # RETURNS
-        rels = extract_returns_relations(
-            root,
-            code_bytes,
-            function_id_map,
-            {**variable_id_map, **param_id_map},
-            field_id_map
-        )
-        all_relations.extend(rels)
-
-        # TYPE_OF
-        rels = extract_typeof_relations(
-            root,
-            code_bytes,
-            variable_entities + param_entities,
-            field_entities,
-            struct_id_map
-        )
-        all_relations.extend(rels)
-
-    # === 输出 JSON ===
     with open(entity_path, 'w') as f:
         json.dump(all_entities, f, indent=2)
-    with open(relation_path, 'w') as f:
-        json.dump(all_relations, f, indent=2)
-
+    if isinstance(all_relations, list):
+        with open(relation_path, 'w') as f:
+            json.dump(all_relations, f, indent=2)
+    else:
+        # 落盘存储的关系逐条写出
+        write_relations_stream(relation_path, all_relations)
+
+def print_summary(all_entities, all_relations):
     print(f"\n✅ 提取完成：实体 {len(all_entities)} 个，关系 {len(all_relations)} 条。")
     relation_types = Counter([r['type'] for r in all_relations])
     print("\n📊 关系类型统计：")
     for k, v in relation_types.items():
         print(f"  - {k}: {v}")
 
+def extract_all(
+    source_dir, output_dir, io_workers=8, prefetch=64, dedup=True,
+    order="walk", max_file_bytes=0, file_timeout=0, relation_memory_mb=0, group_by_head=False,
+    output_format="json", symbol_index=False, stable_ids=False, compile_commands=None, attach_flags=False,
+    includes=False, include_dirs=(), checkpoint_every=0, resume=False, level="full", source_blob=False,
+    rollup_depth=None, relation_sites=False, relation_workers=0
+):
+    os.makedirs(output_dir, exist_ok=True)
+    skip_bodies = level == "skeleton"
+
+    # 下一个待分配的 id：单个文件抽取成功后才推进，被隔离的文件不占用 id
+    next_id = 1
+    parser = get_parser()
+    budget = new_budget(max_file_bytes, file_timeout)
+
+    records = []
+    file_trees = []
+
+    # === 宏信息读取（只有分析函数体的关系阶段需要） ===
+    macro_lookup_map = {}
+    if level == "full":
+        macro_lookup_map = load_macro_lookup_map(MACRO_JSON_PATH)
+        print("✅ 读取宏展开信息完成，共包含文件数：", len(macro_lookup_map))
+
+    # === 阶段 1：提取所有实体 ===
+    # 目录遍历与文件读取在后台线程中预取，与解析重叠
+    # 字节级相同的文件（拷贝的第三方代码、按架构重复的头文件等）只解析、抽取一次
+    content_digests = {} if dedup else None
+    unique_contents = {}  # 内容哈希 -> (root, code_bytes, record)，抽取失败的内容为 None
+    isolated_digests = []
+    # 指定 compile_commands.json 时只抽取参与构建的 TU 及其依赖的头文件
+    paths = get_c_files(source_dir)
+    units = {}
+    if compile_commands:
+        paths, units = select_compiled_files(paths, compile_commands)
+        print(f"🧩 按编译数据库选中文件 {len(paths)} 个，其中翻译单元 {len(units)} 个")
+    file_flags = {path: compile_flags(unit) for path, unit in units.items()} if attach_flags else {}
+    paths = schedule_files(paths, order, budget)
+
+    # === 检查点：续跑时恢复阶段 1 的进度，已完成的文件只重新解析 ===
+    if relation_memory_mb > 0 and (checkpoint_every > 0 or resume):
+        raise ValueError("检查点暂不支持与关系落盘（relation_memory_mb）同时使用")
+    if relation_sites and (relation_memory_mb > 0 or checkpoint_every > 0 or resume or output_format != "json"):
+        raise ValueError("发生位置旁表按 relation.json 的下标对齐，需要 json 输出，且不支持关系落盘与检查点")
+    if relation_workers > 1 and (checkpoint_every > 0 or resume):
+        raise ValueError("并行关系抽取暂不支持与检查点同时使用")
+    ckpt = open_checkpoint(output_dir, {
+        "source_dir": os.path.abspath(source_dir),
+        "macro_json": MACRO_JSON_PATH,
+        "dedup": dedup,
+        "order": order,
+        "max_file_bytes": max_file_bytes,
+        "file_timeout": file_timeout,
+        "stable_ids": stable_ids,
+        "compile_commands": compile_commands,
+        "attach_flags": attach_flags,
+        "includes": includes,
+        "include_dirs": list(include_dirs),
+        "level": level,
+    }, checkpoint_every, resume)
+    if ckpt is not None and ckpt["resumed"]:
+        state = ckpt["state"]
+        records = load_segments(ckpt, "records")
+        next_id = state["next_id"]
+        for record in tqdm(records, desc="♻️ 续跑：重建语法树"):
+            source_path = record["source_path"]
+            code_bytes = read_source_bytes(source_path)
+            root = parser.parse(code_bytes).root_node
+            file_trees.append((source_path, root, code_bytes))
+            if dedup:
+                digest = content_digest(code_bytes)
+                content_digests[source_path] = digest
+                unique_contents.setdefault(digest, (root, code_bytes, record))
+        isolated_digests = list(state["isolated_digests"])
+        for digest in isolated_digests:
+            unique_contents[digest] = None
+        # 跳过已处理的调度文件；调度阶段的隔离记录以检查点为准
+        for _ in range(state["files_done"]):
+            next(paths, None)
+        budget["isolated"] = list(state["isolated"])
+        print(f"♻️ 从检查点续跑：已完成文件 {state['files_done']} 个，已完成的关系阶段 {state['stages_done']}")
+
+    def extract_one(source_path, code_bytes):
+        nonlocal next_id
+        if dedup:
+            digest = content_digest(code_bytes)
+            content_digests[source_path] = digest
+            if digest in unique_contents:
+                cached = unique_contents[digest]
+                if cached is None:
+                    isolate(budget, source_path, "entities", "与已隔离的文件内容相同", size=len(code_bytes))
+                    return
+                root, code_bytes, record = cached
+                if root is None:
+                    root = parser.parse(code_bytes).root_node
+                record = rebind_duplicate(record, source_path, id_generator(next_id))
+                next_id += len(record_entities(record))
+                if stable_ids:
+                    record = stabilize_record(record)
+                attach_compile_flags(record, file_flags.get(source_path))
+                file_trees.append((source_path, root, code_bytes))
+                records.append(record)
+                return
+
+        result = run_guarded(
+            budget, source_path, "entities",
+            parse_file_record, parser, source_path, code_bytes, id_generator(next_id), skip_bodies
+        )
+        if dedup:
+            unique_contents[digest] = None if result is None else (result[0], code_bytes, result[1])
+            if result is None:
+                isolated_digests.append(digest)
+        if result is None:
+            return
+        root, record = result
+        next_id += len(record_entities(record))
+        if stable_ids:
+            record = stabilize_record(record)
+        attach_compile_flags(record, file_flags.get(source_path))
+        file_trees.append((source_path, root, code_bytes))
+        records.append(record)
+
+    sources = prefetch_sources(paths, io_workers, prefetch)
+    for source_path, code_bytes in tqdm(sources, desc="🔍 阶段 1：提取实体"):
+        extract_one(source_path, code_bytes)
+        entity_tick(ckpt, records, next_id, budget, isolated_digests)
+    if ckpt is not None:
+        save_entities(ckpt, records, next_id, budget, isolated_digests, done=True)
+
+    if dedup:
+        unique_count = sum(1 for cached in unique_contents.values() if cached is not None)
+        print(f"♻️ 内容去重：文件 {len(file_trees)} 个，不同内容 {unique_count} 份")
+
+    all_entities, symbols = merge_file_records(records)
+    if stable_ids:
+        check_unique(all_entities)
+
+    # === 阶段 2 ~ 6：提取关系 ===
+    # relation_memory_mb > 0 时关系超出内存预算的部分落盘，最终归并去重
+    sink = RelationSink(relation_memory_mb, output_dir) if relation_memory_mb > 0 else None
+    include_search = file_search_paths(units, include_dirs) if includes else None
+    sites = [] if relation_sites else None
+    all_relations = extract_relations(
+        file_trees, records, all_entities, symbols, macro_lookup_map, content_digests, budget, sink, include_search,
+        ckpt, level, sites, relation_workers
+    )
+
+    # === 输出 JSON / 分块压缩文件 ===
+    if output_format == "blocks":
+        # 关系落盘时分块也按同一内存预算外部排序，不把关系整体读入内存
+        write_graph_shards(output_dir, all_entities, all_relations, memory_mb=relation_memory_mb, tmp_dir=output_dir)
+    else:
+        write_graph(output_dir, all_entities, all_relations)
+    if symbol_index:
+        write_symbol_index(output_dir, all_entities)
+    if stable_ids:
+        write_id_table(output_dir, all_entities)
+    if includes:
+        write_include_index(output_dir, all_entities, all_relations)
+    if relation_sites:
+        site_count = write_relation_sites(output_dir, sites, all_entities, all_relations)
+        print(f"📍 CALLS / ASSIGNED_TO 发生位置：{site_count} 处")
+    if source_blob:
+        file_count, blob_size = write_source_blob(
+            output_dir, ((source_path, code_bytes) for source_path, _, code_bytes in file_trees), all_entities
+        )
+        print(f"📦 源码打包：文件 {file_count} 个，sources.bin {blob_size / 1024 / 1024:.2f} MB")
+    if group_by_head:
+        write_relation_groups(os.path.join(output_dir, 'relation_by_head.jsonl'), all_relations)
+    print_summary(all_entities, all_relations)
+    # 文件 / 目录级聚合图基于写出的 entity.json / relation.json 计算
+    if rollup_depth is not None:
+        rollup_dir, node_count, edge_count = write_rollup(output_dir, depth=rollup_depth)
+        print(f"🗂️ 聚合图：节点 {node_count} 个，带权边 {edge_count} 条，已写出到 {rollup_dir}")
+    if sink is not None:
+        print(f"💾 关系落盘：有序段 {len(sink.runs)} 个")
+        sink.close()
+
+    report_path = write_isolation_report(output_dir, budget)
+    if report_path:
+        print(f"\n⚠️ 隔离文件 {len(budget['isolated'])} 个，详见：{report_path}")
+    remove_checkpoint(ckpt)
+
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument("--source", type=str, required=True, help="C 源码目录路径")
     parser.add_argument("--output", type=str, required=True, help="输出目录路径")
+    parser.add_argument("--io-workers", type=int, default=8, help="预取源文件的读线程数（0 为顺序读取）")
+    parser.add_argument("--prefetch", type=int, default=64, help="预取窗口大小（已读入待解析的文件数上限）")
+    parser.add_argument("--order", choices=SCHEDULE_ORDERS, default="walk",
+                        help="文件调度顺序：walk 为目录遍历顺序，lpt 为按文件大小从大到小")
+    parser.add_argument("--max-file-size", type=int, default=0, help="单个文件大小上限（字节），超出则隔离；0 为不限制")
+    parser.add_argument("--file-timeout", type=float, default=0,
+                        help="单个文件每个阶段的解析 / 抽取耗时上限（秒），超出则隔离；0 为不限制")
+    parser.add_argument("--relation-memory-mb", type=float, default=0,
+                        help="关系内存预算（MB），超出后有序段落盘并在输出时归并去重；0 为全部保存在内存中")
+    parser.add_argument("--group-by-head", action="store_true",
+                        help="额外输出按 head 分组的 relation_by_head.jsonl（需配合 --relation-memory-mb）")
+    parser.add_argument("--format", choices=("json", "blocks"), default="json",
+                        help="输出格式：json 为 entity.json / relation.json，blocks 为可随机访问的分块压缩文件")
+    parser.add_argument("--symbol-index", action="store_true",
+                        help="额外输出实体名三元组索引 symbol_index.bin（查询时 mmap 打开，见 symbol_index.py search）")
+    parser.add_argument("--stable-ids", action="store_true",
+                        help="使用由实体键哈希得到的稳定 id（跨运行不变），并输出紧凑整数映射表 id_table.json")
+    parser.add_argument("--compile-commands", type=str, default=None,
+                        help="compile_commands.json 路径：只抽取参与构建的翻译单元及其依赖的头文件")
+    parser.add_argument("--compile-flags", action="store_true",
+                        help="将各翻译单元的编译参数写入 FILE 实体的 compile_flags（需配合 --compile-commands）")
+    parser.add_argument("--includes", action="store_true",
+                        help="抽取 FILE → FILE 的 INCLUDES 关系，并输出反向依赖索引 include_deps.json")
+    parser.add_argument("--include-dir", type=str, action="append", default=[],
+                        help="解析 #include <...> 的搜索目录，可重复指定（配合 --includes）")
+    parser.add_argument("--checkpoint-every", type=int, default=0,
+                        help="每处理 N 个文件（以及每个阶段结束时）在 <output>/checkpoint/ 保存检查点；0 为不保存")
+    parser.add_argument("--resume", action="store_true", help="从 <output>/checkpoint/ 中最近的检查点继续抽取")
+    parser.add_argument("--source-blob", action="store_true",
+                        help="将源文件打包为 sources.bin 并输出实体字节区间索引 sources.idx.json（见 source_blob.py）")
+    parser.add_argument("--rollup", type=int, default=None, metavar="DEPTH",
+                        help="抽取后生成文件 / 目录级聚合图 <output>/rollup/，DEPTH 为目录层级（0 为完整目录，见 graph_rollup.py）")
+    parser.add_argument("--relation-sites", action="store_true",
+                        help="输出 CALLS / ASSIGNED_TO 发生位置的旁表 relation_sites.npy（见 relation_sites.py）")
+    parser.add_argument("--relation-workers", type=int, default=0,
+                        help="阶段 2、3、5 的并行进程数，符号表冻结到共享内存供各进程只读访问（见 parallel_relations.py）；0 / 1 为单进程")
+    parser.add_argument("--level", choices=EXTRACTION_LEVELS, default="full",
+                        help="抽取级别：skeleton 跳过函数体只做声明级扫描，entities 为完整实体加静态关系，full 为全部关系")
+    parser.add_argument("--no-dedup", action="store_true", help="关闭按内容哈希的重复文件去重")
+    parser.add_argument("--watch", action="store_true", help="抽取后持续监听源码目录，增量更新并输出图谱增量")
+    parser.add_argument("--watch-interval", type=float, default=1.0, help="监听模式的轮询间隔（秒）")
     args = parser.parse_args()
+    if args.prefetch < 1:
+        parser.error("--prefetch 至少为 1")
+    if args.group_by_head and args.relation_memory_mb <= 0:
+        parser.error("--group-by-head 需要配合 --relation-memory-mb 使用")
+    if args.compile_flags and not args.compile_commands:
+        parser.error("--compile-flags 需要配合 --compile-commands 使用")
+    if args.relation_memory_mb > 0 and (args.checkpoint_every > 0 or args.resume):
+        parser.error("--checkpoint-every / --resume 暂不支持与 --relation-memory-mb 同时使用")
+    if args.rollup is not None and args.format != "json":
+        parser.error("--rollup 需要 --format json 的输出")
+    if args.relation_sites and (args.format != "json" or args.relation_memory_mb > 0
+                                or args.checkpoint_every > 0 or args.resume):
+        parser.error("--relation-sites 需要 --format json，且不支持 --relation-memory-mb 与检查点")
+    if args.relation_workers > 1 and (args.checkpoint_every > 0 or args.resume):
+        parser.error("--relation-workers 暂不支持与 --checkpoint-every / --resume 同时使用")
+    if args.watch and args.level != "full":
+        parser.error("监听模式需要完整的关系，只支持 --level full")
+    if args.watch and args.stable_ids:
+        parser.error("监听模式沿用顺序 id，不支持 --stable-ids")
+
+    if args.watch:
+        from watch_mode import watch
+        watch(args.source, args.output, args.watch_interval)
+        raise SystemExit(0)
 
     tracemalloc.start()
     start_time = time.time()
-    extract_all(args.source, args.output)
+    extract_all(
+        args.source, args.output, args.io_workers, args.prefetch, not args.no_dedup,
+        args.order, args.max_file_size, args.file_timeout, args.relation_memory_mb, args.group_by_head,
+        args.format, args.symbol_index, args.stable_ids, args.compile_commands, args.compile_flags,
+        args.includes, args.include_dir, args.checkpoint_every, args.resume, args.level, args.source_blob,
+        args.rollup, args.relation_sites, args.relation_workers
+    )
     current, peak = tracemalloc.get_traced_memory()
     end_time = time.time()
     print(f"\n⏱️ 总耗时：{end_time - start_time:.2f} 秒")
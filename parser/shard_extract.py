@@ -0,0 +1,314 @@
+"""
+多机分片抽取：按清单（manifest）把文件列表切成 N 个分片，各分片在不同主机 / 进程上独立运行，最后合并。
+
+分片只能看到自己的文件，跨分片的 CALLS / ASSIGNED_TO / TYPE_OF 需要全局符号表才能按名字解析，因此分两轮：
+    1. entities：各分片独立抽取实体，id 为分片内局部 id（从 1 连续编号）
+    2. merge-entities：按分片顺序把局部 id 平移到全局 id 空间，合并出全局实体表
+    3. relations：各分片基于全局实体表重建的符号表（按名字索引），抽取本分片文件的关系
+    4. merge：按阶段顺序拼接各分片的关系，补上只依赖实体列表的全局关系与阶段 6 间接调用
+
+分片按目录遍历顺序连续切分（按字节数均衡），合并结果与单机 run_extract_all 的输出一致。
+
+用法：
+    python shard_extract.py plan --source ../data --shards 4 --manifest shards/manifest.json
+    python shard_extract.py entities --manifest shards/manifest.json --shard 0 --output shards/0
+    python shard_extract.py merge-entities --manifest shards/manifest.json --output merged/
+    python shard_extract.py relations --manifest shards/manifest.json --shard 0 --merged merged/ --output shards/0
+    python shard_extract.py merge --manifest shards/manifest.json --merged merged/
+本机多进程测试：
+    python shard_extract.py local --source ../data --shards 4 --work shards/ --output merged/
+"""
+import os
+import json
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from run_extract_all import (
+    MACRO_JSON_PATH,
+    id_generator,
+    get_parser,
+    get_c_files,
+    load_macro_lookup_map,
+    extract_file_record,
+    rebind_record,
+    stabilize_record,
+    records_from_entities,
+    merge_file_records,
+    extract_file_semantic_relations,
+    write_graph,
+    print_summary,
+)
+from source_reader import read_source_bytes
+from stable_ids import is_stable_id, check_unique, write_id_table
+from extract_relation_calls import extract_calls_relations
+from extract_relation_assignedto import extract_assigned_to_relations
+from extract_relation_contains import build_file_level_contains
+from extract_relation_has_members import extract_has_member_relations
+from extract_relation_has_parameters import extract_has_parameter_relations
+from extract_relation_has_variables import extract_has_variable_relations
+from extract_relation_indirect_calls import extract_indirect_calls_relations
+
+# 分片关系文件中的阶段，合并时按此顺序拼接（与 extract_relations 的输出顺序一致）
+SHARD_STAGES = ("calls", "assigned_to", "contains", "semantic")
+
+
+def load_json(path):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def dump_json(path, data, indent=None):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=indent)
+
+
+# === 1. 分片清单 ===
+
+def plan_shards(source_dir, shard_count, macro_json_path=MACRO_JSON_PATH, stable_ids=False):
+    """按遍历顺序连续切分，使各分片字节数尽量接近；stable_ids 为 True 时各分片直接分配稳定 id"""
+    files = list(get_c_files(source_dir))
+    sizes = [os.path.getsize(p) for p in files]
+    total = sum(sizes)
+
+    shards = [[] for _ in range(max(shard_count, 1))]
+    acc = 0
+    for path, size in zip(files, sizes):
+        # 以文件中点所在的字节位置决定归属分片
+        index = min(int((acc + size / 2) * len(shards) / total) if total else 0, len(shards) - 1)
+        shards[index].append(path)
+        acc += size
+
+    return {
+        "source": source_dir,
+        "macro_json": macro_json_path,
+        "stable_ids": stable_ids,
+        "shards": [
+            {"index": i, "files": shard, "bytes": sum(os.path.getsize(p) for p in shard)}
+            for i, shard in enumerate(shards)
+        ],
+    }
+
+
+def load_macro_map(manifest):
+    path = manifest.get("macro_json")
+    return load_macro_lookup_map(path) if path and os.path.exists(path) else {}
+
+
+# === 2. 分片实体 ===
+
+def extract_shard_entities(manifest, shard_index, output_dir):
+    parser = get_parser()
+    id_counter = id_generator()
+    records = []
+    for source_path in manifest["shards"][shard_index]["files"]:
+        code_bytes = read_source_bytes(source_path)
+        root = parser.parse(code_bytes).root_node
+        record = extract_file_record(source_path, root, code_bytes, id_counter)
+        records.append(stabilize_record(record) if manifest.get("stable_ids") else record)
+
+    entities, _ = merge_file_records(records)
+    dump_json(os.path.join(output_dir, 'entity.json'), entities)
+    return len(entities)
+
+
+# === 3. 合并实体，局部 id -> 全局 id ===
+
+def merge_shard_entities(shard_dirs, output_dir):
+    """各分片的局部 id 按分片顺序平移；返回各分片的 id 偏移量（稳定 id 无需平移，偏移量均为 0）"""
+    records = []
+    offsets = []
+    offset = 0
+    for shard_dir in shard_dirs:
+        shard_entities = load_json(os.path.join(shard_dir, 'entity.json'))
+        shard_records = records_from_entities(shard_entities)
+        if shard_entities and is_stable_id(shard_entities[0]["id"]):
+            offsets.append(0)
+            records += shard_records
+            continue
+        offsets.append(offset)
+        id_map = {e["id"]: str(int(e["id"]) + offset) for e in shard_entities}
+        records += [rebind_record(r, id_map) for r in shard_records]
+        offset += len(shard_entities)
+
+    entities, _ = merge_file_records(records)
+    if entities and is_stable_id(entities[0]["id"]):
+        check_unique(entities)
+    os.makedirs(output_dir, exist_ok=True)
+    write_graph(output_dir, entities, [])
+    dump_json(os.path.join(output_dir, 'shard_offsets.json'), offsets)
+    return offsets
+
+
+def load_global_symbols(merged_dir):
+    entities = load_json(os.path.join(merged_dir, 'entity.json'))
+    records = records_from_entities(entities)
+    all_entities, symbols = merge_file_records(records)
+    return all_entities, symbols, {r["source_path"]: r for r in records}
+
+
+# === 4. 分片关系 ===
+
+def extract_shard_relations(manifest, shard_index, merged_dir, output_dir):
+    """基于全局符号表抽取本分片文件的逐文件关系，按阶段分组写出"""
+    _, symbols, records_by_path = load_global_symbols(merged_dir)
+    macro_lookup_map = load_macro_map(manifest)
+    parser = get_parser()
+
+    function_id_map = symbols["function_id_map"]
+    field_id_map = symbols["field_id_map"]
+    field_index = symbols["field_index"]
+    var_param_id_map = {**symbols["variable_id_map"], **symbols["param_id_map"]}
+    var_entities = symbols["variable_entities"] + symbols["param_entities"]
+
+    stages = {stage: [] for stage in SHARD_STAGES}
+    for source_path in manifest["shards"][shard_index]["files"]:
+        code_bytes = read_source_bytes(source_path)
+        root = parser.parse(code_bytes).root_node
+        abs_path = os.path.abspath(source_path)
+        record = records_by_path[source_path]
+
+        stages["calls"] += extract_calls_relations(
+            root, code_bytes, function_id_map, var_param_id_map, field_id_map, macro_lookup_map, abs_path,
+            field_index
+        )
+        stages["assigned_to"] += extract_assigned_to_relations(
+            root, code_bytes, function_id_map, var_param_id_map, field_id_map, macro_lookup_map, abs_path,
+            field_index
+        )
+        stages["contains"] += build_file_level_contains(
+            record["file_id"], record["function_map"], record["struct_map"], record["scope_map"]
+        )
+        stages["semantic"] += extract_file_semantic_relations(
+            root, code_bytes, function_id_map, var_param_id_map, field_id_map,
+            var_entities, symbols["field_entities"], symbols["struct_id_map"]
+        )
+
+    dump_json(os.path.join(output_dir, 'relation_stages.json'), stages)
+    return sum(len(rels) for rels in stages.values())
+
+
+# === 5. 合并关系 ===
+
+def merge_shard_relations(shard_dirs, merged_dir):
+    """拼接顺序与 extract_relations 一致：CALLS、ASSIGNED_TO、CONTAINS、全局实体关系、RETURNS / TYPE_OF、阶段 6"""
+    all_entities, symbols, _ = load_global_symbols(merged_dir)
+    shard_stages = [load_json(os.path.join(d, 'relation_stages.json')) for d in shard_dirs]
+
+    def stage(name):
+        return [rel for stages in shard_stages for rel in stages[name]]
+
+    relations = stage("calls") + stage("assigned_to") + stage("contains")
+    relations += extract_has_member_relations(symbols["field_entities"], symbols["struct_id_map"])
+    relations += extract_has_parameter_relations(symbols["param_entities"], symbols["function_id_map"])
+    relations += extract_has_variable_relations(symbols["variable_entities"], symbols["function_id_map"])
+    relations += stage("semantic")
+    relations += extract_indirect_calls_relations(all_entities, relations)
+
+    write_graph(merged_dir, all_entities, relations)
+    if all_entities and is_stable_id(all_entities[0]["id"]):
+        write_id_table(merged_dir, all_entities)
+    print_summary(all_entities, relations)
+    return relations
+
+
+# === 本机多进程驱动 ===
+
+def _run_phase(args):
+    """以子进程运行一个分片阶段，模拟在不同主机上独立执行"""
+    cmd = [sys.executable, os.path.abspath(__file__), *args]
+    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+
+
+def run_local(
+    source_dir, shard_count, work_dir, output_dir, macro_json_path=MACRO_JSON_PATH, workers=None, stable_ids=False
+):
+    manifest = plan_shards(source_dir, shard_count, macro_json_path, stable_ids)
+    manifest_path = os.path.join(work_dir, 'manifest.json')
+    dump_json(manifest_path, manifest, indent=2)
+    shard_dirs = [os.path.join(work_dir, str(i)) for i in range(len(manifest["shards"]))]
+
+    # 每个分片阶段都在独立子进程中运行，线程池只负责等待
+    with ThreadPoolExecutor(max_workers=workers or len(shard_dirs)) as pool:
+        list(pool.map(_run_phase, [
+            ["entities", "--manifest", manifest_path, "--shard", str(i), "--output", d]
+            for i, d in enumerate(shard_dirs)
+        ]))
+        merge_shard_entities(shard_dirs, output_dir)
+        list(pool.map(_run_phase, [
+            ["relations", "--manifest", manifest_path, "--shard", str(i), "--merged", output_dir, "--output", d]
+            for i, d in enumerate(shard_dirs)
+        ]))
+    merge_shard_relations(shard_dirs, output_dir)
+
+
+def default_shard_dirs(manifest_path, manifest):
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    return [os.path.join(base, str(s["index"])) for s in manifest["shards"]]
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="mode", required=True)
+
+    p = sub.add_parser("plan", help="生成分片清单")
+    p.add_argument("--source", type=str, required=True, help="C 源码目录")
+    p.add_argument("--shards", type=int, required=True, help="分片数")
+    p.add_argument("--manifest", type=str, required=True, help="清单输出路径")
+    p.add_argument("--macro-json", type=str, default=MACRO_JSON_PATH, help="宏展开信息 macro.json 路径")
+    p.add_argument("--stable-ids", action="store_true", help="各分片直接分配稳定 id，合并时无需平移")
+
+    p = sub.add_parser("entities", help="抽取单个分片的实体（局部 id）")
+    p.add_argument("--manifest", type=str, required=True)
+    p.add_argument("--shard", type=int, required=True)
+    p.add_argument("--output", type=str, required=True, help="分片输出目录")
+
+    p = sub.add_parser("merge-entities", help="合并各分片实体并映射到全局 id")
+    p.add_argument("--manifest", type=str, required=True)
+    p.add_argument("--output", type=str, required=True, help="合并输出目录")
+    p.add_argument("--shard-dirs", type=str, nargs="*", help="各分片输出目录（默认为清单所在目录下的 <分片号>/）")
+
+    p = sub.add_parser("relations", help="基于全局实体表抽取单个分片的关系")
+    p.add_argument("--manifest", type=str, required=True)
+    p.add_argument("--shard", type=int, required=True)
+    p.add_argument("--merged", type=str, required=True, help="merge-entities 的输出目录")
+    p.add_argument("--output", type=str, required=True, help="分片输出目录")
+
+    p = sub.add_parser("merge", help="合并各分片关系，写出最终图谱")
+    p.add_argument("--manifest", type=str, required=True)
+    p.add_argument("--merged", type=str, required=True, help="merge-entities 的输出目录，最终图谱也写到这里")
+    p.add_argument("--shard-dirs", type=str, nargs="*")
+
+    p = sub.add_parser("local", help="本机多进程跑完整个分片流程")
+    p.add_argument("--source", type=str, required=True)
+    p.add_argument("--shards", type=int, required=True)
+    p.add_argument("--work", type=str, required=True, help="清单与分片中间结果目录")
+    p.add_argument("--output", type=str, required=True, help="最终图谱目录")
+    p.add_argument("--macro-json", type=str, default=MACRO_JSON_PATH)
+    p.add_argument("--workers", type=int, default=None, help="并行进程数（默认等于分片数）")
+    p.add_argument("--stable-ids", action="store_true", help="各分片直接分配稳定 id，合并时无需平移")
+
+    args = parser.parse_args()
+
+    if args.mode == "plan":
+        manifest = plan_shards(args.source, args.shards, args.macro_json, args.stable_ids)
+        dump_json(args.manifest, manifest, indent=2)
+        for shard in manifest["shards"]:
+            print(f"📦 分片 {shard['index']}：文件 {len(shard['files'])} 个，{shard['bytes'] / 1024:.1f} KB")
+    elif args.mode == "entities":
+        count = extract_shard_entities(load_json(args.manifest), args.shard, args.output)
+        print(f"✅ 分片 {args.shard}：实体 {count} 个")
+    elif args.mode == "merge-entities":
+        manifest = load_json(args.manifest)
+        shard_dirs = args.shard_dirs or default_shard_dirs(args.manifest, manifest)
+        print(f"✅ 实体合并完成，各分片 id 偏移：{merge_shard_entities(shard_dirs, args.output)}")
+    elif args.mode == "relations":
+        count = extract_shard_relations(load_json(args.manifest), args.shard, args.merged, args.output)
+        print(f"✅ 分片 {args.shard}：关系 {count} 条")
+    elif args.mode == "merge":
+        manifest = load_json(args.manifest)
+        merge_shard_relations(args.shard_dirs or default_shard_dirs(args.manifest, manifest), args.merged)
+    else:
+        run_local(args.source, args.shards, args.work, args.output, args.macro_json, args.workers, args.stable_ids)
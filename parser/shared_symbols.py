@@ -0,0 +1,214 @@
+"""
+阶段 1 之后冻结的只读符号表，放在 multiprocessing.shared_memory 中供关系抽取的工作进程零拷贝共享，
+避免把数百 MB 的 dict 逐个 pickle 到每个进程（N 倍内存、序列化开销抵消并行收益）。
+
+每张表是一块共享内存上的开放寻址哈希表：
+    slots    int64[capacity]      槽位 -> 条目下标，空槽为 -1（capacity 为 2 的幂，装载因子不超过 1/2）
+    entries  int64[count, 5]      (crc32 哈希, 键偏移, 键长度, 值偏移, 值长度)
+    blob     所有键、值的字节串依次拼接（字符串只存一份 UTF-8 编码）
+键为字符串或字符串元组（以 \\x1f 连接）；值按表的 value_kind 编码：
+    str    字符串（实体 id）
+    strs   字符串列表（如 field_id_map 的字段 id 列表）
+    pickle 其它任意值（如宏展开信息），按需反序列化
+
+主进程 freeze_map 建表后把 descriptor（小 dict）传给工作进程，工作进程 attach_map 映射同一块内存。
+SharedMap 支持 get / [] / in / len，可直接替代各抽取器中的 dict。
+"""
+import zlib
+import array
+import pickle
+from multiprocessing import shared_memory
+
+KEY_SEPARATOR = "\x1f"
+_ENTRY_FIELDS = 5
+
+
+def encode_key(key):
+    if isinstance(key, tuple):
+        return KEY_SEPARATOR.join(key).encode("utf-8", errors="surrogatepass")
+    return key.encode("utf-8", errors="surrogatepass")
+
+
+def encode_value(value, value_kind):
+    if value_kind == "str":
+        return value.encode("utf-8", errors="surrogatepass")
+    if value_kind == "strs":
+        return KEY_SEPARATOR.join(value).encode("utf-8", errors="surrogatepass")
+    return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def decode_value(data, value_kind):
+    if value_kind == "str":
+        return data.decode("utf-8", errors="surrogatepass")
+    if value_kind == "strs":
+        text = data.decode("utf-8", errors="surrogatepass")
+        return text.split(KEY_SEPARATOR) if text else []
+    return pickle.loads(data)
+
+
+def infer_value_kind(mapping):
+    values = list(mapping.values())
+    if all(isinstance(v, str) for v in values):
+        return "str"
+    if all(isinstance(v, list) and all(isinstance(x, str) for x in v) for v in values):
+        return "strs"
+    return "pickle"
+
+
+class SharedMap:
+    """共享内存上的只读映射；owner 为 True 的实例（freeze_map 的结果）负责 unlink"""
+
+    def __init__(self, descriptor, shm, owner=False):
+        self.descriptor = descriptor
+        self.shm = shm
+        self.owner = owner
+        self.value_kind = descriptor["value_kind"]
+        self.tuple_keys = descriptor["tuple_keys"]
+        self.count = descriptor["count"]
+        self.mask = descriptor["capacity"] - 1
+
+        buf = shm.buf
+        slots_end = descriptor["capacity"] * 8
+        entries_end = slots_end + self.count * _ENTRY_FIELDS * 8
+        self.slots = buf[:slots_end].cast("q")
+        self.entries = buf[slots_end:entries_end].cast("q")
+        self.blob = buf[entries_end:descriptor["size"]]
+
+    def _find(self, key):
+        """返回条目下标，不存在返回 -1"""
+        if self.tuple_keys != isinstance(key, tuple):
+            return -1
+        try:
+            data = encode_key(key)
+        except (AttributeError, TypeError):  # 元组中含非字符串，表中不可能存在
+            return -1
+        h = zlib.crc32(data)
+        i = h & self.mask
+        slots, entries, blob = self.slots, self.entries, self.blob
+        while True:
+            e = slots[i]
+            if e < 0:
+                return -1
+            base = e * _ENTRY_FIELDS
+            if entries[base] == h and entries[base + 2] == len(data):
+                offset = entries[base + 1]
+                if blob[offset:offset + len(data)] == data:
+                    return e
+            i = (i + 1) & self.mask
+
+    def get(self, key, default=None):
+        e = self._find(key)
+        if e < 0:
+            return default
+        base = e * _ENTRY_FIELDS
+        offset, length = self.entries[base + 3], self.entries[base + 4]
+        return decode_value(bytes(self.blob[offset:offset + length]), self.value_kind)
+
+    def __getitem__(self, key):
+        e = self._find(key)
+        if e < 0:
+            raise KeyError(key)
+        base = e * _ENTRY_FIELDS
+        offset, length = self.entries[base + 3], self.entries[base + 4]
+        return decode_value(bytes(self.blob[offset:offset + length]), self.value_kind)
+
+    def __contains__(self, key):
+        return self._find(key) >= 0
+
+    def __len__(self):
+        return self.count
+
+    def __bool__(self):
+        return self.count > 0
+
+    def close(self):
+        for view in (self.slots, self.entries, self.blob):
+            view.release()
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def freeze_map(mapping, value_kind=None):
+    """把 dict 冻结到一块新的共享内存中，返回 SharedMap（调用方用完后 close，会一并 unlink）"""
+    value_kind = value_kind or infer_value_kind(mapping)
+    keys = list(mapping.keys())
+    tuple_keys = bool(keys) and isinstance(keys[0], tuple)
+    if any(isinstance(k, tuple) != tuple_keys for k in keys):
+        raise TypeError("共享符号表的键须同为字符串或同为字符串元组")
+
+    capacity = 1
+    while capacity < 2 * len(keys):
+        capacity *= 2
+
+    chunks = []
+    entries = []
+    offset = 0
+    for key in keys:
+        key_bytes = encode_key(key)
+        value_bytes = encode_value(mapping[key], value_kind)
+        entries.append((zlib.crc32(key_bytes), offset, len(key_bytes), offset + len(key_bytes), len(value_bytes)))
+        chunks += (key_bytes, value_bytes)
+        offset += len(key_bytes) + len(value_bytes)
+    blob = b"".join(chunks)
+    del chunks
+
+    slots_size = capacity * 8
+    entries_size = len(entries) * _ENTRY_FIELDS * 8
+    size = slots_size + entries_size + len(blob)
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    descriptor = {
+        "name": shm.name,
+        "size": size,
+        "capacity": capacity,
+        "count": len(entries),
+        "value_kind": value_kind,
+        "tuple_keys": tuple_keys,
+    }
+
+    buf = shm.buf
+    buf[:slots_size] = b"\xff" * slots_size  # 全 1 字节即 int64 的 -1
+    slots = buf[:slots_size].cast("q")
+    mask = capacity - 1
+    for e, entry in enumerate(entries):
+        i = entry[0] & mask
+        while slots[i] >= 0:
+            i = (i + 1) & mask
+        slots[i] = e
+    slots.release()
+
+    flat = array.array("q", (field for entry in entries for field in entry))
+    buf[slots_size:slots_size + entries_size] = flat.tobytes()
+    buf[slots_size + entries_size:size] = blob
+    return SharedMap(descriptor, shm, owner=True)
+
+
+def attach_map(descriptor):
+    """工作进程中按 descriptor 映射已冻结的表（不复制数据）"""
+    return SharedMap(descriptor, shared_memory.SharedMemory(name=descriptor["name"]))
+
+
+def freeze_tables(tables):
+    """{名称: dict} -> {名称: SharedMap}；值为 None 的表原样保留。中途失败时释放已创建的表"""
+    shared = {}
+    try:
+        for name, table in tables.items():
+            shared[name] = None if table is None else freeze_map(table)
+    except BaseException:
+        close_tables(shared)
+        raise
+    return shared
+
+
+def table_descriptors(shared):
+    return {name: None if table is None else table.descriptor for name, table in shared.items()}
+
+
+def attach_tables(descriptors):
+    return {name: None if d is None else attach_map(d) for name, d in descriptors.items()}
+
+
+def close_tables(shared):
+    for table in shared.values():
+        if table is not None:
+            table.close()
@@ -0,0 +1,142 @@
+"""
+实体源码片段的按需读取：抽取时把源文件打包为单个二进制文件 sources.bin（内容相同的文件只存一份），
+另写索引 sources.idx.json：
+    {"files": {源文件路径: [偏移, 长度]}, "spans": {实体 id: [起始, 结束]}}
+spans 为实体在 sources.bin 中的绝对字节区间：实体的 start_byte / end_byte 加上所在文件的偏移，FILE 实体为整个文件。
+
+读取时以 mmap 打开 sources.bin，get_source 返回 memoryview 切片（零拷贝），每个片段 O(1)，
+无需重新打开源文件再按行切分。
+
+用法：
+    python run_extract_all.py --source glibc/ --output out/ --source-blob      抽取时一并打包
+    python source_blob.py pack --graph out/                                    按图谱中的文件路径重新读取源文件打包
+    python source_blob.py get --graph out/ --id 123                            输出实体源码
+"""
+import os
+import mmap
+import json
+import hashlib
+
+from json_stream import iter_json_array
+
+
+def blob_paths(output_dir):
+    return os.path.join(output_dir, 'sources.bin'), os.path.join(output_dir, 'sources.idx.json')
+
+
+def write_source_blob(output_dir, sources, entities):
+    """
+    sources: 可迭代的 (source_path, code_bytes)，路径写法与实体的 source_file 一致
+    entities: 实体列表（带 start_byte / end_byte 的实体才有片段）
+    返回 (文件数, sources.bin 字节数)
+    """
+    blob_path, idx_path = blob_paths(output_dir)
+    files = {}
+    offsets_by_digest = {}
+    offset = 0
+    with open(blob_path, 'wb') as f:
+        for source_path, code_bytes in sources:
+            digest = hashlib.blake2b(code_bytes, digest_size=16).digest()
+            if digest not in offsets_by_digest:
+                offsets_by_digest[digest] = offset
+                f.write(code_bytes)
+                offset += len(code_bytes)
+            files[source_path] = [offsets_by_digest[digest], len(code_bytes)]
+
+    spans = {}
+    for e in entities:
+        if e["type"] == "FILE":
+            if e["name"] in files:
+                start, length = files[e["name"]]
+                spans[e["id"]] = [start, start + length]
+        elif "start_byte" in e and e.get("source_file") in files:
+            start = files[e["source_file"]][0]
+            spans[e["id"]] = [start + e["start_byte"], start + e["end_byte"]]
+
+    with open(idx_path, 'w') as f:
+        json.dump({"files": files, "spans": spans}, f)
+    return len(files), offset
+
+
+def pack_graph(graph_dir):
+    """由已有图谱打包：按 FILE 实体的路径重新读取源文件（相对路径以当前目录为准）"""
+    entities = list(iter_json_array(os.path.join(graph_dir, 'entity.json')))
+    paths = [e["name"] for e in entities if e["type"] == "FILE"]
+
+    def sources():
+        for source_path in paths:
+            with open(source_path, 'rb') as f:
+                yield source_path, f.read()
+
+    return write_source_blob(graph_dir, sources(), entities)
+
+
+def open_source_blob(output_dir):
+    """返回读取句柄（dict）；用完调用 close_source_blob"""
+    blob_path, idx_path = blob_paths(output_dir)
+    with open(idx_path, 'r') as f:
+        index = json.load(f)
+    f = open(blob_path, 'rb')
+    size = os.fstat(f.fileno()).st_size
+    # 空文件无法 mmap
+    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+    return {
+        "file": f,
+        "data": data,
+        "view": memoryview(data),
+        "files": index["files"],
+        "spans": index["spans"],
+    }
+
+
+def get_source(blob, entity_id):
+    """实体源码的 memoryview（bytes(...) / .tobytes().decode() 取出），无片段时返回 None"""
+    span = blob["spans"].get(str(entity_id))
+    if span is None:
+        return None
+    return blob["view"][span[0]:span[1]]
+
+
+def get_file_source(blob, source_path):
+    entry = blob["files"].get(source_path)
+    if entry is None:
+        return None
+    return blob["view"][entry[0]:entry[0] + entry[1]]
+
+
+def close_source_blob(blob):
+    """仍有未释放的片段时 mmap 无法立即关闭，待最后一个片段被回收后自动释放"""
+    blob["view"].release()
+    if isinstance(blob["data"], mmap.mmap):
+        try:
+            blob["data"].close()
+        except BufferError:
+            pass
+    blob["file"].close()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="mode", required=True)
+
+    p_pack = sub.add_parser("pack", help="按图谱中的文件路径读取源文件，生成 sources.bin / sources.idx.json")
+    p_pack.add_argument("--graph", type=str, required=True, help="图谱目录（entity.json 需带 start_byte / end_byte）")
+
+    p_get = sub.add_parser("get", help="输出实体的源码片段")
+    p_get.add_argument("--graph", type=str, required=True, help="包含 sources.bin 的图谱目录")
+    p_get.add_argument("--id", type=str, required=True, help="实体 id")
+    args = parser.parse_args()
+
+    if args.mode == "pack":
+        file_count, size = pack_graph(args.graph)
+        print(f"📦 已打包源文件 {file_count} 个，共 {size / 1024 / 1024:.2f} MB")
+    else:
+        blob = open_source_blob(args.graph)
+        snippet = get_source(blob, args.id)
+        if snippet is None:
+            print(f"❌ 实体 {args.id} 没有源码片段")
+        else:
+            print(snippet.tobytes().decode('utf-8', errors='replace'))
+        snippet = None
+        close_source_blob(blob)
@@ -0,0 +1,64 @@
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+_WALK_DONE = object()
+
+
+def read_source_bytes(source_path):
+    with open(source_path, 'rb') as f:
+        return f.read()
+
+
+def prefetch_sources(paths, io_workers=8, prefetch=64):
+    """
+    流水线读取源文件：与主循环的 parser.parse 重叠 I/O。
+    - paths：路径可迭代对象（如 get_c_files 生成器），在后台线程中遍历，目录遍历与解析并行
+    - io_workers：读文件的线程数；<= 0 时退化为顺序读取
+    - prefetch：预取窗口（有界），限制驻留在内存中尚未解析的文件数；小于 1 时按 1 处理
+    按 paths 的原始顺序产出 (source_path, code_bytes)，保证 ID 分配与顺序读取一致
+    """
+    if io_workers <= 0:
+        for source_path in paths:
+            yield source_path, read_source_bytes(source_path)
+        return
+
+    # 窗口为 0 时填充循环不会执行、遍历结束标记永远取不到，且 Queue(maxsize=0) 无界
+    prefetch = max(prefetch, 1)
+    path_queue = queue.Queue(maxsize=prefetch)
+    walk_error = []
+
+    def walk():
+        try:
+            for source_path in paths:
+                path_queue.put(source_path)
+        except Exception as e:  # 遍历异常交给主线程抛出
+            walk_error.append(e)
+        finally:
+            path_queue.put(_WALK_DONE)
+
+    threading.Thread(target=walk, daemon=True).start()
+
+    with ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="prefetch") as pool:
+        pending = deque()
+        walking = True
+        while walking or pending:
+            # 填满预取窗口
+            while walking and len(pending) < prefetch:
+                try:
+                    # 窗口为空时阻塞等待遍历线程，否则只取已就绪的路径
+                    source_path = path_queue.get(block=not pending)
+                except queue.Empty:
+                    break
+                if source_path is _WALK_DONE:
+                    walking = False
+                    break
+                pending.append((source_path, pool.submit(read_source_bytes, source_path)))
+
+            if pending:
+                source_path, future = pending.popleft()
+                yield source_path, future.result()
+
+    if walk_error:
+        raise walk_error[0]
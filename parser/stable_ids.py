@@ -0,0 +1,94 @@
+"""
+与运行无关的稳定实体 id：由实体键 (type, name, scope, role, source_file, 序号) 哈希得到，
+其中序号区分同一文件内同名同作用域的实体（见 graph_delta.entity_keys）。
+
+同一实体在每次运行、每个分片 / 工作进程上得到相同的 id，只依赖其所在文件的内容，
+因此各文件可独立分配 id（无需全局计数器），跨运行的缓存与图谱比较可直接按 id 进行。
+
+稳定 id 为 16 位十六进制字符串；另输出紧凑整数映射表 id_table.json：
+    {"ids": [稳定 id, ...]}     下标即该实体在本次输出中的紧凑整数编号（与 entity.json 顺序一致）
+
+用法（转换已有图谱）：
+    python stable_ids.py --graph output/
+"""
+import os
+import json
+import hashlib
+
+from graph_delta import entity_keys
+
+STABLE_ID_BYTES = 8
+
+
+def stable_id(key):
+    text = "\x1f".join("" if part is None else str(part) for part in key)
+    return hashlib.blake2b(text.encode("utf-8", errors="surrogateescape"), digest_size=STABLE_ID_BYTES).hexdigest()
+
+
+def is_stable_id(entity_id):
+    """顺序 id 为十进制数字串，长度远小于稳定 id（稳定 id 偶尔也可能全为数字）"""
+    return isinstance(entity_id, str) and len(entity_id) == 2 * STABLE_ID_BYTES
+
+
+def stable_id_map(entities):
+    """实体列表（旧 id）-> 稳定 id 的映射；实体键含 source_file，逐文件计算与全局计算结果相同"""
+    return {e["id"]: stable_id(key) for e, key in zip(entities, entity_keys(entities))}
+
+
+def check_unique(entities):
+    """哈希碰撞检查：不同实体得到相同 id 时报错"""
+    seen = set()
+    for e in entities:
+        if e["id"] in seen:
+            raise ValueError(f"稳定 id 冲突：{e['id']}（{e['type']} {e['name']}）")
+        seen.add(e["id"])
+
+
+def remap_relations(relations, id_map):
+    def remap(value):
+        if isinstance(value, list):
+            return [id_map.get(v, v) for v in value]
+        return id_map.get(value, value)
+
+    return [{**rel, "head": remap(rel["head"]), "tail": remap(rel["tail"])} for rel in relations]
+
+
+def write_id_table(output_dir, all_entities):
+    table_path = os.path.join(output_dir, 'id_table.json')
+    with open(table_path, 'w') as f:
+        json.dump({"ids": [e["id"] for e in all_entities]}, f)
+    return table_path
+
+
+def load_id_table(graph_dir):
+    """稳定 id -> 紧凑整数编号"""
+    with open(os.path.join(graph_dir, 'id_table.json'), 'r') as f:
+        return {entity_id: i for i, entity_id in enumerate(json.load(f)["ids"])}
+
+
+def convert_graph(graph_dir):
+    """将已有图谱（顺序 id）改写为稳定 id，并写出 id_table.json"""
+    with open(os.path.join(graph_dir, 'entity.json'), 'r') as f:
+        entities = json.load(f)
+    with open(os.path.join(graph_dir, 'relation.json'), 'r') as f:
+        relations = json.load(f)
+
+    id_map = stable_id_map(entities)
+    entities = [{**e, "id": id_map[e["id"]]} for e in entities]
+    check_unique(entities)
+    relations = remap_relations(relations, id_map)
+
+    with open(os.path.join(graph_dir, 'entity.json'), 'w') as f:
+        json.dump(entities, f, indent=2)
+    with open(os.path.join(graph_dir, 'relation.json'), 'w') as f:
+        json.dump(relations, f, indent=2)
+    write_id_table(graph_dir, entities)
+    return len(entities)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--graph", type=str, required=True, help="图谱目录（entity.json / relation.json 将被原地改写）")
+    args = parser.parse_args()
+    print(f"🔑 已改写为稳定 id：实体 {convert_graph(args.graph)} 个")
@@ -0,0 +1,282 @@
+"""
+实体名三元组（trigram）索引：对 FUNCTION / VARIABLE / STRUCT / FIELD 名称建立倒排表，
+支持子串（ops）与通配符（*_alloc*、get_?）查询，结果按匹配程度排序。
+
+索引为列式存储：
+    ids / names / types / scopes / files   每个符号一列，files 为 file_table 下标
+    trigrams                               小写三元组 -> 有序符号下标列表
+
+写出为单个二进制文件 symbol_index.bin，查询时以 mmap 打开、不整体读入：
+    文件头    魔数、头部长度与 JSON 头部（各段的 dtype、偏移、元素数）
+    字符串列  UTF-8 字节串拼接（*_blob）加 int64 偏移（*_offsets），按下标切片解码；scopes 中的 None 记为 "\0"
+    三元组    有序的三元组数组（grams）、各自倒排表在 postings 中的区间（gram_offsets）
+单次查询只触及命中三元组的倒排表与候选符号所在的页，命令行查询无需先解析整个索引。
+
+用法：
+    python symbol_index.py build --graph output/
+    python symbol_index.py search --graph output/ --query '*_alloc*' --type FUNCTION --limit 20
+"""
+import os
+import re
+import json
+import mmap
+import fnmatch
+import heapq
+
+import numpy as np
+
+INDEXED_TYPES = ("FUNCTION", "VARIABLE", "STRUCT", "FIELD")
+INDEX_FILE = 'symbol_index.bin'
+INDEX_MAGIC = b"SYMIDX01"
+_NONE = "\0"
+STRING_COLUMNS = ("ids", "names", "types", "scopes", "file_table")
+# 同等匹配程度下的类型优先级
+TYPE_RANK = {"FUNCTION": 0, "STRUCT": 1, "FIELD": 2, "VARIABLE": 3}
+
+
+def name_trigrams(text):
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def build_symbol_index(entities):
+    index = {
+        "ids": [],
+        "names": [],
+        "types": [],
+        "scopes": [],
+        "files": [],
+        "file_table": [],
+        "trigrams": {},
+    }
+    file_pos = {}
+    trigrams = index["trigrams"]
+
+    for e in entities:
+        if e["type"] not in INDEXED_TYPES:
+            continue
+        pos = len(index["ids"])
+        source_file = e.get("source_file")
+        if source_file not in file_pos:
+            file_pos[source_file] = len(index["file_table"])
+            index["file_table"].append(source_file)
+
+        index["ids"].append(e["id"])
+        index["names"].append(e["name"])
+        index["types"].append(e["type"])
+        index["scopes"].append(e.get("scope"))
+        index["files"].append(file_pos[source_file])
+        for gram in name_trigrams(e["name"]):
+            trigrams.setdefault(gram, []).append(pos)
+
+    return index
+
+
+class StringColumn:
+    """mmap 上的字符串列：按下标切片解码，支持 [] 与 len"""
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, pos):
+        text = bytes(self.blob[self.offsets[pos]:self.offsets[pos + 1]]).decode("utf-8")
+        return None if text == _NONE else text
+
+
+class TrigramTable:
+    """有序三元组数组上的倒排表查找，接口与 dict.get 一致，返回 postings 的切片（不复制）"""
+
+    def __init__(self, grams, offsets, postings):
+        self.grams = grams
+        self.offsets = offsets
+        self.postings = postings
+
+    def get(self, gram, default=None):
+        i = int(np.searchsorted(self.grams, gram))
+        if i >= len(self.grams) or self.grams[i] != gram:
+            return default
+        return self.postings[self.offsets[i]:self.offsets[i + 1]]
+
+
+def encode_strings(values):
+    data = [(_NONE if v is None else v).encode("utf-8") for v in values]
+    offsets = np.zeros(len(data) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(d) for d in data])
+    return np.frombuffer(b"".join(data), dtype=np.uint8), offsets
+
+
+def index_sections(index):
+    """内存中的索引（build_symbol_index 的结果）-> {段名: NumPy 数组}"""
+    sections = {}
+    for name in STRING_COLUMNS:
+        sections[f"{name}_blob"], sections[f"{name}_offsets"] = encode_strings(index[name])
+    sections["files"] = np.array(index["files"], dtype=np.int32)
+
+    grams = sorted(index["trigrams"])
+    lengths = [len(index["trigrams"][g]) for g in grams]
+    sections["grams"] = np.array(grams, dtype="U3")
+    sections["gram_offsets"] = np.zeros(len(grams) + 1, dtype=np.int64)
+    sections["gram_offsets"][1:] = np.cumsum(lengths, dtype=np.int64)
+    sections["postings"] = np.fromiter(
+        (pos for g in grams for pos in index["trigrams"][g]), dtype=np.int32, count=sum(lengths)
+    )
+    return sections
+
+
+def write_symbol_index(output_dir, entities):
+    index_path = os.path.join(output_dir, INDEX_FILE)
+    sections = index_sections(build_symbol_index(entities))
+
+    # 各段按 8 字节对齐依次排列，偏移相对于数据区起点
+    header = {}
+    offset = 0
+    for name, array in sections.items():
+        header[name] = [array.dtype.str, offset, len(array)]
+        offset += -(-array.nbytes // 8) * 8
+    header_bytes = json.dumps(header).encode("utf-8")
+    header_bytes += b" " * (-len(header_bytes) % 8)
+
+    with open(index_path, 'wb') as f:
+        f.write(INDEX_MAGIC)
+        f.write(len(header_bytes).to_bytes(8, "little"))
+        f.write(header_bytes)
+        for array in sections.values():
+            data = array.tobytes()
+            f.write(data)
+            f.write(b"\0" * (-len(data) % 8))
+    return index_path
+
+
+def load_symbol_index(graph_dir):
+    """以 mmap 打开 symbol_index.bin，返回与 build_symbol_index 结构相同、按需读取的索引"""
+    index_path = os.path.join(graph_dir, INDEX_FILE)
+    if not os.path.exists(index_path):
+        raise FileNotFoundError(
+            f"{index_path} 不存在，请先运行 python symbol_index.py build --graph {graph_dir} 生成符号索引"
+        )
+
+    with open(index_path, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if data[:len(INDEX_MAGIC)] != INDEX_MAGIC:
+        raise ValueError(f"{index_path} 不是符号索引文件")
+    header_size = int.from_bytes(data[8:16], "little")
+    header = json.loads(data[16:16 + header_size])
+    base = 16 + header_size
+    sections = {
+        name: np.frombuffer(data, dtype=np.dtype(dtype), count=count, offset=base + offset)
+        for name, (dtype, offset, count) in header.items()
+    }
+
+    index = {name: StringColumn(sections[f"{name}_blob"], sections[f"{name}_offsets"]) for name in STRING_COLUMNS}
+    index["files"] = sections["files"]
+    index["trigrams"] = TrigramTable(sections["grams"], sections["gram_offsets"], sections["postings"])
+    return index
+
+
+def _candidates(postings):
+    """
+    候选集：从最短的倒排表出发，只与长度相近的倒排表求交；
+    其余三元组留给最终的名称校验，避免为很长的倒排表构造集合
+    """
+    postings = sorted(postings, key=len)
+    result = postings[0]
+    for other in postings[1:]:
+        if len(other) > 4 * len(result) or not len(result):
+            break
+        result = np.intersect1d(result, other, assume_unique=True)
+    return [int(pos) for pos in result]
+
+
+def search(index, query, entity_type=None, limit=50):
+    """
+    query 含 * 或 ? 时按通配符匹配整个名称，否则按子串匹配；大小写不敏感。
+    返回按匹配程度排序的实体列表：完全相同 > 前缀 > 其它；同级按名称长度、类型、名称排序
+    """
+    query_lower = query.lower()
+    is_glob = any(c in query for c in "*?")
+    fragments = [f for f in re.split(r"[*?]", query_lower) if f] if is_glob else [query_lower]
+
+    grams = set()
+    for fragment in fragments:
+        grams |= name_trigrams(fragment)
+
+    names = index["names"]
+    if grams:
+        postings = [index["trigrams"].get(gram, []) for gram in grams]
+        candidates = _candidates(postings) if all(len(p) for p in postings) else []
+    else:
+        # 片段都短于 3 个字符，无法使用三元组，退化为全量扫描
+        candidates = range(len(names))
+
+    if is_glob:
+        pattern = re.compile(fnmatch.translate(query_lower))
+        matches = lambda name: pattern.match(name) is not None
+    else:
+        matches = lambda name: query_lower in name
+
+    prefix = fragments[0] if fragments and not (is_glob and query[0] in "*?") else ""
+    scored = []
+    for pos in candidates:
+        entity_type_at = index["types"][pos]
+        if entity_type and entity_type_at != entity_type:
+            continue
+        original = names[pos]
+        name = original.lower()
+        if not matches(name):
+            continue
+        if name == query_lower or name == prefix:
+            level = 0
+        elif prefix and name.startswith(prefix):
+            level = 1
+        else:
+            level = 2
+        scored.append(((level, len(name), TYPE_RANK.get(entity_type_at, 9), original), pos))
+
+    return [
+        {
+            "id": index["ids"][pos],
+            "name": names[pos],
+            "type": index["types"][pos],
+            "scope": index["scopes"][pos],
+            "source_file": index["file_table"][int(index["files"][pos])],
+        }
+        for _, pos in heapq.nsmallest(limit, scored)
+    ]
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="mode", required=True)
+
+    p_build = sub.add_parser("build", help="由 entity.json 生成 symbol_index.bin")
+    p_build.add_argument("--graph", type=str, required=True, help="图谱目录")
+
+    p_search = sub.add_parser("search", help="按名称片段或通配符搜索实体")
+    p_search.add_argument("--graph", type=str, required=True, help="图谱目录（含 symbol_index.bin）")
+    p_search.add_argument("--query", type=str, required=True, help="子串或通配符，如 ops、*_alloc*")
+    p_search.add_argument("--type", type=str, choices=INDEXED_TYPES, default=None, help="只返回该类型的实体")
+    p_search.add_argument("--limit", type=int, default=50, help="返回条数上限")
+
+    args = parser.parse_args()
+
+    if args.mode == "build":
+        with open(os.path.join(args.graph, 'entity.json'), 'r') as f:
+            entities = json.load(f)
+        print(f"🔤 符号索引已写出：{write_symbol_index(args.graph, entities)}")
+    else:
+        try:
+            index = load_symbol_index(args.graph)
+        except FileNotFoundError as e:
+            parser.error(str(e))
+        start_time = time.time()
+        results = search(index, args.query, args.type, args.limit)
+        elapsed = (time.time() - start_time) * 1000
+        for r in results:
+            print(f"{r['type']:<9} {r['name']:<40} {r['scope'] or '':<24} {r['source_file']}  (id={r['id']})")
+        print(f"\n🔎 {len(results)} 条结果，查询耗时 {elapsed:.2f} ms")
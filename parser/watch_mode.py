@@ -0,0 +1,559 @@
+"""
+监听模式：轮询源码目录，文件变化时基于 tree-sitter 增量解析
+（Tree.edit + parser.parse(new_bytes, old_tree)），只重算受影响函数的实体与关系，并输出图谱增量。
+
+- 编辑区与 get_changed_ranges 覆盖的顶层单元若全是函数定义，则按函数粒度更新：
+  重新抽取这些函数的 FUNCTION / 局部变量 / 参数实体，以及函数体内的
+  CALLS / ASSIGNED_TO / RETURNS / TYPE_OF / HAS_PARAMETER / HAS_VARIABLE / CONTAINS 关系，
+  未变化的实体沿用原 id，其余实体仅按行号偏移平移
+- 涉及结构体、全局声明、预处理指令或同名函数时，回退为整文件重抽取 + 全图重建
+- 函数粒度更新不会重新解析其它函数中的调用，这些在回退路径中刷新；
+  差异涉及 ASSIGNED_TO、被更新函数含指针调用或其实体出现在间接 CALLS 中时，在修补后的关系上重算阶段 6
+
+增量以 JSON 行追加到 <output>/delta.jsonl，退出（Ctrl-C）时写出最终的 entity.json / relation.json。
+"""
+import os
+import json
+import time
+
+from run_extract_all import (
+    id_generator,
+    get_c_files,
+    write_graph,
+    record_entities,
+    rebind_record,
+    build_record,
+    extract_file_record,
+)
+from extract_entity_function import extract_function_entities
+from extract_entity_variable import extract_variable_entities, extract_function_parameters
+from extract_relation_calls import extract_calls_relations
+from extract_relation_assignedto import extract_assigned_to_relations
+from extract_relation_contains import build_file_level_contains
+from extract_relation_has_parameters import extract_has_parameter_relations
+from extract_relation_has_variables import extract_has_variable_relations
+from extract_relation_returns import extract_returns_relations
+from extract_relation_typeof import extract_typeof_relations
+from extract_relation_indirect_calls import extract_indirect_calls_relations
+from extract_daemon import new_state, rebuild_graph, handle_extract
+from graph_delta import entity_keys, relation_key, diff_entities, diff_relations
+from field_type_index import set_entity_type
+from source_reader import read_source_bytes
+
+PREPROC_CONTAINERS = ('preproc_if', 'preproc_ifdef', 'preproc_else', 'preproc_elif', 'preproc_elifdef')
+
+
+# === 增量编辑计算 ===
+
+def common_prefix_len(a, b):
+    """二分比较切片，按 memcmp 速度求公共前缀长度"""
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[lo:mid] == b[lo:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def compute_edit(old_bytes, new_bytes):
+    """返回 (start_byte, old_end_byte, new_end_byte)"""
+    start = common_prefix_len(old_bytes, new_bytes)
+    limit = min(len(old_bytes), len(new_bytes)) - start
+    suffix = common_prefix_len(old_bytes[::-1][:limit], new_bytes[::-1][:limit])
+    return start, len(old_bytes) - suffix, len(new_bytes) - suffix
+
+
+def byte_to_point(code_bytes, offset):
+    row = code_bytes.count(b"\n", 0, offset)
+    col = offset - (code_bytes.rfind(b"\n", 0, offset) + 1)
+    return (row, col)
+
+
+# === 顶层单元 ===
+
+def iter_units(node):
+    """文件的顶层单元：函数定义与其它顶层声明，穿透 #if / #ifdef 包裹"""
+    for child in node.children:
+        if not child.is_named or child.type == 'comment':
+            continue
+        if child.type in PREPROC_CONTAINERS:
+            yield from iter_units(child)
+        else:
+            yield child
+
+
+def affected_units(root, ranges):
+    return [
+        unit for unit in iter_units(root)
+        if any(unit.start_byte <= end and start <= unit.end_byte for start, end in ranges)
+    ]
+
+
+def function_name(node, code_bytes):
+    declarator = node.child_by_field_name('declarator')
+    stack = [declarator] if declarator else []
+    while stack:
+        current = stack.pop(0)
+        if current.type == 'identifier':
+            return code_bytes[current.start_byte:current.end_byte].decode('utf-8', errors='ignore')
+        stack[:0] = current.children
+    return None
+
+
+# === 监听状态 ===
+
+def reset_index(state):
+    """由 state 中的全量实体 / 关系重建增量维护用的索引"""
+    entities = state["entities"]
+    state["entity_by_id"] = {e["id"]: e for e in entities}
+    state["key_index"] = dict(zip(entity_keys(entities), (e["id"] for e in entities)))
+    bag = {}
+    for rel in state["relations"]:
+        bag.setdefault(relation_key(rel), []).append(rel)
+    state["relation_bag"] = bag
+    symbols = state["symbols"]
+    state["var_param_id_map"] = {**symbols["variable_id_map"], **symbols["param_id_map"]}
+
+
+def current_graph(state):
+    entities = list(state["entity_by_id"].values())
+    relations = [rel for rels in state["relation_bag"].values() for rel in rels]
+    return entities, relations
+
+
+def apply_relation_delta(state, added, removed):
+    bag = state["relation_bag"]
+    for rel in removed:
+        key = relation_key(rel)
+        rels = bag.get(key)
+        if rels:
+            rels.pop()
+            if not rels:
+                del bag[key]
+    for rel in added:
+        bag.setdefault(relation_key(rel), []).append(rel)
+
+
+def indirect_affected(state, unit_relations, delta_relations, unit_ids):
+    """
+    函数单元的更新是否可能改变阶段 6 的间接 CALLS：
+    unit_relations 为新旧单元的全部关系，delta_relations 为其差异，unit_ids 为新旧单元的实体 id
+    """
+    entity_by_id = state["entity_by_id"]
+
+    def pointer_call(rel):
+        tails = rel["tail"] if isinstance(rel["tail"], list) else [rel["tail"]]
+        return any(entity_by_id.get(t, {}).get("type") != "FUNCTION" for t in tails)
+
+    if any(rel["type"] == "ASSIGNED_TO" for rel in delta_relations):
+        return True
+    # 单元含指针调用时，直接调用的增删也会改变间接调用的去重
+    if any(rel["type"] == "CALLS" for rel in delta_relations) and any(
+        rel["type"] == "CALLS" and pointer_call(rel) for rel in unit_relations
+    ):
+        return True
+    return any(
+        rel["head"] in unit_ids or rel["tail"] in unit_ids for rel in state["indirect_relations"]
+    )
+
+
+def refresh_indirect_calls(state):
+    """在修补后的关系上重算阶段 6，返回间接 CALLS 的 (added, removed) 并写入关系多重集"""
+    entities, relations = current_graph(state)
+    old_indirect = state["indirect_relations"]
+    direct, _ = diff_relations(old_indirect, relations)
+    indirect = extract_indirect_calls_relations(entities, direct)
+    added, removed = diff_relations(old_indirect, indirect)
+    apply_relation_delta(state, added, removed)
+    state["indirect_relations"] = indirect
+    return added, removed
+
+
+def rebuild_record_maps(record):
+    record.update(build_record(
+        record["source_path"],
+        record["file_entities"],
+        record["functions"],
+        record["structs"],
+        record["variables"],
+        record["params"],
+        record["fields"],
+    ))
+
+
+def unbind_entities(state, record, entities):
+    """从实体索引、全局符号表与逐文件记录中移除函数单元的实体"""
+    symbols = state["symbols"]
+    var_param = state["var_param_id_map"]
+    ids = {e["id"] for e in entities}
+
+    for e, key in zip(entities, entity_keys(entities)):
+        state["entity_by_id"].pop(e["id"], None)
+        if state["key_index"].get(key) == e["id"]:
+            del state["key_index"][key]
+
+        if e["type"] == "FUNCTION":
+            if symbols["function_id_map"].get(e["name"]) == e["id"]:
+                del symbols["function_id_map"][e["name"]]
+            continue
+
+        map_key = (e["name"], e["scope"])
+        own_map = symbols["param_id_map"] if e.get("role") == "param" else symbols["variable_id_map"]
+        if own_map.get(map_key) == e["id"]:
+            del own_map[map_key]
+        if var_param.get(map_key) == e["id"]:
+            del var_param[map_key]
+            # 参数覆盖同名局部变量，移除参数后恢复局部变量
+            if map_key in symbols["variable_id_map"]:
+                var_param[map_key] = symbols["variable_id_map"][map_key]
+
+    for name in ("functions", "variables", "params"):
+        record[name] = [e for e in record[name] if e["id"] not in ids]
+
+
+def bind_entities(state, record, functions, variables, params):
+    symbols = state["symbols"]
+    var_param = state["var_param_id_map"]
+    entities = functions + variables + params
+
+    for e, key in zip(entities, entity_keys(entities)):
+        state["entity_by_id"][e["id"]] = e
+        state["key_index"][key] = e["id"]
+
+    for e in functions:
+        symbols["function_id_map"][e["name"]] = e["id"]
+    for e in variables:
+        symbols["variable_id_map"][(e["name"], e["scope"])] = e["id"]
+        var_param.setdefault((e["name"], e["scope"]), e["id"])
+    for e in params:
+        symbols["param_id_map"][(e["name"], e["scope"])] = e["id"]
+        var_param[(e["name"], e["scope"])] = e["id"]
+    for e in variables + params:
+        set_entity_type(symbols["field_index"], e)
+
+    record["functions"].extend(functions)
+    record["variables"].extend(variables)
+    record["params"].extend(params)
+
+
+# === 函数单元抽取 ===
+
+def extract_unit_entities(func_node, code_bytes, source_path):
+    """对单个 function_definition 复用实体抽取器，id 为临时值，稍后按实体键绑定"""
+    counter = id_generator()
+    functions, f_map = extract_function_entities(func_node, code_bytes, counter)
+    variables, _, _ = extract_variable_entities(func_node, code_bytes, counter)
+    params, _ = extract_function_parameters(func_node, code_bytes, counter, f_map)
+    for e in functions + variables + params:
+        e["source_file"] = source_path
+    return functions, variables, params
+
+
+def bind_unit_ids(state, functions, variables, params, allocate):
+    """
+    按实体键查找全局 id；allocate 为 True 时为新实体分配 id，否则丢弃未知实体
+    """
+    groups = (functions, variables, params)
+    keys = entity_keys(functions + variables + params)
+    key_iter = iter(keys)
+    result = []
+    for group in groups:
+        kept = []
+        for e in group:
+            entity_id = state["key_index"].get(next(key_iter))
+            if entity_id is None and allocate:
+                entity_id = str(next(state["id_counter"]))
+            if entity_id is not None:
+                e["id"] = entity_id
+                kept.append(e)
+        result.append(kept)
+    return result
+
+
+def extract_unit_relations(state, func_node, code_bytes, source_path, functions, variables, params):
+    """函数体内的关系，与全量抽取阶段 2 ~ 5 的口径一致"""
+    symbols = state["symbols"]
+    function_id_map = symbols["function_id_map"]
+    field_id_map = symbols["field_id_map"]
+    var_param = state["var_param_id_map"]
+    abs_path = os.path.abspath(source_path)
+    file_id = state["files"][source_path]["record"]["file_id"]
+
+    relations = []
+    field_index = symbols.get("field_index")
+    relations += extract_calls_relations(
+        func_node, code_bytes, function_id_map, var_param, field_id_map, state["macro_lookup_map"], abs_path,
+        field_index
+    )
+    relations += extract_assigned_to_relations(
+        func_node, code_bytes, function_id_map, var_param, field_id_map, state["macro_lookup_map"], abs_path,
+        field_index
+    )
+    relations += build_file_level_contains(file_id, {e["name"]: e["id"] for e in functions}, {}, {})
+    relations += extract_has_parameter_relations(params, function_id_map)
+    relations += extract_has_variable_relations(variables, function_id_map)
+    relations += extract_returns_relations(func_node, code_bytes, function_id_map, var_param, field_id_map)
+    relations += extract_typeof_relations(
+        func_node, code_bytes, variables + params, symbols["field_entities"], symbols["struct_id_map"]
+    )
+    return relations
+
+
+# === 更新路径 ===
+
+def snapshot_unit(state, node, code_bytes, source_path):
+    """
+    抽取函数单元当前在图中的实体（全局 id）与关系。
+    必须在 Tree.edit 之前（或对编辑区之外的节点）以及修改符号表之前调用
+    """
+    groups = bind_unit_ids(state, *extract_unit_entities(node, code_bytes, source_path), allocate=False)
+    entities = [dict(state["entity_by_id"][e["id"]]) for group in groups for e in group]
+    relations = extract_unit_relations(state, node, code_bytes, source_path, *groups)
+    return entities, relations
+
+
+def update_functions(state, source_path, old_snapshots, new_units, new_bytes, new_tree, line_shift):
+    """
+    函数粒度更新。old_snapshots 为旧单元的 (entities, relations)，new_units 为新树上的函数节点；
+    line_shift 为 (编辑起始行, 行数变化, 编辑区旧结束字节, 字节数变化)
+    """
+    entry = state["files"][source_path]
+    record = entry["record"]
+
+    old_entities = [e for entities, _ in old_snapshots for e in entities]
+    old_relations = [r for _, relations in old_snapshots for r in relations]
+
+    # 先按实体键查找新单元的 id（解绑旧实体会从键索引中移除它们）
+    new_groups = [
+        (node, bind_unit_ids(state, *extract_unit_entities(node, new_bytes, source_path), allocate=True))
+        for node in new_units
+    ]
+
+    unbind_entities(state, record, old_entities)
+
+    # 编辑区之后的其它实体只平移行号与字节偏移
+    start_row, line_delta, old_end_byte, byte_delta = line_shift
+    shifted = []
+    if line_delta or byte_delta:
+        for e in record_entities(record):
+            move_lines = line_delta and "start_line" in e and e["start_line"] - 1 > start_row
+            move_bytes = byte_delta and "start_byte" in e and e["start_byte"] >= old_end_byte
+            if not (move_lines or move_bytes):
+                continue
+            before = dict(e)
+            if move_lines:
+                e["start_line"] += line_delta
+                e["end_line"] += line_delta
+            if move_bytes:
+                e["start_byte"] += byte_delta
+                e["end_byte"] += byte_delta
+            shifted.append((before, e))
+
+    new_entities = []
+    for _, groups in new_groups:
+        bind_entities(state, record, *groups)
+        new_entities += [e for group in groups for e in group]
+    rebuild_record_maps(record)
+
+    new_relations = []
+    for node, groups in new_groups:
+        new_relations += extract_unit_relations(state, node, new_bytes, source_path, *groups)
+
+    entry["code_bytes"] = new_bytes
+    entry["tree"] = new_tree
+
+    added_entities, removed_entities, updated_entities = diff_entities(old_entities, new_entities)
+    updated_entities += [after for before, after in shifted if before != after]
+    added_relations, removed_relations = diff_relations(old_relations, new_relations)
+    apply_relation_delta(state, added_relations, removed_relations)
+
+    unit_ids = {e["id"] for e in old_entities + new_entities}
+    if indirect_affected(state, old_relations + new_relations, added_relations + removed_relations, unit_ids):
+        indirect_added, indirect_removed = refresh_indirect_calls(state)
+        added_relations += indirect_added
+        removed_relations += indirect_removed
+
+    return {
+        "entities": {"added": added_entities, "removed": removed_entities, "updated": updated_entities},
+        "relations": {"added": added_relations, "removed": removed_relations},
+    }
+
+
+def update_file_level(state, source_path, new_bytes=None, new_tree=None):
+    """整文件重抽取并重建全图；new_bytes 为 None 表示文件已删除"""
+    old_entities, old_relations = current_graph(state)
+    old_entry = state["files"].get(source_path)
+
+    if new_bytes is None:
+        state["files"].pop(source_path, None)
+    else:
+        if new_tree is None:
+            new_tree = state["parser"].parse(new_bytes)
+        record = extract_file_record(source_path, new_tree.root_node, new_bytes, id_generator())
+
+        # 按实体键沿用旧 id，新实体分配新 id
+        old_ids = {}
+        if old_entry is not None:
+            old_list = record_entities(old_entry["record"])
+            old_ids = dict(zip(entity_keys(old_list), (e["id"] for e in old_list)))
+        new_list = record_entities(record)
+        id_map = {
+            e["id"]: old_ids.get(key) or str(next(state["id_counter"]))
+            for e, key in zip(new_list, entity_keys(new_list))
+        }
+        state["files"][source_path] = {
+            "code_bytes": new_bytes,
+            "tree": new_tree,
+            "record": rebind_record(record, id_map),
+        }
+
+    rebuild_graph(state)
+    reset_index(state)
+    new_entities, new_relations = current_graph(state)
+
+    added_entities, removed_entities, updated_entities = diff_entities(old_entities, new_entities)
+    added_relations, removed_relations = diff_relations(old_relations, new_relations)
+    return {
+        "entities": {"added": added_entities, "removed": removed_entities, "updated": updated_entities},
+        "relations": {"added": added_relations, "removed": removed_relations},
+    }
+
+
+def update_changed_file(state, source_path, new_bytes):
+    entry = state["files"].get(source_path)
+    if entry is None:
+        return "file", update_file_level(state, source_path, new_bytes)
+
+    old_bytes, old_tree = entry["code_bytes"], entry["tree"]
+    if old_bytes == new_bytes:
+        return None, None
+
+    start, old_end, new_end = compute_edit(old_bytes, new_bytes)
+    start_point = byte_to_point(old_bytes, start)
+    old_end_point = byte_to_point(old_bytes, old_end)
+    new_end_point = byte_to_point(new_bytes, new_end)
+
+    # 编辑前：旧树上与编辑区重叠的单元，节点坐标与 old_bytes 一致，先取出其实体与关系
+    old_overlap = affected_units(old_tree.root_node, [(start, old_end)])
+    function_local = all(u.type == 'function_definition' for u in old_overlap)
+    old_name_counts = {}
+    for unit in iter_units(old_tree.root_node):
+        if unit.type == 'function_definition':
+            name = function_name(unit, old_bytes)
+            old_name_counts[name] = old_name_counts.get(name, 0) + 1
+
+    old_snapshots = {}
+    if function_local:
+        for unit in old_overlap:
+            name = function_name(unit, old_bytes)
+            if name is None or old_name_counts[name] > 1:
+                function_local = False
+                break
+            old_snapshots[name] = snapshot_unit(state, unit, old_bytes, source_path)
+
+    # 增量重解析
+    old_tree.edit(start, old_end, new_end, start_point, old_end_point, new_end_point)
+    new_tree = state["parser"].parse(new_bytes, old_tree)
+    ranges = [(r.start_byte, r.end_byte) for r in old_tree.get_changed_ranges(new_tree)]
+    ranges.append((start, new_end))
+
+    new_overlap = affected_units(new_tree.root_node, ranges)
+    if not function_local or any(u.type != 'function_definition' for u in new_overlap):
+        return "file", update_file_level(state, source_path, new_bytes, new_tree)
+
+    new_units = {}
+    for unit in new_overlap:
+        name = function_name(unit, new_bytes)
+        if name is None:
+            return "file", update_file_level(state, source_path, new_bytes, new_tree)
+        new_units[name] = unit
+
+    new_name_counts = {}
+    new_nodes_by_name = {}
+    for unit in iter_units(new_tree.root_node):
+        if unit.type == 'function_definition':
+            name = function_name(unit, new_bytes)
+            new_name_counts[name] = new_name_counts.get(name, 0) + 1
+            new_nodes_by_name[name] = unit
+
+    names = set(old_snapshots) | set(new_units)
+    if any(old_name_counts.get(n, 0) > 1 or new_name_counts.get(n, 0) > 1 for n in names):
+        return "file", update_file_level(state, source_path, new_bytes, new_tree)
+
+    # 只在 changed ranges 中出现的函数：旧版本位于编辑区之外，文本未变，用平移后的旧树节点 + new_bytes 抽取
+    for name in set(new_units) - set(old_snapshots):
+        if old_name_counts.get(name):
+            for unit in iter_units(old_tree.root_node):
+                if unit.type == 'function_definition' and not (start <= unit.end_byte and unit.start_byte <= new_end) \
+                        and function_name(unit, new_bytes) == name:
+                    old_snapshots[name] = snapshot_unit(state, unit, new_bytes, source_path)
+                    break
+    # 旧函数被改名 / 删除后，新树中若仍有同名函数也需一并更新
+    for name in set(old_snapshots) - set(new_units):
+        if name in new_nodes_by_name:
+            new_units[name] = new_nodes_by_name[name]
+
+    line_shift = (start_point[0], new_end_point[0] - old_end_point[0], old_end, new_end - old_end)
+    delta = update_functions(
+        state, source_path, list(old_snapshots.values()), list(new_units.values()), new_bytes, new_tree, line_shift
+    )
+    delta["functions"] = sorted(names)
+    return "function", delta
+
+
+# === 轮询 ===
+
+def snapshot(source_dir):
+    result = {}
+    for source_path in get_c_files(source_dir):
+        try:
+            st = os.stat(source_path)
+        except FileNotFoundError:
+            continue
+        result[source_path] = (st.st_mtime_ns, st.st_size)
+    return result
+
+
+def emit_delta(delta_path, source_path, mode, delta, elapsed):
+    record = {"file": source_path, "mode": mode, "elapsed_ms": round(elapsed * 1000, 2), **delta}
+    with open(delta_path, 'a') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    ents, rels = delta["entities"], delta["relations"]
+    print(
+        f"🔄 {source_path} [{mode}] 实体 +{len(ents['added'])} -{len(ents['removed'])} ~{len(ents['updated'])}，"
+        f"关系 +{len(rels['added'])} -{len(rels['removed'])}（{record['elapsed_ms']} ms）"
+    )
+
+
+def watch(source_dir, output_dir, interval=1.0, macro_json_path=None):
+    state = new_state(macro_json_path, output_dir) if macro_json_path else new_state(output_dir=output_dir)
+    handle_extract(state, {"source": source_dir})
+    reset_index(state)
+    write_graph(output_dir, *current_graph(state))
+
+    # 基线图谱已重写，旧增量不再适用
+    delta_path = os.path.join(output_dir, 'delta.jsonl')
+    open(delta_path, 'w').close()
+    known = snapshot(source_dir)
+    print(f"👀 监听 {source_dir}，增量写入 {delta_path}（Ctrl-C 退出）")
+
+    try:
+        while True:
+            time.sleep(interval)
+            current = snapshot(source_dir)
+            for source_path in sorted(set(known) | set(current)):
+                if known.get(source_path) == current.get(source_path):
+                    continue
+                start_time = time.time()
+                if source_path not in current:
+                    mode, delta = "file", update_file_level(state, source_path)
+                else:
+                    mode, delta = update_changed_file(state, source_path, read_source_bytes(source_path))
+                if delta is not None:
+                    emit_delta(delta_path, source_path, mode, delta, time.time() - start_time)
+            known = current
+    except KeyboardInterrupt:
+        write_graph(output_dir, *current_graph(state))
+        print(f"\n✅ 已写出最终图谱：{output_dir}")